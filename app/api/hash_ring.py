@@ -0,0 +1,238 @@
+import time
+import asyncio
+import struct
+import hashlib
+from array import array
+from bisect import bisect, bisect_left
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional, Set, Tuple
+from app.core.config import settings
+from app.api.snapshot import PoolSnapshot, pool_snapshot
+
+# 一次blake2b（64字节摘要）生成8个虚拟节点位置
+POINTS_PER_DIGEST = 8
+_unpack_points = struct.Struct(">8Q").unpack
+# 位置为[0, 1)内的浮点数（取64位哈希的高53位），53位下几乎不会冲突
+_SCALE = 2.0 ** -64
+# 环按位置等分为若干段，每段为按位置排序的位置数组和对应的代理编号数组：增删节点只改动所在的段，
+# 5万代理×32个虚拟节点时每段约1600个节点，插入/删除和排序都很快。
+# 段内用array保存，不创建上百万个Python对象，垃圾回收的全量扫描也不必遍历整个环
+BUCKETS = 1024
+# sync_async()每连续计算这么多秒让出一次事件循环
+TIME_SLICE = 0.005
+
+# (位置, 代理编号)
+Node = Tuple[float, int]
+# (位置数组, 代理编号数组)
+Bucket = Tuple[array, array]
+
+
+def ring_hash(key: str) -> float:
+    """[0, 1)内的哈希位置，在所有进程中稳定（不受PYTHONHASHSEED影响）"""
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big") * _SCALE
+
+
+def _bucket(point: float) -> int:
+    return min(int(point * BUCKETS), BUCKETS - 1)
+
+
+class HashRing:
+    """
+    一致性哈希环 - 每个代理在环上有vnodes个虚拟节点，键顺时针找到的第一个节点即其代理
+
+    增删代理只影响原本落在这些代理上的键：移除一个代理时只有映射到它的键改为下一个代理，
+    加入一个代理时只有被新节点截走的键改为新代理，其他键的映射保持不变。
+
+    按成员差异增量更新，只重建有节点变化的段（变化少时用bisect在段内逐个插入/删除），
+    不必过滤和排序整个环。更新在新的段数组上完成后整体替换，lookup()始终读到一致的状态；
+    sync_async()分批执行、批间让出事件循环，构建大的环时也不会长时间阻塞请求处理。
+    """
+    def __init__(self, vnodes: int = settings.SESSION_VNODES):
+        self.vnodes = vnodes
+        # (各段, 代理集合)，整体替换
+        self._state: Tuple[List[Bucket], FrozenSet[str]] = (
+            [(array("d"), array("l")) for _ in range(BUCKETS)], frozenset()
+        )
+        # 代理 <-> 编号，移除的代理的编号在下次同步时复用
+        self._ids: Dict[str, int] = {}
+        self._names: List[Optional[str]] = []
+        self._free: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self._state[1])
+
+    def _node_points(self, member: str) -> List[float]:
+        points = []
+        for i in range(0, self.vnodes, POINTS_PER_DIGEST):
+            points += _unpack_points(hashlib.blake2b(f"{member}#{i}".encode()).digest())
+        return [point * _SCALE for point in points[:self.vnodes]]
+
+    def _diff(self, members: Iterable[str]) -> Tuple[FrozenSet[str], Set[str], Set[str]]:
+        members = frozenset(members)
+        current = self._state[1]
+        return members, members - current, current - members
+
+    def _assign_id(self, member: str) -> int:
+        if self._free:
+            member_id = self._free.pop()
+            self._names[member_id] = member
+        else:
+            member_id = len(self._names)
+            self._names.append(member)
+        self._ids[member] = member_id
+        return member_id
+
+    def _update(self, added: Set[str], removed: Set[str]) -> Iterator[None]:
+        """分批计算新的段数组，每计算TIME_SLICE秒让出一次（产出None），完成后以返回值给出新的段数组
+
+        不修改当前的段数组；新代理在这里分配编号，当前状态中的编号与代理的对应关系不变
+        """
+        deadline = time.perf_counter() + TIME_SLICE
+        changes: Dict[int, Tuple[List[Node], List[Node]]] = {}
+        for member, is_added in [(m, False) for m in removed] + [(m, True) for m in added]:
+            member_id = self._assign_id(member) if is_added else self._ids[member]
+            for point in self._node_points(member):
+                changes.setdefault(_bucket(point), ([], []))[is_added].append((point, member_id))
+            if time.perf_counter() >= deadline:
+                yield
+                deadline = time.perf_counter() + TIME_SLICE
+        buckets = list(self._state[0])
+        for index, (dead, new) in changes.items():
+            points, owners = buckets[index]
+            if (len(dead) + len(new)) * 4 <= len(points):
+                # 变化相对段较少：在副本上逐个删除/插入（每次一次memmove），不必重新排序
+                points, owners = array("d", points), array("l", owners)
+                for point, member_id in dead:
+                    position = bisect_left(points, point)
+                    while owners[position] != member_id:
+                        position += 1
+                    del points[position]
+                    del owners[position]
+                for point, member_id in new:
+                    position = bisect(points, point)
+                    points.insert(position, point)
+                    owners.insert(position, member_id)
+            else:
+                dead = set(dead)
+                nodes = [node for node in zip(points, owners) if node not in dead] + new
+                nodes.sort()
+                points = array("d", [point for point, _ in nodes])
+                owners = array("l", [member_id for _, member_id in nodes])
+            buckets[index] = (points, owners)
+            if time.perf_counter() >= deadline:
+                yield
+                deadline = time.perf_counter() + TIME_SLICE
+        return buckets
+
+    def _commit(self, buckets: List[Bucket], members: FrozenSet[str], removed: Set[str]) -> None:
+        self._state = (buckets, members)
+        for member in removed:
+            member_id = self._ids.pop(member)
+            self._names[member_id] = None
+            self._free.append(member_id)
+
+    def sync(self, members: Iterable[str]) -> Tuple[int, int]:
+        """把环上的代理更新为members，返回(加入数, 移除数)"""
+        members, added, removed = self._diff(members)
+        steps = self._update(added, removed)
+        while True:
+            try:
+                next(steps)
+            except StopIteration as done:
+                self._commit(done.value, members, removed)
+                return len(added), len(removed)
+
+    async def sync_async(self, members: Iterable[str]) -> Tuple[int, int]:
+        """与sync()相同，分批执行并在批间让出事件循环；同一个环的同步须依次进行"""
+        members, added, removed = self._diff(members)
+        steps = self._update(added, removed)
+        while True:
+            try:
+                next(steps)
+            except StopIteration as done:
+                self._commit(done.value, members, removed)
+                return len(added), len(removed)
+            await asyncio.sleep(0)
+
+    def lookup(self, key: str, count: int = 1) -> List[str]:
+        """返回键对应的最多count个不同代理，第一个为主代理，其余为环上顺时针的后继"""
+        buckets, members = self._state
+        if not members:
+            return []
+        count = min(count, len(members))
+        point = ring_hash(key)
+        index = _bucket(point)
+        position = bisect(buckets[index][0], point)
+        result = []
+        # 从所在段的插入位置开始顺时针遍历，最多绕环一周
+        for step in range(BUCKETS + 1):
+            owners = buckets[(index + step) % BUCKETS][1]
+            while position < len(owners):
+                member = self._names[owners[position]]
+                if member not in result:
+                    result.append(member)
+                    if len(result) == count:
+                        return result
+                position += 1
+            position = 0
+        return result
+
+
+class SessionRouter:
+    """
+    会话粘滞路由 - 按会话标识在一致性哈希环上选择代理，不保存任何会话状态
+
+    每个协议（None为全部代理）一个哈希环，成员取自进程内代理池快照。哈希环在快照的更新任务中
+    增量同步（见PoolSnapshot.add_reload_hook），请求只做查找；某个协议第一次被请求时构建该协议的环。
+    同一会话在其代理被验证器移除前总是得到同一个代理；代理移除或新代理加入时只有少量会话改变映射。
+    快照不可用（未启用或后台任务未运行）时按需重新加载快照，两次加载至少间隔POOL_SNAPSHOT_MIN_INTERVAL秒。
+    """
+    def __init__(self, snapshot: Optional[PoolSnapshot] = None, vnodes: int = settings.SESSION_VNODES):
+        self.snapshot = snapshot or pool_snapshot
+        self.vnodes = vnodes
+        self._rings: Dict[Optional[str], HashRing] = {}
+        self._scores: Dict[Optional[str], Dict[str, float]] = {}
+        # _lock保证同一个环依次同步；_load_lock合并按需加载（加载后的回调会获取_lock）
+        self._lock = asyncio.Lock()
+        self._load_lock = asyncio.Lock()
+        self.snapshot.add_reload_hook(self.sync)
+
+    async def _ensure_loaded(self) -> None:
+        if self.snapshot.ready() or self.snapshot.age() < self.snapshot.min_interval:
+            return
+        async with self._load_lock:
+            if not self.snapshot.ready() and self.snapshot.age() >= self.snapshot.min_interval:
+                await self.snapshot.reload()
+
+    async def _sync_ring(self, protocol: Optional[str], ring: HashRing) -> None:
+        proxies, scores = self.snapshot.members(protocol)
+        await ring.sync_async(proxies)
+        # 环与分数一起更新，环上的代理总能查到分数
+        self._scores[protocol] = dict(zip(proxies, scores))
+
+    async def sync(self) -> None:
+        """把已建立的哈希环同步为当前快照（快照加载后调用）"""
+        async with self._lock:
+            for protocol, ring in list(self._rings.items()):
+                await self._sync_ring(protocol, ring)
+
+    async def _ring(self, protocol: Optional[str]) -> HashRing:
+        ring = self._rings.get(protocol)
+        if ring is None:
+            async with self._lock:
+                ring = self._rings.get(protocol)
+                if ring is None:
+                    ring = HashRing(self.vnodes)
+                    await self._sync_ring(protocol, ring)
+                    self._rings[protocol] = ring
+        return ring
+
+    async def route(self, session: str, count: int = 1, protocol: Optional[str] = None) -> List[Tuple[str, float]]:
+        """返回会话对应的(代理, 分数)列表"""
+        await self._ensure_loaded()
+        ring = await self._ring(protocol)
+        scores = self._scores[protocol]
+        return [(proxy, scores[proxy]) for proxy in ring.lookup(session, count)]
+
+
+# 全局会话路由（每个API进程一份，与代理池快照共用成员）
+session_router = SessionRouter()
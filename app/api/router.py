@@ -1,79 +1,127 @@
-from fastapi import APIRouter, HTTPException, Query, Path, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Query, Path, BackgroundTasks, Request
+from pydantic import BaseModel, Field
 from app.core.config import settings
-from app.storage.redis_client import redis_conn, redis_storage
-from app.validator.proxy_validator import ProxyValidator
-from app.crawlers import discover_crawlers
+from app.storage.redis_client import redis_storage
+from app.api.snapshot import pool_snapshot
+from app.api.hash_ring import session_router
+from app.validator.proxy_validator import proxy_validator as validator
+from app.validator.judge import judge_payload
+from app.validator.scoring import MAX_SCORE
+from app.validator.feedback import apply_feedback
+from app.crawlers import run_crawlers
 from typing import List, Optional
-import random
 import logging
-import asyncio
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
-validator = ProxyValidator()
+
+class FeedbackReport(BaseModel):
+    """一条代理使用反馈"""
+    lease_id: str = Field(..., description="租用代理时返回的租约ID")
+    success: bool = Field(..., description="是否使用成功")
+    latency: Optional[float] = Field(None, description="观测到的响应时间（毫秒）", ge=0)
+
+def proxy_item(proxy: str, score: float, meta: Optional[dict] = None) -> dict:
+    """单个代理的返回格式，meta不为None时附带元数据"""
+    item = {
+        "proxy": proxy,
+        "score": score,
+        "protocol": proxy.split("://")[0] if "://" in proxy else "unknown"
+    }
+    if meta is not None:
+        item["meta"] = meta
+    return item
+
+async def proxy_items(proxies, with_meta: bool) -> List[dict]:
+    """整理代理列表，需要元数据时一次HMGET读取全部代理的元数据"""
+    metas = await redis_storage.get_meta([p for p, _ in proxies]) if with_meta else [None] * len(proxies)
+    return [proxy_item(p, s, m) for (p, s), m in zip(proxies, metas)]
 
 @router.get("/proxy", summary="获取随机代理")
 async def get_proxy(
     protocol: Optional[str] = Query(None, description="指定代理协议(http/https/socks5)"),
-    count: int = Query(1, description="返回代理数量", ge=1, le=20)
+    count: int = Query(1, description="返回代理数量", ge=1, le=20),
+    meta: bool = Query(False, description="是否返回代理元数据（响应时间、检查时间、成功/失败次数、匿名度、来源）"),
+    session: Optional[str] = Query(None, description="会话标识，同一会话在代理失效前总是返回同一个代理", max_length=256)
 ):
     """
     获取随机代理
     
     - **protocol**: 可选，指定代理协议(http/https/socks5)
     - **count**: 可选，返回代理数量，默认为1，最大20
+    - **meta**: 可选，是否返回代理元数据
+    - **session**: 可选，会话标识；指定后按一致性哈希选择代理而不是随机选择，
+      代理池增删代理时只有少量会话改变代理，count>1时其余代理为该会话的备用代理
     """
-    # 获取最新验证通过的代理（按分数倒序）
-    proxies = await redis_conn.zrevrangebyscore(
-        settings.PROXY_KEY,
-        "+inf",
-        "-inf",
-        withscores=True
-    )
-    
-    if not proxies:
-        raise HTTPException(status_code=404, detail="代理池为空")
-    
-    # 如果指定了协议，过滤代理
     if protocol:
         protocol = protocol.lower()
-        filtered_proxies = [(p, s) for p, s in proxies if p.startswith(f"{protocol}://")]
-        if not filtered_proxies:
-            raise HTTPException(status_code=404, detail=f"没有找到{protocol}协议的代理")
-        proxies = filtered_proxies
-    
-    # 如果请求数量大于可用数量，返回所有可用代理
-    if count > len(proxies):
-        count = len(proxies)
+    if session:
+        selected_proxies = await session_router.route(session, count, protocol)
+    else:
+        # 优先从进程内快照随机选取，快照不可用时在Redis服务端随机选取
+        selected_proxies = pool_snapshot.random(count, protocol)
+        if selected_proxies is None:
+            selected_proxies = await redis_storage.random_proxies(count, protocol)
     
-    # 随机选择指定数量的代理
-    selected_proxies = random.sample(proxies, count)
+    if not selected_proxies:
+        if protocol:
+            raise HTTPException(status_code=404, detail=f"没有找到{protocol}协议的代理")
+        raise HTTPException(status_code=404, detail="代理池为空")
     
-    if count == 1:
-        proxy, score = selected_proxies[0]
-        return {
-            "proxy": proxy,
-            "score": score,
-            "protocol": proxy.split("://")[0] if "://" in proxy else "unknown"
-        }
+    items = await proxy_items(selected_proxies, meta)
+    # 可用代理不足时ZRANDMEMBER返回全部，保持与原先一致的单条返回格式
+    if len(items) == 1:
+        return items[0]
     else:
         return {
-            "count": len(selected_proxies),
-            "proxies": [
-                {
-                    "proxy": p,
-                    "score": s,
-                    "protocol": p.split("://")[0] if "://" in p else "unknown"
-                }
-                for p, s in selected_proxies
-            ]
+            "count": len(items),
+            "proxies": items
         }
 
+@router.post("/lease", summary="租用代理")
+async def lease_proxy(
+    protocol: Optional[str] = Query(None, description="指定代理协议(http/https/socks5)"),
+    count: int = Query(1, description="租用代理数量", ge=1, le=20),
+    ttl: Optional[int] = Query(None, description="租约时长（秒），默认LEASE_TTL", ge=1, le=settings.LEASE_MAX_TTL),
+    exclusive: Optional[bool] = Query(None, description="是否独占，租约结束前不再租给其他客户端，默认LEASE_EXCLUSIVE")
+):
+    """
+    随机租用代理，返回租约ID；使用后通过 POST /feedback 提交结果，结果立即计入代理评分
+
+    - **protocol**: 可选，指定代理协议(http/https/socks5)
+    - **count**: 可选，租用代理数量，默认为1，最大20
+    - **ttl**: 可选，租约时长（秒），反馈须在租约到期前提交
+    - **exclusive**: 可选，是否独占租用
+    """
+    if protocol:
+        protocol = protocol.lower()
+    ttl = ttl or settings.LEASE_TTL
+    leases = await redis_storage.lease_proxies(
+        count, protocol, ttl, settings.LEASE_EXCLUSIVE if exclusive is None else exclusive
+    )
+    if not leases:
+        raise HTTPException(status_code=404, detail="没有可租用的代理")
+    return {
+        "count": len(leases),
+        "ttl": ttl,
+        "leases": [{"lease_id": lease_id, **proxy_item(proxy, score)} for lease_id, proxy, score in leases]
+    }
+
+@router.post("/feedback", summary="提交代理使用反馈")
+async def feedback(reports: List[FeedbackReport]):
+    """
+    批量提交租用代理的使用结果（成功/失败、响应时间），结果按EWMA立即计入代理评分并结束租约
+    """
+    if len(reports) > settings.FEEDBACK_MAX_BATCH:
+        raise HTTPException(status_code=400, detail=f"每次最多提交{settings.FEEDBACK_MAX_BATCH}条反馈")
+    return await apply_feedback([(report.lease_id, report.success, report.latency) for report in reports])
+
 @router.get("/proxies", summary="获取所有代理")
 async def get_all_proxies(
     limit: int = Query(100, description="返回代理数量限制", ge=1),
     offset: int = Query(0, description="分页偏移量", ge=0),
-    protocol: Optional[str] = Query(None, description="指定代理协议(http/https/socks5)")
+    protocol: Optional[str] = Query(None, description="指定代理协议(http/https/socks5)"),
+    meta: bool = Query(False, description="是否返回代理元数据")
 ):
     """
     获取所有代理列表
@@ -81,118 +129,113 @@ async def get_all_proxies(
     - **limit**: 可选，返回代理数量限制，默认100
     - **offset**: 可选，分页偏移量，默认0
     - **protocol**: 可选，指定代理协议(http/https/socks5)
+    - **meta**: 可选，是否返回代理元数据
     """
-    # 获取代理总数
-    total = await redis_conn.zcard(settings.PROXY_KEY)
-    
-    # 获取代理列表（按分数倒序）
-    proxies = await redis_conn.zrevrangebyscore(
-        settings.PROXY_KEY,
-        "+inf",
-        "-inf",
-        withscores=True,
-        start=offset,
-        num=limit
-    )
-    
-    # 如果指定了协议，过滤代理
+    # 指定协议时直接在该协议的索引上分页，保证分页结果正确
     if protocol:
         protocol = protocol.lower()
-        proxies = [(p, s) for p, s in proxies if p.startswith(f"{protocol}://")]
+    # 获取代理列表（按分数倒序），快照可用时直接读取快照
+    proxies = pool_snapshot.page(offset, limit, protocol)
+    if proxies is None:
+        total = await redis_storage.count_proxies(protocol)
+        proxies = await redis_storage.get_proxies_page(offset, limit, protocol)
+    else:
+        total = pool_snapshot.count(protocol)
     
     return {
         "count": len(proxies),
         "total": total,
-        "proxies": [
-            {
-                "proxy": p,
-                "score": s,
-                "protocol": p.split("://")[0] if "://" in p else "unknown"
-            }
-            for p, s in proxies
-        ]
+        "proxies": await proxy_items(proxies, meta)
     }
 
 @router.get("/stats", summary="获取系统统计信息")
-async def get_stats():
-    """获取代理池系统统计信息"""
-    # 获取代理总数
-    total = await redis_conn.zcard(settings.PROXY_KEY)
-    
-    # 获取各协议代理数量
-    all_proxies = await redis_conn.zrange(settings.PROXY_KEY, 0, -1)
-    protocol_counts = {}
-    for proxy in all_proxies:
-        protocol = proxy.split("://")[0] if "://" in proxy else "unknown"
-        protocol_counts[protocol] = protocol_counts.get(protocol, 0) + 1
-    
-    return {
-        "total_proxies": total,
-        "protocol_distribution": protocol_counts,
+async def get_stats(
+    histogram: int = Query(0, description="分数直方图的区间数，0表示不返回", ge=0, le=20)
+):
+    """
+    获取代理池系统统计信息
+
+    所有数据在一次Redis往返中读取，计数在写入时累加，耗时与代理池大小无关
+
+    - **histogram**: 可选，把0~20分等分为若干区间，返回各区间的代理数（服务端ZCOUNT）
+    """
+    edges = [MAX_SCORE * i / histogram for i in range(1, histogram)] if histogram else None
+    stats = await redis_storage.get_stats(edges)
+    counters = stats["counters"]
+    validated = counters.get("validated", 0)
+    
+    result = {
+        "total_proxies": stats["total"],
+        "pending_candidates": stats["candidates"],
+        "recently_dead": stats["dead"],
+        "active_leases": stats["leases"],
+        "protocol_distribution": stats["protocols"],
+        "counters": {
+            "added": counters.get("added", 0),
+            "removed": counters.get("removed", 0),
+            "validated": validated,
+            "passed": counters.get("passed", 0),
+            "pass_rate": round(counters.get("passed", 0) / validated, 4) if validated else None,
+            "reported": counters.get("reported", 0),
+            "reported_ok": counters.get("reported_ok", 0),
+            "crawls": counters.get("crawls", 0),
+            "crawled": counters.get("crawled", 0)
+        },
+        "last_crawl": counters.get("last_crawl"),
+        "last_validate": counters.get("last_validate"),
+        "last_feedback": counters.get("last_feedback"),
+        "last_cycle": counters.get("last_cycle"),
         "system_settings": {
             "check_interval": settings.CHECK_INTERVAL,
             "min_proxies_threshold": settings.MIN_PROXIES,
             "max_proxies_limit": settings.MAX_PROXIES,
             "proxy_timeout": settings.PROXY_TIMEOUT
-        }
+        },
+        "pool_snapshot": pool_snapshot.stats(),
+        "validator_concurrency": validator.limiter.stats(),
+        "validator_stages": validator.stage_stats
     }
+    if histogram:
+        lowers = [0, *edges]
+        uppers = [*edges, MAX_SCORE]
+        result["score_histogram"] = {
+            f"{lower:g}-{upper:g}": count for lower, upper, count in zip(lowers, uppers, stats["histogram"])
+        }
+    return result
 
-# 辅助函数：执行爬虫任务
-async def run_crawlers_task():
-    """运行所有爬虫的辅助函数"""
-    crawler_classes = discover_crawlers()
-    if not crawler_classes:
-        logger.warning("未发现爬虫类")
-        return 0
-        
-    logger.info(f"开始运行 {len(crawler_classes)} 个爬虫")
-    tasks = []
-    
-    for crawler_cls in crawler_classes:
-        crawler = crawler_cls()
-        tasks.append(crawler.crawl())
-    
-    results = await asyncio.gather(*tasks, return_exceptions=True)
-    
-    # 处理结果，记录错误
-    total_proxies = 0
-    success_count = 0
-    for i, result in enumerate(results):
-        if isinstance(result, Exception):
-            logger.error(f"爬虫 {crawler_classes[i].__name__} 执行出错: {str(result)}")
-        elif isinstance(result, int):
-            total_proxies += result
-            if result > 0:
-                success_count += 1
-    
-    logger.info(f"爬虫任务完成，{success_count}/{len(crawler_classes)} 个爬虫成功，共获取 {total_proxies} 个代理")
-    return total_proxies
+@router.get("/judge", summary="代理验证判定服务")
+async def judge(request: Request):
+    """
+    回显客户端IP和请求头，可通过JUDGE_URL配置为验证器的测试地址
+    """
+    return judge_payload(request.client.host if request.client else None, request.headers)
 
 @router.post("/crawl", summary="触发爬虫任务")
 async def trigger_crawl(background_tasks: BackgroundTasks):
     """手动触发爬虫任务（异步执行）"""
     # 在后台任务中执行爬虫，避免阻塞API响应
-    background_tasks.add_task(run_crawlers_task)
+    background_tasks.add_task(run_crawlers)
     return {"message": "爬虫任务已触发，正在后台执行"}
 
 @router.post("/validate", summary="触发代理验证")
-async def trigger_validate(background_tasks: BackgroundTasks):
+async def trigger_validate(
+    background_tasks: BackgroundTasks,
+    protocol: Optional[str] = Query(None, description="只验证指定协议的代理(http/https/socks5)")
+):
     """手动触发代理验证任务（异步执行）"""
     # 在后台任务中执行验证，避免阻塞API响应
-    background_tasks.add_task(validator.check_all_proxies)
+    background_tasks.add_task(validator.check_all_proxies, protocol.lower() if protocol else None)
     return {"message": "代理验证任务已触发，正在后台执行"}
 
 @router.delete("/proxy/{proxy}", summary="删除指定代理")
 async def delete_proxy(proxy: str = Path(..., description="要删除的代理URL")):
     """删除指定的代理"""
     # 检查代理是否存在
-    exists = await redis_conn.zscore(settings.PROXY_KEY, proxy)
-    if exists is None:
+    if not await redis_storage.exists(proxy):
         raise HTTPException(status_code=404, detail="代理不存在")
     
-    # 删除代理
-    await redis_conn.zrem(settings.PROXY_KEY, proxy)
-    logger.info(f"已删除代理: {proxy}")
+    # 删除代理（同时移除协议索引）
+    await redis_storage.remove_proxy(proxy)
     
     return {"message": f"代理 {proxy} 已成功删除"}
 
@@ -203,14 +246,10 @@ async def add_proxy(proxy: str = Query(..., description="要添加的代理URL")
     if "://" not in proxy:
         raise HTTPException(status_code=400, detail="代理格式无效，应为 protocol://ip:port")
     
-    # 添加代理
-    added = await redis_storage.add_proxy(proxy, 10)
+    # 加入待验证集合，验证通过后才进入代理池
+    added = await redis_storage.add_candidates([proxy])
     
     if added:
-        # 在后台验证代理
-        background_tasks = BackgroundTasks()
-        background_tasks.add_task(validator.validate_proxies, [proxy])
-        
         return {"message": f"代理 {proxy} 已添加并将在后台验证"}
     else:
         return {"message": f"代理 {proxy} 已存在"}
@@ -0,0 +1,233 @@
+import time
+import random
+import asyncio
+import logging
+from bisect import bisect, bisect_left
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.storage.redis_client import redis_storage
+
+logger = logging.getLogger(__name__)
+
+
+def _order(pair: Tuple[str, float]) -> Tuple[float, str]:
+    """快照数组的顺序：按分数升序，分数相同时按代理升序"""
+    return pair[1], pair[0]
+
+
+class PoolSnapshot:
+    """
+    API进程内的代理池快照 - 随机选取和分页直接读内存，不访问Redis
+
+    快照按协议保存代理与分数两个数组（按分数升序，None为全部代理）。后台任务订阅代理池变更频道，
+    存储层每次写入代理池后记录变更日志并发布通知，收到通知后只读取上次更新后变更的代理并更新数组：
+    - 两次更新至少间隔min_interval秒，验证结果频繁写入时合并为一次，
+      因此代理池变更最迟约min_interval秒后反映到快照中
+    - 没有通知时每max_age/2秒也检查一次变更日志，防止遗漏通知（例如订阅连接断开）
+    - 只有第一次加载、快照已过期，或变更日志已裁剪掉快照之后的记录时才重新加载整个代理池
+    - 快照超过max_age秒未更新（后台任务没有运行或Redis不可用）时不再使用，调用方改为直接读取Redis
+    - 每次加载或更新改变了快照后依次执行add_reload_hook()注册的回调（例如同步会话粘滞的哈希环），不占用请求处理
+    """
+    def __init__(self, storage=None, max_age: float = settings.POOL_SNAPSHOT_MAX_AGE,
+                 min_interval: float = settings.POOL_SNAPSHOT_MIN_INTERVAL):
+        self.storage = storage or redis_storage
+        self.max_age = max_age
+        self.min_interval = min_interval
+        self._pools: Dict[Optional[str], Tuple[List[str], List[float]]] = {}
+        # 代理 -> 分数，用于在数组中定位变更的代理
+        self._scores: Dict[str, float] = {}
+        # 快照对应的变更日志版本号
+        self.version = 0
+        self.loaded_at = 0.0
+        self._dirty = True
+        self._stopped = False
+        self._reload_hooks: List[Callable[[], Awaitable[None]]] = []
+
+    def add_reload_hook(self, hook: Callable[[], Awaitable[None]]) -> None:
+        """注册快照加载或更新后执行的协程函数"""
+        self._reload_hooks.append(hook)
+
+    def age(self) -> float:
+        """距上次加载的秒数，从未加载时为无穷大"""
+        return time.monotonic() - self.loaded_at if self.loaded_at else float("inf")
+
+    def ready(self) -> bool:
+        """快照已启用且在有效期内"""
+        return self.max_age > 0 and self.age() <= self.max_age
+
+    def _keys(self, proxy: str) -> Tuple[Optional[str], ...]:
+        """代理所在的数组：全部代理，以及支持的协议"""
+        protocol = self.storage.get_protocol(proxy)
+        return (None, protocol) if protocol in settings.PROTOCOLS else (None,)
+
+    def _build(self, pairs) -> None:
+        pools = {None: ([], [])}
+        for protocol in settings.PROTOCOLS:
+            pools[protocol] = ([], [])
+        for proxy, score in pairs:
+            for key in self._keys(proxy):
+                proxies, scores = pools[key]
+                proxies.append(proxy)
+                scores.append(score)
+        self._pools = pools
+
+    async def _loaded(self, changed: bool = True) -> None:
+        self.loaded_at = time.monotonic()
+        if not changed:
+            return
+        for hook in self._reload_hooks:
+            try:
+                await hook()
+            except Exception as e:
+                logger.error(f"快照加载回调异常: {str(e)}", exc_info=True)
+
+    async def reload(self) -> int:
+        """从Redis加载整个代理池，返回代理数量"""
+        self.version, pairs = await self.storage.pool_state()
+        # 分数相同的代理按名称排序（紧凑编码时Redis按编码后的字节排序），增量更新时可以二分查找
+        pairs.sort(key=_order)
+        self._build(pairs)
+        self._scores = dict(pairs)
+        await self._loaded()
+        return len(pairs)
+
+    async def update(self) -> int:
+        """读取上次更新后变更的代理并更新快照，返回变更的代理数
+
+        从未加载、快照已过期或变更日志不完整时改为重新加载整个代理池
+        """
+        if not self.ready():
+            return await self.reload()
+        version, changes = await self.storage.pool_changes(self.version)
+        if changes is None:
+            logger.info("变更日志已裁剪，重新加载整个代理池")
+            return await self.reload()
+        changed = self._apply(changes)
+        self.version = version
+        await self._loaded(changed)
+        return len(changes)
+
+    def _apply(self, changes: List[Tuple[str, Optional[float]]]) -> bool:
+        """在数组副本上删除/插入变更的代理后整体替换，变更较多时按分数重新排序；返回快照是否改变"""
+        changes = [(proxy, score) for proxy, score in changes if self._scores.get(proxy) != score]
+        if not changes:
+            return False
+        if len(changes) > max(64, len(self._scores) // 16):
+            for proxy, score in changes:
+                if score is None:
+                    self._scores.pop(proxy, None)
+                else:
+                    self._scores[proxy] = score
+            self._build(sorted(self._scores.items(), key=_order))
+            return True
+        pools = {}
+        for proxy, score in changes:
+            old = self._scores.get(proxy)
+            for key in self._keys(proxy):
+                if key not in pools:
+                    proxies, scores = self._pool(key)
+                    pools[key] = (list(proxies), list(scores))
+                proxies, scores = pools[key]
+                if old is not None:
+                    index = bisect_left(proxies, proxy, bisect_left(scores, old), bisect(scores, old))
+                    del proxies[index]
+                    del scores[index]
+                if score is not None:
+                    index = bisect(proxies, proxy, bisect_left(scores, score), bisect(scores, score))
+                    proxies.insert(index, proxy)
+                    scores.insert(index, score)
+            if score is None:
+                del self._scores[proxy]
+            else:
+                self._scores[proxy] = score
+        self._pools = {**self._pools, **pools}
+        return True
+
+    def _pool(self, protocol: Optional[str]) -> Tuple[List[str], List[float]]:
+        return self._pools.get(protocol, ([], []))
+
+    def random(self, count: int = 1, protocol: Optional[str] = None) -> Optional[List[Tuple[str, float]]]:
+        """随机选取不重复的代理，快照不可用时返回None"""
+        if not self.ready():
+            return None
+        proxies, scores = self._pool(protocol)
+        return [(proxies[i], scores[i]) for i in random.sample(range(len(proxies)), min(count, len(proxies)))]
+
+    def page(self, offset: int = 0, limit: int = 100,
+             protocol: Optional[str] = None) -> Optional[List[Tuple[str, float]]]:
+        """按分数倒序分页，快照不可用时返回None"""
+        if not self.ready():
+            return None
+        proxies, scores = self._pool(protocol)
+        start = len(proxies) - 1 - offset
+        stop = max(-1, start - limit)
+        return [(proxies[i], scores[i]) for i in range(start, stop, -1)]
+
+    def top(self, count: int, protocol: Optional[str] = None) -> Optional[List[Tuple[str, float]]]:
+        """分数最高的count个代理（按分数倒序），快照不可用时返回None"""
+        return self.page(0, count, protocol)
+
+    def members(self, protocol: Optional[str] = None) -> Tuple[List[str], List[float]]:
+        """最近一次加载的代理与分数数组（按分数升序），不检查是否过期"""
+        return self._pool(protocol)
+
+    def count(self, protocol: Optional[str] = None) -> Optional[int]:
+        """代理数量，快照不可用时返回None"""
+        if not self.ready():
+            return None
+        return len(self._pool(protocol)[0])
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.max_age > 0,
+            "ready": self.ready(),
+            "size": len(self._pool(None)[0]),
+            "version": self.version,
+            "age": round(self.age(), 3) if self.loaded_at else None
+        }
+
+    async def refresh(self) -> bool:
+        """按需更新快照，返回是否更新"""
+        since = self.age()
+        if (self._dirty and since >= self.min_interval) or since >= self.max_age / 2:
+            self._dirty = False
+            await self.update()
+            return True
+        return False
+
+    def _wait_time(self) -> float:
+        """距下一次可能更新的秒数"""
+        since = self.age()
+        if self._dirty:
+            return max(0.0, self.min_interval - since)
+        return max(0.0, self.max_age / 2 - since)
+
+    async def run(self):
+        """订阅代理池变更通知并维护快照，直到调用stop()"""
+        if self.max_age <= 0:
+            return
+        self._stopped = False
+        while not self._stopped:
+            try:
+                async with self.storage.conn.pubsub() as pubsub:
+                    await pubsub.subscribe(self.storage.change_channel)
+                    # 订阅前的变更可能没有收到通知，（重新）订阅后先按变更日志更新一次
+                    self._dirty = True
+                    while not self._stopped:
+                        await self.refresh()
+                        message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=self._wait_time())
+                        if message:
+                            self._dirty = True
+            except asyncio.CancelledError:
+                logger.info("代理池快照任务被取消")
+                break
+            except Exception as e:
+                logger.error(f"代理池快照更新异常: {str(e)}", exc_info=True)
+                await asyncio.sleep(1)
+
+    def stop(self):
+        self._stopped = True
+
+
+# 全局代理池快照（每个API进程一份）
+pool_snapshot = PoolSnapshot()
@@ -1,5 +1,6 @@
 import os
 from enum import Enum
+from typing import List
 
 class LogLevel(str, Enum):
     DEBUG = "DEBUG"
@@ -13,12 +14,70 @@ class Settings:
     REDIS_PORT: int = int(os.getenv("REDIS_PORT", 6379))
     REDIS_DB: int = int(os.getenv("REDIS_DB", 0))
     PROXY_KEY: str = os.getenv("PROXY_KEY", "proxies:valid")
+    # 按协议拆分的二级索引（有序集合），键名为 {前缀}:{协议}
+    PROTOCOL_KEY_PREFIX: str = os.getenv("PROTOCOL_KEY_PREFIX", "proxies:protocol")
+    PROTOCOLS: List[str] = ["http", "https", "socks4", "socks5"]
+    FAIL_KEY: str = os.getenv("FAIL_KEY", "proxies:fails")  # 代理连续验证失败次数（哈希）
+    CHECKED_KEY: str = os.getenv("CHECKED_KEY", "proxies:checked")  # 代理最近检查时间（有序集合）
+    CANDIDATE_KEY: str = os.getenv("CANDIDATE_KEY", "proxies:candidates")  # 爬取后待验证的代理（有序集合，分数为入队时间）
+    META_KEY: str = os.getenv("META_KEY", "proxies:meta")  # 代理元数据（哈希，值为JSON）
+    PROXY_ENCODING: str = os.getenv("PROXY_ENCODING", "plain")  # 代理成员存储编码：plain/compact，切换前需运行 python -m app.storage.migrate
+    DEAD_KEY: str = os.getenv("DEAD_KEY", "proxies:dead")  # 最近验证失效的代理（有序集合，分数为过期时间）
+    LEASE_KEY: str = os.getenv("LEASE_KEY", "proxies:leases")  # 租约ID -> 代理（哈希），到期时间保存在 {LEASE_KEY}:expiry（有序集合）
+    LEASED_KEY: str = os.getenv("LEASED_KEY", "proxies:lease_owners")  # 独占租用中的代理 -> 持有的租约ID（哈希）
+    STATS_KEY: str = os.getenv("STATS_KEY", "proxies:stats")  # 写入时累加的统计计数（哈希）
+    POOL_CHANGE_CHANNEL: str = os.getenv("POOL_CHANGE_CHANNEL", "proxies:changed")  # 代理池变更通知的发布/订阅频道
+    POOL_CHANGES_KEY: str = os.getenv("POOL_CHANGES_KEY", "proxies:changes")  # 变更日志：代理 -> 最近一次变更的版本号（有序集合），版本号保存在 {POOL_CHANGES_KEY}:version（哈希）
     
     # 代理验证配置
     CHECK_INTERVAL: int = int(os.getenv("CHECK_INTERVAL", 300))  # 减少检查间隔，从600秒到300秒
     PROXY_TIMEOUT: int = int(os.getenv("PROXY_TIMEOUT", 15))     # 增加超时时间，从10秒到15秒
     MIN_PROXIES: int = int(os.getenv("MIN_PROXIES", 100))        # 增加最小代理数量，从50到100
     MAX_PROXIES: int = int(os.getenv("MAX_PROXIES", 2000))       # 增加最大代理数量，从1000到2000
+    VALIDATE_RATE: float = float(os.getenv("VALIDATE_RATE", 0))    # 每秒验证的代理数，0表示每个CHECK_INTERVAL覆盖一遍代理池
+    VALIDATE_BATCH_SIZE: int = int(os.getenv("VALIDATE_BATCH_SIZE", 20))  # 每次取出的最久未检查代理数
+    SCORE_LATENCY_ALPHA: float = float(os.getenv("SCORE_LATENCY_ALPHA", 0.3))  # 响应时间EWMA的权重，越大越偏重最近一次
+    SCORE_SUCCESS_ALPHA: float = float(os.getenv("SCORE_SUCCESS_ALPHA", 0.2))  # 成功率EWMA的权重
+    MAX_FAIL_COUNT: int = int(os.getenv("MAX_FAIL_COUNT", 3))      # 连续失败多少次后移除代理
+    FAIL_PENALTY: float = float(os.getenv("FAIL_PENALTY", 5))      # 每次验证失败扣除的分数
+    VALIDATE_FLUSH_SIZE: int = int(os.getenv("VALIDATE_FLUSH_SIZE", 100))           # 验证结果每批写入数量
+    VALIDATE_FLUSH_INTERVAL: float = float(os.getenv("VALIDATE_FLUSH_INTERVAL", 1))  # 验证结果最长写入间隔（秒）
+    VALIDATOR_INITIAL_CONCURRENCY: int = int(os.getenv("VALIDATOR_INITIAL_CONCURRENCY", 50))  # 验证器初始并发数
+    VALIDATOR_MIN_CONCURRENCY: int = int(os.getenv("VALIDATOR_MIN_CONCURRENCY", 5))
+    VALIDATOR_MAX_CONCURRENCY: int = int(os.getenv("VALIDATOR_MAX_CONCURRENCY", 1000))     # 同时受RLIMIT_NOFILE限制
+    VALIDATOR_TARGET_ERROR_RATIO: float = float(os.getenv("VALIDATOR_TARGET_ERROR_RATIO", 0.5))    # 错误率低于该值时增加并发
+    VALIDATOR_BACKOFF_ERROR_RATIO: float = float(os.getenv("VALIDATOR_BACKOFF_ERROR_RATIO", 0.9))  # 错误率高于该值时减少并发
+    VALIDATOR_DNS_CACHE_TTL: int = int(os.getenv("VALIDATOR_DNS_CACHE_TTL", 300))     # 验证器DNS缓存时间（秒）
+    VALIDATOR_CONNECT_TIMEOUT: float = float(os.getenv("VALIDATOR_CONNECT_TIMEOUT", 3))  # TCP预筛连接超时（秒），0表示关闭预筛
+    VALIDATOR_CONNECT_CONCURRENCY: int = int(os.getenv("VALIDATOR_CONNECT_CONCURRENCY", 500))  # TCP预筛并发数
+    CANDIDATE_MAX_SIZE: int = int(os.getenv("CANDIDATE_MAX_SIZE", 100000))   # 待验证集合上限，超出时丢弃新爬取的代理
+    DEAD_TTL: int = int(os.getenv("DEAD_TTL", 21600))  # 失效代理在多少秒内不再入队验证，0表示不记录
+    CANDIDATE_BATCH_SIZE: int = int(os.getenv("CANDIDATE_BATCH_SIZE", 100))  # 每次从待验证集合取出的代理数
+    CANDIDATE_POLL_TIMEOUT: float = float(os.getenv("CANDIDATE_POLL_TIMEOUT", 1))  # 待验证集合为空时阻塞等待的时间（秒）
+    # 验证使用的判定服务，多个地址用逗号分隔；为空时使用内置的公共服务列表
+    JUDGE_URLS: List[str] = [url.strip() for url in os.getenv("JUDGE_URL", "").split(",") if url.strip()]
+    
+    # 代理租用与使用反馈
+    LEASE_TTL: int = int(os.getenv("LEASE_TTL", 60))  # 默认租约时长（秒），反馈须在租约到期前提交
+    LEASE_MAX_TTL: int = int(os.getenv("LEASE_MAX_TTL", 3600))  # 客户端可以指定的最长租约时长（秒）
+    LEASE_EXCLUSIVE: bool = os.getenv("LEASE_EXCLUSIVE", "false").lower() == "true"  # 默认独占租用：租约到期前不再租给其他客户端
+    FEEDBACK_MAX_BATCH: int = int(os.getenv("FEEDBACK_MAX_BATCH", 1000))  # 每次反馈最多包含的结果数
+    
+    # 转发网关（python -m app.gateway.server）
+    GATEWAY_HOST: str = os.getenv("GATEWAY_HOST", "0.0.0.0")
+    GATEWAY_PORT: int = int(os.getenv("GATEWAY_PORT", 8899))
+    GATEWAY_PROTOCOL: str = os.getenv("GATEWAY_PROTOCOL", "")  # 只使用指定协议的上游代理，为空时使用全部
+    GATEWAY_TOP_N: int = int(os.getenv("GATEWAY_TOP_N", 200))  # 在分数最高的N个代理中按分数加权随机选择上游
+    GATEWAY_RETRIES: int = int(os.getenv("GATEWAY_RETRIES", 2))  # 上游连接失败后换用其他代理重试的次数
+    GATEWAY_CONNECT_TIMEOUT: float = float(os.getenv("GATEWAY_CONNECT_TIMEOUT", 5))  # 连接上游并完成握手的超时（秒）
+    GATEWAY_MAX_CONNECTIONS: int = int(os.getenv("GATEWAY_MAX_CONNECTIONS", 10000))  # 同时转发的最大连接数（另受RLIMIT_NOFILE限制）
+    GATEWAY_FLUSH_INTERVAL: float = float(os.getenv("GATEWAY_FLUSH_INTERVAL", 1))  # 上游使用结果写入间隔（秒）
+    
+    # API进程内代理池快照
+    POOL_SNAPSHOT_MAX_AGE: float = float(os.getenv("POOL_SNAPSHOT_MAX_AGE", 10))  # 快照最长使用时间（秒），超过后改为直接读取Redis，0表示不使用快照
+    POOL_SNAPSHOT_MIN_INTERVAL: float = float(os.getenv("POOL_SNAPSHOT_MIN_INTERVAL", 1))  # 收到变更通知后两次增量更新的最小间隔（秒）
+    POOL_CHANGE_LOG_SIZE: int = int(os.getenv("POOL_CHANGE_LOG_SIZE", 100000))  # 变更日志保留的代理数，快照落后超过该范围时重新加载整个代理池
+    SESSION_VNODES: int = int(os.getenv("SESSION_VNODES", 32))  # 会话粘滞一致性哈希环中每个代理的虚拟节点数
     
     # 爬虫触发配置
     CRAWL_INTERVAL: int = int(os.getenv("CRAWL_INTERVAL", 1800)) # 爬虫触发间隔（秒）
@@ -32,5 +91,15 @@ class Settings:
     # 爬虫配置
     CRAWL_TIMEOUT: int = int(os.getenv("CRAWL_TIMEOUT", 30))
     CRAWL_MAX_RETRIES: int = int(os.getenv("CRAWL_MAX_RETRIES", 3))
+    CRAWL_HOST_CONCURRENCY: int = int(os.getenv("CRAWL_HOST_CONCURRENCY", 2))     # 同一主机的最大并发请求数
+    CRAWL_HOST_INTERVAL: float = float(os.getenv("CRAWL_HOST_INTERVAL", 0.5))   # 同一主机相邻请求的最小间隔（秒）
+    CRAWL_MAX_CONNECTIONS: int = int(os.getenv("CRAWL_MAX_CONNECTIONS", 100))   # 爬虫共享客户端的最大连接数
+    CRAWL_MAX_KEEPALIVE: int = int(os.getenv("CRAWL_MAX_KEEPALIVE", 20))        # 爬虫共享客户端保留的空闲连接数
+    CRAWL_CACHE_KEY_PREFIX: str = os.getenv("CRAWL_CACHE_KEY_PREFIX", "crawl:cache")  # 爬虫响应缓存键前缀
+    CRAWL_CACHE_TTL: int = int(os.getenv("CRAWL_CACHE_TTL", 86400))  # 响应缓存有效期（秒），0表示不缓存
+    CRAWL_PARSE_EXECUTOR: str = os.getenv("CRAWL_PARSE_EXECUTOR", "process")  # 页面解析执行方式：process/thread/none
+    CRAWL_PARSE_WORKERS: int = int(os.getenv("CRAWL_PARSE_WORKERS", 0))         # 解析进程/线程数，0表示按CPU核数
+    CRAWL_HTTP2: bool = os.getenv("CRAWL_HTTP2", "false").lower() == "true"    # 启用HTTP/2（需要安装httpx[http2]）
+    BULK_CHUNK_SIZE: int = int(os.getenv("BULK_CHUNK_SIZE", 500))  # 批量入库时每个管道包含的代理数
 
 settings = Settings()
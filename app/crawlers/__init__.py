@@ -1,8 +1,11 @@
+import asyncio
 import importlib
 import pkgutil
 from pathlib import Path
 from typing import List, Type
 from .base_crawler import BaseCrawler
+from .client import crawl_client
+from app.storage.redis_client import redis_storage
 import logging
 
 logger = logging.getLogger(__name__)
@@ -35,3 +38,39 @@ def discover_crawlers() -> List[Type[BaseCrawler]]:
             continue
             
     return crawlers
+
+
+async def run_crawlers() -> int:
+    """运行所有爬虫，返回新增代理总数
+
+    整轮爬取共享一个HTTP客户端，连接池与keep-alive在所有爬虫之间复用
+    """
+    crawler_classes = discover_crawlers()
+    if not crawler_classes:
+        logger.warning("未发现爬虫类")
+        return 0
+        
+    logger.info(f"开始运行 {len(crawler_classes)} 个爬虫")
+    async with crawl_client() as client:
+        results = await asyncio.gather(
+            *(crawler_cls().crawl(client) for crawler_cls in crawler_classes),
+            return_exceptions=True
+        )
+    
+    # 处理结果，记录错误
+    total_proxies = 0
+    success_count = 0
+    for i, result in enumerate(results):
+        if isinstance(result, Exception):
+            logger.error(f"爬虫 {crawler_classes[i].__name__} 执行出错: {str(result)}")
+        elif isinstance(result, int):
+            total_proxies += result
+            if result > 0:
+                success_count += 1
+    
+    logger.info(f"爬虫任务完成，{success_count}/{len(crawler_classes)} 个爬虫成功，共获取 {total_proxies} 个代理")
+    try:
+        await redis_storage.record_crawl(total_proxies)
+    except Exception as e:
+        logger.error(f"记录爬取统计失败: {str(e)}")
+    return total_proxies
@@ -1,8 +1,12 @@
-from typing import Optional, List
+from typing import Optional, List, Tuple
 import httpx
 import asyncio
 import logging
 from app.core.config import settings
+from app.crawlers.cache import response_cache
+from app.crawlers.client import crawl_client
+from app.crawlers.executor import run_parse
+from app.crawlers.limiter import host_limiter
 from app.storage.redis_client import redis_storage
 
 logger = logging.getLogger(__name__)
@@ -13,46 +17,143 @@ class BaseCrawler:
         self.urls = []
         self.timeout = settings.CRAWL_TIMEOUT
         self.max_retries = settings.CRAWL_MAX_RETRIES
+        # 子类只需定制请求头和请求方法，HTTP客户端由整轮爬取共享
+        self.headers = {
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+        }
+        self.methods = ["GET"]  # 依次尝试的HTTP方法
+        # 为True时self.urls视为备用地址列表，按顺序取第一个解析出代理的结果
+        self.first_success_only = False
+        self.client: Optional[httpx.AsyncClient] = None
+        # 响应缓存：内容未变化的URL跳过解析与入库
+        self.cache = response_cache
+        self.unchanged = set()   # 本轮返回304或内容哈希未变的URL
+        self._fresh = {}         # 本轮下载到新内容的URL -> 待解析成功后写入的缓存项
+        self.truncated = False   # 本轮入库时待验证集合已满，部分代理被丢弃
+        # 解析在进程池/线程池中执行（process/thread/none），避免阻塞事件循环上的API服务
+        self.parse_executor = settings.CRAWL_PARSE_EXECUTOR
         
     async def fetch(self, url: str) -> Optional[str]:
-        """带重试机制的请求方法"""
-        async with httpx.AsyncClient() as client:
+        """带重试机制的条件请求方法，每次请求都受按主机的并发与速率限制
+
+        内容未变化（304或内容哈希与缓存一致）时返回None，并将url记入self.unchanged
+        """
+        cached = await self.cache.get(url)
+        headers = {**self.headers, **self.cache.conditional_headers(cached)}
+        for method in self.methods:
             for attempt in range(self.max_retries):
                 try:
-                    response = await client.get(
-                        url,
-                        timeout=self.timeout,
-                        headers={
-                            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-                        }
-                    )
+                    async with host_limiter.limit(url):
+                        response = await self.client.request(
+                            method,
+                            url,
+                            timeout=self.timeout,
+                            headers=headers
+                        )
+                    if response.status_code == 304:
+                        self.unchanged.add(url)
+                        return None
                     response.raise_for_status()
+                    entry = self.cache.entry_for(response)
+                    if cached and entry["digest"] == cached.get("digest"):
+                        self.unchanged.add(url)
+                        return None
+                    self._fresh[url] = entry
                     return response.text
                 except Exception as e:
-                    logger.warning(f"请求失败（尝试 {attempt+1}/{self.max_retries}）: {str(e)}")
-                    await asyncio.sleep(2 ** attempt)
+                    logger.warning(f"{method} 请求失败（尝试 {attempt+1}/{self.max_retries}）: {str(e)}")
+                    if attempt + 1 < self.max_retries:
+                        await asyncio.sleep(2 ** attempt)
         return None
 
+    async def fetch_all(self, urls: List[str]) -> List[Tuple[str, Optional[str]]]:
+        """并发获取所有URL，结果与urls顺序一致"""
+        async def fetch_one(url):
+            logger.info(f"尝试从 {url} 获取代理")
+            return url, await self.fetch(url)
+        return await asyncio.gather(*(fetch_one(url) for url in urls))
+
     def parse(self, html: str) -> List[str]:
         """解析方法需要子类实现"""
         raise NotImplementedError("子类必须实现parse方法")
 
-    async def crawl(self) -> int:
-        """执行爬取并返回获取的代理数量"""
+    def parse_response(self, html: str, url: str) -> List[str]:
+        """解析某个URL的响应，需要按来源选择解析方法的子类重写此方法"""
+        return self.parse(html)
+
+    async def parse_async(self, html: str, url: str) -> List[str]:
+        """在解析执行器中调用parse_response
+
+        进程池模式下会在工作进程中重新创建爬虫实例，parse_response只能依赖__init__中设置的属性
+        """
+        return await run_parse(self, html, url, self.parse_executor)
+
+    async def crawl(self, client: Optional[httpx.AsyncClient] = None) -> int:
+        """执行爬取并返回获取的代理数量
+
+        client为整轮爬取共享的HTTP客户端（见run_crawlers），单独运行时自动创建
+        """
+        if client is None:
+            async with crawl_client() as client:
+                return await self.crawl(client)
+        self.client = client
+        self.unchanged.clear()
+        self._fresh.clear()
+        self.truncated = False
         proxies = []
-        for url in self.urls:
-            html = await self.fetch(url)
-            if html:
-                try:
-                    proxies.extend(self.parse(html))
-                except Exception as e:
-                    logger.error(f"解析失败: {str(e)}")
+        # 解析成功的URL的缓存项，入库成功后才写入
+        parsed = {}
+        for url, html in await self.fetch_all(self.urls):
+            if url in self.unchanged:
+                logger.info(f"{url} 内容未变化，跳过解析")
+                if self.first_success_only:
+                    break  # 优先使用的地址内容未变，不再使用备用地址
+                continue
+            if not html:
+                continue
+            try:
+                url_proxies = await self.parse_async(html, url)
+            except Exception as e:
+                logger.error(f"解析失败: {str(e)}")
+                continue
+            entry = self._fresh.pop(url, None)
+            if entry:
+                parsed[url] = entry
+            if url_proxies:
+                proxies.extend(url_proxies)
+                logger.info(f"从 {url} 成功获取 {len(url_proxies)} 个代理")
+                if self.first_success_only:
+                    break  # 如果成功获取代理，就不再使用其他URL的结果
+        
+        if not proxies:
+            await self._save_cache(parsed)
+            if self.unchanged:
+                logger.info(f"{self.site_name} 没有内容发生变化的URL，跳过入库")
+            else:
+                logger.warning(f"{self.site_name} 所有URL均未获取到代理")
+            return 0
         
-        # 去重并存储代理
-        new_count = 0
-        for proxy in set(proxies):
-            if await redis_storage.add_proxy(proxy, 10):  # 初始分数10
-                new_count += 1
+        new_count = await self.save_proxies(proxies)
+        # 入库失败（抛出异常）或待验证集合已满时不记录缓存，下次仍完整解析入库，避免这些代理在缓存有效期内被跳过
+        if self.truncated:
+            logger.warning(f"{self.site_name} 部分代理因待验证集合已满未入队，不记录响应缓存")
+        else:
+            await self._save_cache(parsed)
+        return new_count
+
+    async def _save_cache(self, entries: dict) -> None:
+        for url, entry in entries.items():
+            await self.cache.set(url, entry)
+
+    async def save_proxies(self, proxies: List[str]) -> int:
+        """去重后加入待验证集合，返回新加入的代理数量
+
+        代理验证通过后才进入代理池（见app/validator/scheduler.py中的CandidateValidator）；
+        待验证集合已满、部分代理被丢弃时设置self.truncated
+        """
+        # 来源记入元数据，使用类名（ASCII），紧凑编码的latin-1连接也能原样保存
+        new_count, dropped = await redis_storage.enqueue_candidates(set(proxies), source=type(self).__name__)
+        self.truncated = dropped > 0
         
-        logger.info(f"{self.site_name} 爬取完成，新增代理: {new_count}")
+        logger.info(f"{self.site_name} 爬取完成，新增待验证代理: {new_count}")
         return new_count
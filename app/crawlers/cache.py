@@ -0,0 +1,76 @@
+import hashlib
+import logging
+from typing import Dict, Optional
+import httpx
+from redis.asyncio import Redis
+from app.core.config import settings
+from app.storage.redis_client import redis_conn
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    爬虫响应缓存（Redis哈希，每个URL一个键）
+
+    记录每个URL上次成功解析时的ETag、Last-Modified与内容哈希：
+    请求时带上If-None-Match/If-Modified-Since，服务器返回304或内容哈希未变时
+    跳过解析与入库。缓存项在CRAWL_CACHE_TTL秒后过期，届时重新完整下载一次。
+    """
+    def __init__(self, conn: Optional[Redis] = None):
+        self.conn = conn or redis_conn
+        self.key_prefix = settings.CRAWL_CACHE_KEY_PREFIX
+        self.ttl = settings.CRAWL_CACHE_TTL
+
+    def _key(self, url: str) -> str:
+        return f"{self.key_prefix}:{url}"
+
+    @staticmethod
+    def digest(content: bytes) -> str:
+        return hashlib.sha1(content).hexdigest()
+
+    @staticmethod
+    def conditional_headers(entry: Dict[str, str]) -> Dict[str, str]:
+        """根据缓存项生成条件请求头"""
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    @classmethod
+    def entry_for(cls, response: httpx.Response) -> Dict[str, str]:
+        """从响应中提取需要缓存的校验信息"""
+        return {
+            "etag": response.headers.get("ETag", ""),
+            "last_modified": response.headers.get("Last-Modified", ""),
+            "digest": cls.digest(response.content)
+        }
+
+    async def get(self, url: str) -> Dict[str, str]:
+        if self.ttl <= 0:
+            return {}
+        try:
+            return await self.conn.hgetall(self._key(url))
+        except Exception as e:
+            logger.warning(f"读取响应缓存失败: {str(e)}")
+            return {}
+
+    async def set(self, url: str, entry: Dict[str, str]):
+        """保存缓存项并刷新过期时间"""
+        if self.ttl <= 0:
+            return
+        key = self._key(url)
+        try:
+            async with self.conn.pipeline(transaction=True) as pipe:
+                pipe.delete(key)
+                pipe.hset(key, mapping=entry)
+                pipe.expire(key, self.ttl)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"写入响应缓存失败: {str(e)}")
+
+
+# 全局响应缓存
+response_cache = ResponseCache()
@@ -0,0 +1,38 @@
+import logging
+from contextlib import asynccontextmanager
+import httpx
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _http2_available() -> bool:
+    if not settings.CRAWL_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        logger.warning("未安装h2（pip install httpx[http2]），爬虫改用HTTP/1.1")
+        return False
+    return True
+
+
+@asynccontextmanager
+async def crawl_client():
+    """
+    一轮爬取共享的HTTP客户端
+
+    由run_crawlers创建并传给所有爬虫，连接池、keep-alive和TLS会话在整轮爬取中复用；
+    连接池大小由CRAWL_MAX_CONNECTIONS/CRAWL_MAX_KEEPALIVE配置。
+    """
+    limits = httpx.Limits(
+        max_connections=settings.CRAWL_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.CRAWL_MAX_KEEPALIVE
+    )
+    async with httpx.AsyncClient(
+        limits=limits,
+        timeout=settings.CRAWL_TIMEOUT,
+        follow_redirects=True,
+        http2=_http2_available()
+    ) as client:
+        yield client
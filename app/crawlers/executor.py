@@ -0,0 +1,66 @@
+import asyncio
+import importlib
+import logging
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Optional
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+PROCESS = "process"
+THREAD = "thread"
+INLINE = "none"
+
+_executors = {}
+# 工作进程内按类缓存的爬虫实例，避免每次解析都重新创建
+_worker_crawlers = {}
+
+
+def _parse_in_worker(module: str, qualname: str, html: str, url: str) -> List[str]:
+    """在工作进程中按模块与类名重建爬虫实例并解析（爬虫实例持有HTTP客户端，不能跨进程传递）"""
+    key = (module, qualname)
+    crawler = _worker_crawlers.get(key)
+    if crawler is None:
+        crawler_cls = getattr(importlib.import_module(module), qualname)
+        crawler = _worker_crawlers[key] = crawler_cls()
+    return crawler.parse_response(html, url)
+
+
+def get_parse_executor(kind: str) -> Optional[Executor]:
+    """获取（按需创建）指定类型的解析执行器，INLINE返回None"""
+    if kind == INLINE:
+        return None
+    executor = _executors.get(kind)
+    if executor is None:
+        workers = settings.CRAWL_PARSE_WORKERS or None
+        if kind == PROCESS:
+            # 使用spawn启动工作进程，不继承事件循环、连接与API服务的监听套接字
+            executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        else:
+            executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="crawler-parse")
+        _executors[kind] = executor
+    return executor
+
+
+async def run_parse(crawler, html: str, url: str, kind: str = None) -> List[str]:
+    """在解析执行器中调用crawler.parse_response，避免解析HTML阻塞事件循环"""
+    kind = kind or settings.CRAWL_PARSE_EXECUTOR
+    cls = type(crawler)
+    # 定义在函数内的类无法在工作进程中按名称找到，改用线程池
+    if kind == PROCESS and "<locals>" in cls.__qualname__:
+        kind = THREAD
+    executor = get_parse_executor(kind)
+    if executor is None:
+        return crawler.parse_response(html, url)
+    loop = asyncio.get_running_loop()
+    if kind == PROCESS:
+        return await loop.run_in_executor(executor, _parse_in_worker, cls.__module__, cls.__qualname__, html, url)
+    return await loop.run_in_executor(executor, crawler.parse_response, html, url)
+
+
+def shutdown_parse_executors():
+    """关闭所有解析执行器（应用退出时调用）"""
+    for executor in _executors.values():
+        executor.shutdown(wait=False, cancel_futures=True)
+    _executors.clear()
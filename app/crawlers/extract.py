@@ -0,0 +1,133 @@
+"""
+代理提取工具
+
+各爬虫共用的快速提取路径：
+- ip:port 纯文本与JSON/JavaScript中的ip、port字段使用预编译正则直接提取
+- 表格使用lxml + XPath解析，lxml不可用或解析失败时回退到BeautifulSoup(html.parser)
+"""
+
+import logging
+import re
+from typing import Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    import lxml.html
+except ImportError:  # pragma: no cover - lxml在requirements.txt中，缺失时使用BeautifulSoup
+    lxml = None
+
+IP_PATTERN = r"(?:\d{1,3}\.){3}\d{1,3}"
+# ip:port，端口后不能紧跟数字
+IP_PORT_RE = re.compile(rf"({IP_PATTERN}):(\d{{1,5}})(?!\d)")
+# JSON或JavaScript对象中先后出现的ip与port字段，例如 {"ip": "1.2.3.4", "port": "8080"}
+JSON_IP_PORT_RE = re.compile(rf"""["']?ip["']?\s*:\s*["']({IP_PATTERN})["'][^{{}}]*?["']?port["']?\s*:\s*["']?(\d{{1,5}})""")
+# IP与端口之间夹杂其他字符（如表格标签）时的宽松匹配
+LOOSE_IP_PORT_RE = re.compile(rf"({IP_PATTERN})[^\d]*?(\d{{1,5}})")
+
+
+def valid_ip(ip: str) -> bool:
+    parts = ip.split(".")
+    return len(parts) == 4 and all(part.isdigit() and 0 <= int(part) <= 255 for part in parts)
+
+
+def valid_port(port: str) -> bool:
+    return port.isdigit() and 1 <= int(port) <= 65535
+
+
+def _valid_pairs(matches: Iterable[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    return [(ip, port) for ip, port in matches if valid_ip(ip) and valid_port(port)]
+
+
+def extract_ip_ports(text: str) -> List[Tuple[str, str]]:
+    """从纯文本中提取所有 ip:port"""
+    return _valid_pairs(IP_PORT_RE.findall(text))
+
+
+def extract_json_ip_ports(text: str) -> List[Tuple[str, str]]:
+    """从JSON或JavaScript文本中提取ip/port字段，不需要先修正格式再json.loads"""
+    return _valid_pairs(JSON_IP_PORT_RE.findall(text))
+
+
+def extract_loose_ip_ports(html: str) -> List[Tuple[str, str]]:
+    """宽松匹配：IP后最近的一组数字视为端口，用于表格解析失败后的兜底"""
+    return _valid_pairs(LOOSE_IP_PORT_RE.findall(html))
+
+
+def _class_predicate(name: str) -> str:
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+def tables(html: str, table_id: Optional[str] = None,
+           table_class: Optional[str] = None) -> List[List[List[str]]]:
+    """
+    按表格返回每一行的td文本（已去除首尾空白）
+
+    可按id或class选择表格，未指定时返回页面中所有表格；只有th的表头行为空列表。
+    """
+    if lxml is not None:
+        try:
+            return _lxml_tables(html, table_id, table_class)
+        except Exception as e:
+            logger.debug(f"lxml解析失败，回退到BeautifulSoup: {str(e)}")
+    return _soup_tables(html, table_id, table_class)
+
+
+def table_rows(html: str, table_id: Optional[str] = None,
+               table_class: Optional[str] = None) -> List[List[str]]:
+    """与tables相同，但把所有表格的行按文档顺序合并返回"""
+    return [row for table in tables(html, table_id, table_class) for row in table]
+
+
+def _table_xpath(table_id: Optional[str], table_class: Optional[str]) -> str:
+    predicates = []
+    if table_id:
+        predicates.append(f"@id='{table_id}'")
+    if table_class:
+        predicates.append(_class_predicate(table_class))
+    return "//table" + "".join(f"[{predicate}]" for predicate in predicates)
+
+
+def _lxml_tables(html, table_id, table_class):
+    if not html.strip():
+        return []
+    root = lxml.html.fromstring(html)
+    result = []
+    for table in root.xpath(_table_xpath(table_id, table_class)):
+        # 只取属于当前表格的行，不包括嵌套表格中的行
+        rows = table.xpath("./tr | ./thead/tr | ./tbody/tr | ./tfoot/tr")
+        result.append([[cell.text_content().strip() for cell in row.xpath("./td")] for row in rows])
+    return result
+
+
+def _soup_tables(html, table_id, table_class):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, "html.parser")
+    attrs = {}
+    if table_id:
+        attrs["id"] = table_id
+    if table_class:
+        attrs["class"] = table_class
+    result = []
+    for table in soup.find_all("table", attrs):
+        rows = [row for row in table.find_all("tr") if row.find_parent("table") is table]
+        result.append([[cell.text.strip() for cell in row.find_all("td", recursive=False)] for row in rows])
+    return result
+
+
+def scan_row(cells: List[str], default_protocol: str = "http") -> Optional[Tuple[str, str, str]]:
+    """在一行单元格中查找IP、端口和协议，返回(ip, port, protocol)，找不到IP或端口时返回None"""
+    ip = port = None
+    protocol = default_protocol
+    for text in cells:
+        if not ip and valid_ip(text):
+            ip = text
+        elif not port and valid_port(text):
+            port = text
+        elif "https" in text.lower():
+            protocol = "https"
+        elif text.lower() == "http":
+            protocol = "http"
+    if ip and port:
+        return ip, port, protocol
+    return None
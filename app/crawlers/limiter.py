@@ -0,0 +1,53 @@
+import asyncio
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+from app.core.config import settings
+
+
+class HostLimiter:
+    """
+    按主机限制爬虫请求的并发数与速率
+
+    所有爬虫共享同一个限制器：同一主机（例如多个爬虫都会访问的raw.githubusercontent.com）
+    最多同时有concurrency个请求，且相邻两次请求的开始时间至少间隔interval秒；
+    不同主机之间互不影响，整轮爬取的耗时取决于最慢的单个主机。
+    """
+    def __init__(self, concurrency: int = settings.CRAWL_HOST_CONCURRENCY,
+                 interval: float = settings.CRAWL_HOST_INTERVAL):
+        self.concurrency = max(1, concurrency)
+        self.interval = interval
+        self._loop = None
+        self._semaphores = {}
+        self._next_start = {}
+
+    @staticmethod
+    def host(url: str) -> str:
+        return urlsplit(url).hostname or ""
+
+    def _reset_if_new_loop(self):
+        # 信号量绑定事件循环，换了事件循环（如测试中多次asyncio.run）时重新创建
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._semaphores.clear()
+            self._next_start.clear()
+
+    @asynccontextmanager
+    async def limit(self, url: str):
+        """在url所属主机的限额内执行请求"""
+        self._reset_if_new_loop()
+        host = self.host(url)
+        semaphore = self._semaphores.get(host)
+        if semaphore is None:
+            semaphore = self._semaphores[host] = asyncio.Semaphore(self.concurrency)
+        async with semaphore:
+            now = self._loop.time()
+            start = max(now, self._next_start.get(host, now))
+            self._next_start[host] = start + self.interval
+            if start > now:
+                await asyncio.sleep(start - now)
+            yield
+
+
+# 全局按主机限制器，所有爬虫共用
+host_limiter = HostLimiter()
@@ -1,6 +1,6 @@
 from typing import List
+from app.crawlers import extract
 from app.crawlers.base_crawler import BaseCrawler
-from bs4 import BeautifulSoup
 import logging
 
 logger = logging.getLogger(__name__)
@@ -14,25 +14,18 @@ class FreeProxyListCrawler(BaseCrawler):
     def parse(self, html: str) -> List[str]:
         """解析Free Proxy List HTML页面"""
         proxies = []
-        soup = BeautifulSoup(html, 'html.parser')
         
         # 解析表格数据
-        table = soup.find('table', {'id': 'proxylisttable'})
-        if not table:
+        tables = extract.tables(html, table_id="proxylisttable")
+        if not tables:
             logger.warning(f"{self.site_name} 未找到代理表格")
             return proxies
             
-        tbody = table.find('tbody')
-        if not tbody:
-            logger.warning(f"{self.site_name} 未找到表格内容")
-            return proxies
-            
-        for row in tbody.find_all('tr'):
-            cols = row.find_all('td')
+        for cols in tables[0]:
             if len(cols) >= 7:
-                ip = cols[0].text.strip()
-                port = cols[1].text.strip()
-                https = cols[6].text.strip().lower() == 'yes'
+                ip = cols[0]
+                port = cols[1]
+                https = cols[6].lower() == 'yes'
                 protocol = "https" if https else "http"
                 
                 if ip and port:
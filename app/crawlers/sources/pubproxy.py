@@ -1,10 +1,7 @@
 from typing import List
-import httpx
-import asyncio
 import logging
 import json
 from app.crawlers.base_crawler import BaseCrawler
-from app.storage.redis_client import redis_storage
 
 logger = logging.getLogger(__name__)
 
@@ -31,64 +28,17 @@ class PubProxyCrawler(BaseCrawler):
             "Cache-Control": "no-cache"
         }
     
-    async def fetch(self, url: str) -> str:
-        """获取API响应"""
-        async with httpx.AsyncClient(follow_redirects=True) as client:
-            for attempt in range(self.max_retries):
-                try:
-                    response = await client.get(
-                        url,
-                        timeout=self.timeout,
-                        headers=self.headers
-                    )
-                    if response.status_code == 200:
-                        return response.text
-                    else:
-                        logger.warning(f"请求失败，状态码: {response.status_code}")
-                except Exception as e:
-                    logger.warning(f"请求失败（尝试 {attempt+1}/{self.max_retries}）: {str(e)}")
-                    await asyncio.sleep(2 ** attempt)
-        return None
-    
-    async def crawl(self) -> int:
-        """执行爬取并返回获取的代理数量"""
-        proxies = []
-        
-        for url in self.urls:
-            logger.info(f"尝试从 {url} 获取代理")
-            response_text = await self.fetch(url)
-            if response_text:
-                try:
-                    # 根据URL选择不同的解析方法
-                    if "pubproxy.com" in url:
-                        url_proxies = self.parse_pubproxy(response_text)
-                    elif "getproxylist.com" in url:
-                        url_proxies = self.parse_getproxylist(response_text)
-                    elif "geonode.com" in url:
-                        url_proxies = self.parse_geonode(response_text)
-                    elif "proxyscrape.com" in url:
-                        url_proxies = self.parse_proxyscrape(response_text)
-                    else:
-                        url_proxies = []
-                    
-                    if url_proxies:
-                        proxies.extend(url_proxies)
-                        logger.info(f"从 {url} 成功获取 {len(url_proxies)} 个代理")
-                except Exception as e:
-                    logger.error(f"解析失败: {str(e)}")
-        
-        if not proxies:
-            logger.warning(f"{self.site_name} 所有URL均未获取到代理")
-            return 0
-        
-        # 去重并存储代理
-        new_count = 0
-        for proxy in set(proxies):
-            if await redis_storage.add_proxy(proxy, 10):  # 初始分数10
-                new_count += 1
-        
-        logger.info(f"{self.site_name} 爬取完成，新增代理: {new_count}")
-        return new_count
+    def parse_response(self, response_text: str, url: str) -> List[str]:
+        """根据URL选择不同的解析方法"""
+        if "pubproxy.com" in url:
+            return self.parse_pubproxy(response_text)
+        elif "getproxylist.com" in url:
+            return self.parse_getproxylist(response_text)
+        elif "geonode.com" in url:
+            return self.parse_geonode(response_text)
+        elif "proxyscrape.com" in url:
+            return self.parse_proxyscrape(response_text)
+        return []
     
     def parse_pubproxy(self, response_text: str) -> List[str]:
         """解析PubProxy API响应"""
@@ -0,0 +1,195 @@
+import time
+import asyncio
+import argparse
+import logging
+from typing import Optional, Tuple
+from urllib.parse import urlsplit
+from app.core.config import settings
+from app.gateway.upstream import UpstreamSelector, UpstreamError, TargetError, open_upstream, split_proxy, HTTP_PROTOCOLS
+from app.validator.concurrency import fd_limit_cap
+from app.validator.feedback import UsageRecorder
+
+logger = logging.getLogger(__name__)
+
+BAD_REQUEST = b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+BAD_GATEWAY = b"HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+CONNECTED = b"HTTP/1.1 200 Connection established\r\n\r\n"
+
+# 请求头最大长度
+MAX_HEAD_SIZE = 65536
+# 转发时每次读取的字节数
+CHUNK_SIZE = 65536
+
+
+async def _pipe(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """单向转发直到对端关闭写入（随后半关闭另一端），连接出错时关闭另一端"""
+    try:
+        while True:
+            data = await reader.read(CHUNK_SIZE)
+            if not data:
+                break
+            writer.write(data)
+            await writer.drain()
+        if writer.can_write_eof():
+            writer.write_eof()
+    except OSError:
+        writer.close()
+
+
+def _origin_head(head: bytes, target: str) -> Tuple[Optional[str], int, bytes]:
+    """解析绝对URI形式的请求，返回(主机, 端口, 去掉Proxy-*头的请求头)；target不是绝对URI时主机为None"""
+    parts = urlsplit(target)
+    lines = [line for line in head.split(b"\r\n")[1:]
+             if line and not line.lower().startswith(b"proxy-")]
+    return parts.hostname, parts.port or 80, b"\r\n".join(lines)
+
+
+class ProxyGateway:
+    """
+    轮换转发网关 - 本地HTTP/HTTPS(CONNECT)正向代理，每个客户端连接选择一个上游代理
+
+    - 上游从代理池分数最高的代理中按分数加权随机选择（见UpstreamSelector）
+    - 连接上游或握手失败时换用其他代理重试，客户端无感知；全部失败时返回502
+    - 上游代理报告目标不可达（CONNECT返回502/503/504、SOCKS5主机不可达等）时直接返回502，
+      不重试、也不计入上游代理的使用结果，客户端请求失效的目标不会拖垮代理池
+    - 每次连接上游的结果（成功与耗时、失败）由UsageRecorder批量按EWMA计入代理评分；
+      结果只更新仍在代理池中的代理，已被验证器移除的代理不会因此重新加入
+    - 连接建立后双向转发原始字节，同一客户端连接上的后续请求使用同一个上游
+    """
+    def __init__(self, storage=None, selector: Optional[UpstreamSelector] = None, recorder: Optional[UsageRecorder] = None,
+                 retries: int = settings.GATEWAY_RETRIES, connect_timeout: float = settings.GATEWAY_CONNECT_TIMEOUT,
+                 max_connections: int = settings.GATEWAY_MAX_CONNECTIONS):
+        self.selector = selector or UpstreamSelector(storage)
+        self.recorder = recorder or UsageRecorder(storage)
+        self.retries = retries
+        self.connect_timeout = connect_timeout
+        # 每个转发占用客户端和上游两个文件描述符
+        self._slots = asyncio.Semaphore(fd_limit_cap(max_connections * 2) // 2)
+        self.active = 0
+        self.stats = {"connections": 0, "upstream_failures": 0, "target_errors": 0, "bad_gateway": 0}
+        self._tasks = []
+        self._server = None
+
+    async def _connect(self, host: str, port: int, tunnel: bool):
+        """依次尝试选出的上游代理，返回(上游代理, reader, writer)，全部失败或目标不可达时返回None"""
+        for proxy in await self.selector.choose(self.retries + 1):
+            started = time.perf_counter()
+            try:
+                reader, writer = await open_upstream(proxy, host, port, self.connect_timeout, tunnel)
+            except TargetError as e:
+                logger.debug(f"经上游 {proxy} 连接 {host}:{port} 失败: {str(e)}")
+                self.stats["target_errors"] += 1
+                return None
+            except UpstreamError as e:
+                logger.debug(f"上游 {proxy} 不可用: {str(e)}")
+                self.stats["upstream_failures"] += 1
+                self.recorder.add(proxy, False)
+                continue
+            if tunnel or split_proxy(proxy)[0] not in HTTP_PROTOCOLS:
+                # 握手经上游代理到达目标，耗时与验证器测得的响应时间可比
+                self.recorder.add(proxy, True, (time.perf_counter() - started) * 1000)
+            else:
+                # 只建立了到上游的TCP连接，耗时远小于一次完整请求，只记录成功、不计入响应时间估计
+                self.recorder.add(proxy, True)
+            return proxy, reader, writer
+        self.stats["bad_gateway"] += 1
+        return None
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """处理一个客户端连接"""
+        async with self._slots:
+            self.active += 1
+            self.stats["connections"] += 1
+            try:
+                await self._relay(reader, writer)
+            except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                pass
+            except Exception as e:
+                logger.error(f"转发异常: {str(e)}", exc_info=True)
+            finally:
+                self.active -= 1
+                writer.close()
+
+    async def _relay(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        head = await reader.readuntil(b"\r\n\r\n")
+        request_line = head.split(b"\r\n", 1)[0].decode("latin-1")
+        try:
+            method, target, version = request_line.split(" ", 2)
+        except ValueError:
+            writer.write(BAD_REQUEST)
+            return
+
+        if method.upper() == "CONNECT":
+            host, _, port = target.rpartition(":")
+            if not host or not port.isdigit():
+                writer.write(BAD_REQUEST)
+                return
+            upstream = await self._connect(host.strip("[]"), int(port), tunnel=True)
+            if upstream is None:
+                writer.write(BAD_GATEWAY)
+                return
+            _, upstream_reader, upstream_writer = upstream
+            writer.write(CONNECTED)
+        else:
+            host, port, headers = _origin_head(head, target)
+            if not host:
+                writer.write(BAD_REQUEST)
+                return
+            upstream = await self._connect(host, port, tunnel=False)
+            if upstream is None:
+                writer.write(BAD_GATEWAY)
+                return
+            proxy, upstream_reader, upstream_writer = upstream
+            if split_proxy(proxy)[0] not in HTTP_PROTOCOLS:
+                # SOCKS隧道直达目标，改用相对路径
+                parts = urlsplit(target)
+                target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+            upstream_writer.write(f"{method} {target} {version}\r\n".encode("latin-1") + headers + b"\r\n\r\n")
+        try:
+            await writer.drain()
+            await asyncio.gather(_pipe(reader, upstream_writer), _pipe(upstream_reader, writer))
+        finally:
+            upstream_writer.close()
+
+    async def start(self, host: str = settings.GATEWAY_HOST, port: int = settings.GATEWAY_PORT) -> int:
+        """开始监听并启动快照和结果记录任务，返回实际监听的端口"""
+        self._server = await asyncio.start_server(self.handle, host, port, backlog=4096, limit=MAX_HEAD_SIZE)
+        self._tasks = [asyncio.create_task(self.selector.snapshot.run()), asyncio.create_task(self.recorder.run())]
+        port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"转发网关已启动: {host}:{port}")
+        return port
+
+    async def stop(self) -> None:
+        """停止监听，写入剩余的使用结果"""
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        self.selector.snapshot.stop()
+        self.recorder.stop()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def serve_forever(self, host: str = settings.GATEWAY_HOST, port: int = settings.GATEWAY_PORT) -> None:
+        await self.start(host, port)
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+
+def main():
+    from app.log_config import setup_logging
+    parser = argparse.ArgumentParser(description="轮换转发网关")
+    parser.add_argument("--host", default=settings.GATEWAY_HOST, help="监听地址")
+    parser.add_argument("--port", type=int, default=settings.GATEWAY_PORT, help="监听端口")
+    args = parser.parse_args()
+    setup_logging()
+    try:
+        asyncio.run(ProxyGateway().serve_forever(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+import random
+import socket
+import asyncio
+import ipaddress
+import logging
+from typing import List, Optional, Tuple
+from app.core.config import settings
+from app.api.snapshot import PoolSnapshot
+from app.storage.redis_client import redis_storage
+
+logger = logging.getLogger(__name__)
+
+# 以HTTP方式转发的上游代理协议，其余按SOCKS握手
+HTTP_PROTOCOLS = ("http", "https")
+
+
+# 上游代理对CONNECT返回这些状态码、SOCKS5返回这些应答码（网络不可达、主机不可达、连接被拒绝）时，
+# 表示代理本身可用而目标不可达
+TARGET_HTTP_STATUS = (b"502", b"503", b"504")
+TARGET_SOCKS5_REPLIES = (0x03, 0x04, 0x05)
+
+
+class UpstreamError(Exception):
+    """连接上游代理或握手失败"""
+
+
+class TargetError(Exception):
+    """上游代理报告目标不可达，通常是客户端请求的目标主机的问题，与上游代理无关"""
+
+
+def split_proxy(proxy: str) -> Tuple[str, str, int]:
+    """把protocol://host:port拆为(协议, 主机, 端口)，IPv6地址去掉方括号"""
+    protocol, _, address = proxy.partition("://")
+    host, _, port = address.rpartition(":")
+    return protocol.lower(), host.strip("[]"), int(port)
+
+
+async def _http_connect(reader, writer, host: str, port: int) -> None:
+    target = f"[{host}]:{port}" if ":" in host else f"{host}:{port}"
+    writer.write(f"CONNECT {target} HTTP/1.1\r\nHost: {target}\r\n\r\n".encode())
+    await writer.drain()
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = head.split(b" ", 2)[1] if b" " in head else b""
+    if status in TARGET_HTTP_STATUS:
+        raise TargetError(f"CONNECT返回 {head.splitlines()[0].decode('latin-1')}")
+    if not status.startswith(b"2"):
+        raise UpstreamError(f"CONNECT返回 {head.splitlines()[0].decode('latin-1')}")
+
+
+async def _socks5_connect(reader, writer, host: str, port: int) -> None:
+    writer.write(b"\x05\x01\x00")
+    if await reader.readexactly(2) != b"\x05\x00":
+        raise UpstreamError("SOCKS5认证协商失败")
+    try:
+        address = ipaddress.ip_address(host)
+        atyp = b"\x01" if address.version == 4 else b"\x04"
+        addr = atyp + address.packed
+    except ValueError:
+        encoded = host.encode("idna")
+        addr = b"\x03" + bytes([len(encoded)]) + encoded
+    writer.write(b"\x05\x01\x00" + addr + port.to_bytes(2, "big"))
+    _, rep, _, atyp = await reader.readexactly(4)
+    if rep in TARGET_SOCKS5_REPLIES:
+        raise TargetError(f"SOCKS5连接目标失败: {rep}")
+    if rep != 0:
+        raise UpstreamError(f"SOCKS5连接失败: {rep}")
+    # 跳过绑定地址
+    if atyp == 1:
+        await reader.readexactly(4 + 2)
+    elif atyp == 4:
+        await reader.readexactly(16 + 2)
+    else:
+        length = (await reader.readexactly(1))[0]
+        await reader.readexactly(length + 2)
+
+
+async def _socks4_connect(reader, writer, host: str, port: int) -> None:
+    try:
+        ip = socket.inet_aton(host)
+        suffix = b""
+    except OSError:
+        # SOCKS4a: 由代理解析域名
+        ip = b"\x00\x00\x00\x01"
+        suffix = host.encode("idna") + b"\x00"
+    writer.write(b"\x04\x01" + port.to_bytes(2, "big") + ip + b"\x00" + suffix)
+    reply = await reader.readexactly(8)
+    if reply[1] != 0x5A:
+        raise UpstreamError(f"SOCKS4连接失败: {reply[1]}")
+
+
+HANDSHAKES = {
+    "http": _http_connect,
+    "https": _http_connect,
+    "socks4": _socks4_connect,
+    "socks5": _socks5_connect,
+}
+
+
+async def open_upstream(proxy: str, host: str, port: int, timeout: float,
+                        tunnel: bool = True) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    """经上游代理连接host:port
+
+    tunnel为False且上游是HTTP代理时只建立TCP连接，由调用方以绝对URI形式转发请求；
+    其他情况完成CONNECT/SOCKS握手，返回的连接即为到目标的隧道。
+    上游代理的问题抛出UpstreamError，上游代理报告目标不可达时抛出TargetError
+    """
+    protocol, proxy_host, proxy_port = split_proxy(proxy)
+    handshake = HANDSHAKES.get(protocol)
+    if handshake is None:
+        raise UpstreamError(f"不支持的上游协议: {protocol}")
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(proxy_host, proxy_port), timeout)
+    except (OSError, asyncio.TimeoutError) as e:
+        raise UpstreamError(f"连接上游失败: {e!r}") from e
+    if tunnel or protocol not in HTTP_PROTOCOLS:
+        try:
+            await asyncio.wait_for(handshake(reader, writer, host, port), timeout)
+        except TargetError:
+            writer.close()
+            raise
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                UpstreamError) as e:
+            writer.close()
+            raise UpstreamError(f"上游握手失败: {e!r}") from e
+    return reader, writer
+
+
+class UpstreamSelector:
+    """
+    上游代理选择器 - 在分数最高的top_n个代理中按分数加权随机选择，不放回
+
+    优先读取进程内代理池快照（见app/api/snapshot.py），快照不可用时读取Redis中分数最高的一页
+    """
+    def __init__(self, storage=None, snapshot: Optional[PoolSnapshot] = None,
+                 top_n: int = settings.GATEWAY_TOP_N, protocol: Optional[str] = settings.GATEWAY_PROTOCOL or None):
+        self.storage = storage or redis_storage
+        self.snapshot = snapshot or PoolSnapshot(self.storage)
+        self.top_n = top_n
+        self.protocol = protocol
+
+    async def choose(self, count: int) -> List[str]:
+        """选出最多count个不同的上游代理，依次作为首选和重试"""
+        pairs = self.snapshot.top(self.top_n, self.protocol)
+        if pairs is None:
+            pairs = await self.storage.get_proxies_page(0, self.top_n, self.protocol)
+        # 加权不放回抽样（Efraimidis-Spirakis）：键为 u^(1/权重)，取键最大的count个
+        keyed = [(random.random() ** (1 / score), proxy) for proxy, score in pairs if score > 0]
+        keyed.sort(reverse=True)
+        return [proxy for _, proxy in keyed[:count]]
@@ -0,0 +1,95 @@
+import socket
+import struct
+from typing import Optional, Tuple
+
+PLAIN = "plain"
+COMPACT = "compact"
+
+# 协议编号，紧凑编码的第一个字节；普通字符串以字母开头，不会与这些编号混淆
+PROTOCOL_CODES = {"http": 0, "https": 1, "socks4": 2, "socks5": 3}
+CODE_PROTOCOLS = {code: protocol for protocol, code in PROTOCOL_CODES.items()}
+PORT = struct.Struct(">H")
+IPV4_SIZE = 1 + 4 + PORT.size
+IPV6_SIZE = 1 + 16 + PORT.size
+
+
+def split_proxy(proxy: str) -> Optional[Tuple[str, str, int]]:
+    """把 protocol://ip:port 拆成(协议, IP, 端口)，主机不是IP地址或带认证信息时返回None"""
+    protocol, sep, address = proxy.partition("://")
+    if not sep or "@" in address:
+        return None
+    host, sep, port = address.rpartition(":")
+    if not sep or not port.isdigit():
+        return None
+    if host.startswith("[") and host.endswith("]"):
+        host = host[1:-1]
+    return protocol.lower(), host, int(port)
+
+
+def pack(proxy: str) -> Optional[bytes]:
+    """紧凑编码：协议(1字节) + IPv4(4字节)/IPv6(16字节) + 端口(2字节)，无法编码时返回None"""
+    parts = split_proxy(proxy)
+    if parts is None:
+        return None
+    protocol, host, port = parts
+    code = PROTOCOL_CODES.get(protocol)
+    if code is None or not 0 < port <= 65535:
+        return None
+    for family in (socket.AF_INET, socket.AF_INET6):
+        try:
+            return bytes([code]) + socket.inet_pton(family, host) + PORT.pack(port)
+        except OSError:
+            continue
+    return None
+
+
+def unpack(member: str) -> str:
+    """紧凑编码（latin-1字符串形式）还原为 protocol://ip:port
+
+    直接按字符取字节值，API每次返回都要还原，不经过ipaddress等较慢的解析
+    """
+    protocol = CODE_PROTOCOLS[ord(member[0])]
+    port = ord(member[-2]) << 8 | ord(member[-1])
+    if len(member) == IPV4_SIZE:
+        return f"{protocol}://{ord(member[1])}.{ord(member[2])}.{ord(member[3])}.{ord(member[4])}:{port}"
+    address = socket.inet_ntop(socket.AF_INET6, member[1:17].encode("latin-1"))
+    return f"{protocol}://[{address}]:{port}"
+
+
+def is_packed(member: str) -> bool:
+    return len(member) in (IPV4_SIZE, IPV6_SIZE) and ord(member[0]) in CODE_PROTOCOLS
+
+
+class PlainCodec:
+    """代理以 protocol://ip:port 字符串原样存储"""
+    name = PLAIN
+
+    def encode(self, proxy: str) -> str:
+        return proxy
+
+    def decode(self, member: str) -> str:
+        # 迁移工具通过latin-1连接读取时，成员可能仍是紧凑编码
+        return unpack(member) if is_packed(member) else member
+
+
+class CompactCodec(PlainCodec):
+    """
+    代理以紧凑二进制存储，IPv4代理从约24字节降到7字节
+
+    Redis连接以decode_responses返回字符串，二进制成员按latin-1一一映射为字符，
+    连接使用latin-1编码时Redis中保存的就是原始字节。主机名、带认证信息或未知协议的代理
+    无法紧凑编码，按原字符串存储，读取时两种成员都能还原。
+    """
+    name = COMPACT
+
+    def encode(self, proxy: str) -> str:
+        data = pack(proxy)
+        return data.decode("latin-1") if data is not None else proxy
+
+
+def get_codec(name: str) -> PlainCodec:
+    if name == COMPACT:
+        return CompactCodec()
+    if name == PLAIN:
+        return PlainCodec()
+    raise ValueError(f"未知的代理编码: {name}")
@@ -0,0 +1,144 @@
+"""
+代理编码迁移工具
+
+把Redis中已有的代理成员（主集合、协议索引、检查时间、待验证、失效集合、失败计数与元数据，
+以及租约中的代理和独占租用记录）转换为指定编码，切换PROXY_ENCODING前在服务停止时运行一次：
+
+    PROXY_ENCODING=compact python -m app.storage.migrate --to compact
+
+--indexes为升级前写入的代理补全协议索引和检查时间（只补写缺失的条目，服务运行时也可以执行）：
+
+    python -m app.storage.migrate --indexes
+"""
+
+import argparse
+import asyncio
+import logging
+from typing import List, Optional
+from app.core.config import settings
+from app.storage.codec import PLAIN, COMPACT, get_codec
+from app.storage.redis_client import RedisStorage
+
+logger = logging.getLogger(__name__)
+
+
+def _zset_keys(storage: RedisStorage) -> List[str]:
+    return [storage.proxy_key, *storage.protocol_keys(), storage.checked_key,
+            storage.candidate_key, storage.dead_key]
+
+
+async def _migrate_zset(storage: RedisStorage, key: str, batch_size: int) -> int:
+    """转换有序集合中的成员，分数保持不变，返回转换的成员数"""
+    converted = 0
+    batch = {}
+    old_members = []
+
+    async def flush():
+        async with storage.conn.pipeline(transaction=True) as pipe:
+            pipe.zadd(key, batch)
+            pipe.zrem(key, *old_members)
+            await pipe.execute()
+        batch.clear()
+        old_members.clear()
+
+    # 先收集再写入：ZSCAN遍历期间修改集合可能重复或遗漏成员
+    members = [item async for item in storage.conn.zscan_iter(key, count=batch_size)]
+    for member, score in members:
+        new_member = storage.codec.encode(storage.codec.decode(member))
+        if new_member == member:
+            continue
+        batch[new_member] = score
+        old_members.append(member)
+        converted += 1
+        if len(batch) >= batch_size:
+            await flush()
+    if batch:
+        await flush()
+    return converted
+
+
+async def _migrate_hash(storage: RedisStorage, key: str, batch_size: int) -> int:
+    """转换哈希中的字段（代理），值保持不变，返回转换的字段数"""
+    converted = 0
+    fields = [item async for item in storage.conn.hscan_iter(key, count=batch_size)]
+    for start in range(0, len(fields), batch_size):
+        mapping = {}
+        old_fields = []
+        for field, value in fields[start:start + batch_size]:
+            new_field = storage.codec.encode(storage.codec.decode(field))
+            if new_field != field:
+                mapping[new_field] = value
+                old_fields.append(field)
+        if mapping:
+            async with storage.conn.pipeline(transaction=True) as pipe:
+                pipe.hset(key, mapping=mapping)
+                pipe.hdel(key, *old_fields)
+                await pipe.execute()
+            converted += len(mapping)
+    return converted
+
+
+async def _migrate_hash_values(storage: RedisStorage, key: str, batch_size: int) -> int:
+    """转换哈希中的值（代理），字段保持不变，返回转换的值数"""
+    converted = 0
+    fields = [item async for item in storage.conn.hscan_iter(key, count=batch_size)]
+    for start in range(0, len(fields), batch_size):
+        mapping = {}
+        for field, value in fields[start:start + batch_size]:
+            new_value = storage.codec.encode(storage.codec.decode(value))
+            if new_value != value:
+                mapping[field] = new_value
+        if mapping:
+            await storage.conn.hset(key, mapping=mapping)
+            converted += len(mapping)
+    return converted
+
+
+async def migrate(encoding: str, storage: Optional[RedisStorage] = None,
+                  batch_size: int = settings.BULK_CHUNK_SIZE) -> int:
+    """把所有代理成员转换为encoding编码，返回转换的成员总数（各键分别计数）"""
+    # 始终使用latin-1连接（紧凑编码的连接），两种编码的成员都能原样读写
+    storage = storage or RedisStorage(encoding=COMPACT)
+    storage.codec = get_codec(encoding)
+    total = 0
+    for key in _zset_keys(storage):
+        count = await _migrate_zset(storage, key, batch_size)
+        if count:
+            logger.info(f"{key}: 转换 {count} 个成员")
+        total += count
+    for key in [storage.fail_key, storage.meta_key, storage.leased_key]:
+        count = await _migrate_hash(storage, key, batch_size)
+        if count:
+            logger.info(f"{key}: 转换 {count} 个字段")
+        total += count
+    # 租约哈希为租约ID -> 代理
+    count = await _migrate_hash_values(storage, storage.lease_key, batch_size)
+    if count:
+        logger.info(f"{storage.lease_key}: 转换 {count} 个值")
+    total += count
+    logger.info(f"迁移完成，编码: {encoding}，共转换 {total} 个成员")
+    return total
+
+
+async def run(args) -> None:
+    if args.to:
+        await migrate(args.to, batch_size=args.batch_size)
+    if args.indexes:
+        # 编码迁移后按目标编码读取成员
+        await RedisStorage(encoding=args.to or settings.PROXY_ENCODING).backfill_indexes(args.batch_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="代理编码与索引迁移工具")
+    parser.add_argument("--to", choices=[PLAIN, COMPACT], help="目标编码")
+    parser.add_argument("--indexes", action="store_true", help="补全协议索引和检查时间")
+    parser.add_argument("--batch-size", type=int, default=settings.BULK_CHUNK_SIZE, help="每个事务转换的成员数")
+    args = parser.parse_args()
+    if not args.to and not args.indexes:
+        parser.error("至少需要 --to 或 --indexes")
+    logging.basicConfig(level=logging.INFO, format=settings.LOG_FORMAT)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
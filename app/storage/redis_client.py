@@ -1,62 +1,881 @@
 from redis.asyncio import Redis
-from typing import Optional, List
+from typing import Optional, List, Tuple, Dict
 from app.core.config import settings
+from app.storage.codec import get_codec, COMPACT
+import json
 import logging
+import secrets
+import time
 
 logger = logging.getLogger(__name__)
 
+# 记录主集合的变更：每次脚本调用把版本号加1，变更的代理在变更日志中的分数更新为该版本号，
+# API进程的快照据此只读取上次更新后变更的代理（见RedisStorage.pool_changes）
+CHANGE_LOG = """
+local change_version
+local function log_change(changes_key, version_key, member)
+    if not change_version then
+        change_version = redis.call('HINCRBY', version_key, 'version', 1)
+    end
+    redis.call('ZADD', changes_key, change_version, member)
+end
+"""
+
+# 脚本公共部分。KEYS依次为：分数集合（主集合在前，之后为协议索引）、
+# 其他以代理为成员的有序集合、以代理为字段的哈希（第一个为失败计数），最后为变更日志和版本号。
+# ARGV[1]: 分数集合数量, ARGV[2]: 其他有序集合数量，脚本自身参数从ARGV[3]开始
+SCRIPT_PRELUDE = CHANGE_LOG + """
+local n_score = tonumber(ARGV[1])
+local n_zset = n_score + tonumber(ARGV[2])
+local fail_key = KEYS[n_zset + 1]
+local changes_key = KEYS[#KEYS - 1]
+local version_key = KEYS[#KEYS]
+local function remove_member(member)
+    for i = 1, n_zset do
+        redis.call('ZREM', KEYS[i], member)
+    end
+    for i = n_zset + 1, #KEYS - 2 do
+        redis.call('HDEL', KEYS[i], member)
+    end
+    log_change(changes_key, version_key, member)
+end
+local function set_score(member, score)
+    for i = 1, n_score do
+        redis.call('ZADD', KEYS[i], 'XX', score, member)
+    end
+    log_change(changes_key, version_key, member)
+end
+"""
+
+# 原子地弹出分数最低的代理，并清除其所有关联数据
+# ARGV[3]: 最大保留数量
+CLEANUP_SCRIPT = SCRIPT_PRELUDE + """
+local excess = redis.call('ZCARD', KEYS[1]) - tonumber(ARGV[3])
+if excess <= 0 then
+    return 0
+end
+local popped = redis.call('ZPOPMIN', KEYS[1], excess)
+for i = 1, #popped, 2 do
+    remove_member(popped[i])
+end
+return #popped / 2
+"""
+
+# 记录验证失败：累加连续失败次数并更新分数，达到上限或分数降到0以下时移除
+# ARGV[3]: 扣分, ARGV[4]: 最大连续失败次数, ARGV[5..]: 依次为(失败的代理, 新分数)，新分数为空字符串时按扣分计算
+# 返回 {移除数量, 失效代理...}，失效代理为被移除的代理和不在代理池中的代理（验证失败的待验证代理）
+FAILURE_SCRIPT = SCRIPT_PRELUDE + """
+local penalty = tonumber(ARGV[3])
+local max_fails = tonumber(ARGV[4])
+local result = {0}
+for i = 5, #ARGV, 2 do
+    local member = ARGV[i]
+    local score = redis.call('ZSCORE', KEYS[1], member)
+    if score then
+        local fails = redis.call('HINCRBY', fail_key, member, 1)
+        local new_score = tonumber(ARGV[i + 1]) or (tonumber(score) - penalty)
+        if fails >= max_fails or new_score <= 0 then
+            remove_member(member)
+            result[1] = result[1] + 1
+            table.insert(result, member)
+        else
+            set_score(member, new_score)
+        end
+    else
+        table.insert(result, member)
+    end
+end
+return result
+"""
+
+# 取出最久未检查的代理并把检查时间更新为当前时间，避免被其他调度器重复取出
+# KEYS[1]: 检查时间集合; ARGV[1]: 数量, ARGV[2]: 当前时间戳
+CLAIM_SCRIPT = """
+local members = redis.call('ZRANGE', KEYS[1], 0, tonumber(ARGV[1]) - 1)
+for _, member in ipairs(members) do
+    redis.call('ZADD', KEYS[1], 'XX', ARGV[2], member)
+end
+return members
+"""
+
+# 把爬取到的代理加入待验证集合，已在代理池中或最近验证失效的代理跳过，集合达到上限后不再加入
+# KEYS[1]: 主集合, KEYS[2]: 待验证集合, KEYS[3]: 失效集合（分数为过期时间）, KEYS[4]: 元数据哈希
+# ARGV[1]: 上限, ARGV[2]: 当前时间（同时作为入队时间）, ARGV[3]: 新代理的初始元数据（JSON，为空时不写入）, ARGV[4..]: 代理
+# 返回{新加入数, 因集合已满未处理的代理数}
+CANDIDATE_SCRIPT = """
+local room = tonumber(ARGV[1]) - redis.call('ZCARD', KEYS[2])
+local now = tonumber(ARGV[2])
+local added = 0
+for i = 4, #ARGV do
+    if room <= 0 then
+        return {added, #ARGV - i + 1}
+    end
+    local expires = redis.call('ZSCORE', KEYS[3], ARGV[i])
+    if not redis.call('ZSCORE', KEYS[1], ARGV[i]) and not (expires and tonumber(expires) > now) then
+        local n = redis.call('ZADD', KEYS[2], 'NX', ARGV[2], ARGV[i])
+        if n == 1 and ARGV[3] ~= '' then
+            redis.call('HSET', KEYS[4], ARGV[i], ARGV[3])
+        end
+        added = added + n
+        room = room - n
+    end
+end
+return {added, 0}
+"""
+
+# 更新验证结果的元数据（JSON）：检查时间、成功/失败次数，并合并验证器给出的字段（响应时间、匿名度、评分估计值等）
+# KEYS[1]: 主集合, KEYS[2]: 元数据哈希
+# ARGV[1]: 检查时间, ARGV[2]: 成功的代理数n, ARGV[3..]: 依次为(代理, 要合并的字段JSON)，前n组为成功的代理，
+# 之后为失败的代理；只更新仍在代理池中的代理（成功的代理已在同一事务中先写入分数，
+# 待验证代理失败或已被移除的代理不再写入元数据）
+META_SCRIPT = """
+local now = tonumber(ARGV[1])
+local n = tonumber(ARGV[2])
+for i = 3, #ARGV, 2 do
+    local member = ARGV[i]
+    local success = i < 3 + 2 * n
+    if redis.call('ZSCORE', KEYS[1], member) then
+        local raw = redis.call('HGET', KEYS[2], member)
+        local meta = raw and cjson.decode(raw) or {}
+        for field, value in pairs(cjson.decode(ARGV[i + 1])) do
+            meta[field] = value
+        end
+        meta.checked = now
+        if success then
+            meta.ok = (meta.ok or 0) + 1
+        else
+            meta.fail = (meta.fail or 0) + 1
+        end
+        redis.call('HSET', KEYS[2], member, cjson.encode(meta))
+    end
+end
+return n
+"""
+
+# 直接把代理加入代理池（分数、协议索引和检查时间），已在代理池中或最近验证失效的代理跳过
+# KEYS[1]: 主集合, KEYS[2..n-4]: 协议索引, KEYS[n-3]: 检查时间集合, KEYS[n-2]: 失效集合（分数为过期时间）,
+# KEYS[n-1]: 变更日志, KEYS[n]: 版本号
+# ARGV[1]: 分数, ARGV[2]: 当前时间, ARGV[3..]: 依次为(协议索引在KEYS中的位置，不支持的协议为0, 代理)
+# 新代理的检查时间为0，会被调度器优先验证；返回新加入的代理数
+ADD_SCRIPT = CHANGE_LOG + """
+local checked_key = KEYS[#KEYS - 3]
+local dead_key = KEYS[#KEYS - 2]
+local now = tonumber(ARGV[2])
+local added = 0
+for i = 3, #ARGV, 2 do
+    local member = ARGV[i + 1]
+    local expires = redis.call('ZSCORE', dead_key, member)
+    if not (expires and tonumber(expires) > now) and redis.call('ZADD', KEYS[1], 'NX', ARGV[1], member) == 1 then
+        local index = tonumber(ARGV[i])
+        if index > 0 then
+            redis.call('ZADD', KEYS[index], 'NX', ARGV[1], member)
+        end
+        redis.call('ZADD', checked_key, 'NX', 0, member)
+        log_change(KEYS[#KEYS - 1], KEYS[#KEYS], member)
+        added = added + 1
+    end
+end
+return added
+"""
+
+# 记录在事务中直接写入主集合的代理（更新分数、移除）
+# KEYS[1]: 变更日志, KEYS[2]: 版本号; ARGV: 代理
+LOG_SCRIPT = CHANGE_LOG + """
+for i = 1, #ARGV do
+    log_change(KEYS[1], KEYS[2], ARGV[i])
+end
+return #ARGV
+"""
+
+# 读取版本号since之后变更的代理及其当前分数
+# KEYS[1]: 变更日志, KEYS[2]: 版本号, KEYS[3]: 主集合; ARGV[1]: since
+# 返回 {当前版本号, 最早的完整版本号, 代理, 分数（已移除时为空字符串）, ...}；
+# 变更日志已裁剪掉since之后的记录（最早的完整版本号大于since）时不返回代理
+CHANGES_SCRIPT = """
+local state = redis.call('HMGET', KEYS[2], 'version', 'floor')
+local result = {tonumber(state[1]) or 0, tonumber(state[2]) or 0}
+if result[2] > tonumber(ARGV[1]) then
+    return result
+end
+for _, member in ipairs(redis.call('ZRANGEBYSCORE', KEYS[1], '(' .. ARGV[1], '+inf')) do
+    table.insert(result, member)
+    table.insert(result, redis.call('ZSCORE', KEYS[3], member) or '')
+end
+return result
+"""
+
+# 裁剪变更日志，只保留最近变更的ARGV[1]个代理，并记录最早的完整版本号
+# KEYS[1]: 变更日志, KEYS[2]: 版本号; 返回裁剪的数量
+TRIM_CHANGES_SCRIPT = """
+local excess = redis.call('ZCARD', KEYS[1]) - tonumber(ARGV[1])
+if excess <= 0 then
+    return 0
+end
+local last = redis.call('ZRANGE', KEYS[1], excess - 1, excess - 1, 'WITHSCORES')
+redis.call('ZREMRANGEBYRANK', KEYS[1], 0, excess - 1)
+redis.call('HSET', KEYS[2], 'floor', last[2])
+return excess
+"""
+
+# 补全协议索引和检查时间：只为仍在主集合中的代理补写缺失的条目（ZADD NX，分数取主集合中的当前分数），
+# 不覆盖已有条目，与其他进程的增删同时执行也不会丢失或复活代理
+# KEYS[1]: 主集合, KEYS[2..n-1]: 协议索引, KEYS[n]: 检查时间集合
+# ARGV: 依次为(协议索引在KEYS中的位置，不支持的协议为0, 代理)
+# 返回补写的索引条目数
+BACKFILL_SCRIPT = """
+local checked_key = KEYS[#KEYS]
+local added = 0
+for i = 1, #ARGV, 2 do
+    local member = ARGV[i + 1]
+    local score = redis.call('ZSCORE', KEYS[1], member)
+    if score then
+        local index = tonumber(ARGV[i])
+        if index > 0 then
+            added = added + redis.call('ZADD', KEYS[index], 'NX', score, member)
+        end
+        redis.call('ZADD', checked_key, 'NX', 0, member)
+    end
+end
+return added
+"""
+
+# 租用代理：随机选取代理并写入租约，同时清理已到期的租约
+# KEYS[1]: 读取的集合（主集合或协议索引）, KEYS[2]: 独占租用的代理 -> 持有的租约ID（哈希）, KEYS[3]: 租约哈希,
+# KEYS[4]: 租约到期集合
+# ARGV[1]: 数量, ARGV[2]: 当前时间, ARGV[3]: 到期时间, ARGV[4]: 是否独占(1/0), ARGV[5..]: 依次使用的租约ID
+# 无论是否独占都跳过被其他租约独占且未到期的代理，多取一些再跳过，大部分代理都被独占时返回的数量可能少于请求的数量
+# 返回 {租约ID, 代理, 分数, ...}
+LEASE_SCRIPT = """
+local count = tonumber(ARGV[1])
+local now = tonumber(ARGV[2])
+local exclusive = ARGV[4] == '1'
+local expired = redis.call('ZRANGEBYSCORE', KEYS[4], '-inf', now, 'LIMIT', 0, 1000)
+for _, id in ipairs(expired) do
+    local member = redis.call('HGET', KEYS[3], id)
+    if member and redis.call('HGET', KEYS[2], member) == id then
+        redis.call('HDEL', KEYS[2], member)
+    end
+end
+if #expired > 0 then
+    redis.call('HDEL', KEYS[3], unpack(expired))
+    redis.call('ZREM', KEYS[4], unpack(expired))
+end
+local sample = redis.call('ZRANDMEMBER', KEYS[1], count * 4 + 10, 'WITHSCORES')
+local result = {}
+local n = 0
+for i = 1, #sample, 2 do
+    if n >= count then
+        break
+    end
+    local owner = redis.call('HGET', KEYS[2], sample[i])
+    if not (owner and tonumber(redis.call('ZSCORE', KEYS[4], owner) or 0) > now) then
+        n = n + 1
+        local id = ARGV[4 + n]
+        redis.call('HSET', KEYS[3], id, sample[i])
+        redis.call('ZADD', KEYS[4], ARGV[3], id)
+        if exclusive then
+            redis.call('HSET', KEYS[2], sample[i], id)
+        end
+        table.insert(result, id)
+        table.insert(result, sample[i])
+        table.insert(result, sample[i + 1])
+    end
+end
+return result
+"""
+
+# 结束租约并取出租用的代理及其元数据，已到期或不存在的租约跳过，代理已不在代理池中时只结束租约；
+# 只有代理仍由该租约独占时才解除独占
+# KEYS[1]: 主集合, KEYS[2]: 独占租用的代理 -> 持有的租约ID（哈希）, KEYS[3]: 租约哈希, KEYS[4]: 租约到期集合,
+# KEYS[5]: 元数据哈希
+# ARGV[1]: 当前时间, ARGV[2..]: 租约ID
+# 返回 {租约ID, 代理, 元数据JSON（没有时为空字符串）, ...}
+RELEASE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local result = {}
+for i = 2, #ARGV do
+    local id = ARGV[i]
+    local member = redis.call('HGET', KEYS[3], id)
+    if member then
+        local expires = tonumber(redis.call('ZSCORE', KEYS[4], id))
+        redis.call('HDEL', KEYS[3], id)
+        redis.call('ZREM', KEYS[4], id)
+        if redis.call('HGET', KEYS[2], member) == id then
+            redis.call('HDEL', KEYS[2], member)
+        end
+        if expires and expires > now and redis.call('ZSCORE', KEYS[1], member) then
+            table.insert(result, id)
+            table.insert(result, member)
+            table.insert(result, redis.call('HGET', KEYS[5], member) or '')
+        end
+    end
+end
+return result
+"""
+
+# record_results按结果来源累加的统计计数：(结果数, 成功数, 最近写入时间)
+RESULT_COUNTERS = {
+    "validate": ("validated", "passed", "last_validate"),
+    "feedback": ("reported", "reported_ok", "last_feedback"),
+    "gateway": ("relayed", "relayed_ok", "last_relay"),
+}
+
 class RedisStorage:
-    def __init__(self):
-        self.conn = Redis(
+    def __init__(self, conn: Optional[Redis] = None, encoding: str = settings.PROXY_ENCODING):
+        # 代理成员的存储编码（plain/compact，见app/storage/codec.py），读取时统一还原为URL
+        self.codec = get_codec(encoding)
+        self.conn = conn or Redis(
             host=settings.REDIS_HOST,
             port=settings.REDIS_PORT,
             db=settings.REDIS_DB,
-            decode_responses=True
+            decode_responses=True,
+            # 紧凑编码的成员是二进制，latin-1按字节一一对应，Redis中保存的就是原始字节
+            encoding="latin-1" if encoding == COMPACT else "utf-8"
         )
         self.proxy_key = settings.PROXY_KEY
+        self.protocol_key_prefix = settings.PROTOCOL_KEY_PREFIX
+        self.fail_key = settings.FAIL_KEY
+        self.checked_key = settings.CHECKED_KEY
+        self.candidate_key = settings.CANDIDATE_KEY
+        self.dead_key = settings.DEAD_KEY
+        self.meta_key = settings.META_KEY
+        self.dead_ttl = settings.DEAD_TTL
+        self.lease_key = settings.LEASE_KEY
+        self.lease_expiry_key = f"{settings.LEASE_KEY}:expiry"
+        self.leased_key = settings.LEASED_KEY
+        self.stats_key = settings.STATS_KEY
+        self.change_channel = settings.POOL_CHANGE_CHANNEL
+        self.changes_key = settings.POOL_CHANGES_KEY
+        self.version_key = f"{settings.POOL_CHANGES_KEY}:version"
+        self._cleanup_script = self.conn.register_script(CLEANUP_SCRIPT)
+        self._failure_script = self.conn.register_script(FAILURE_SCRIPT)
+        self._claim_script = self.conn.register_script(CLAIM_SCRIPT)
+        self._candidate_script = self.conn.register_script(CANDIDATE_SCRIPT)
+        self._meta_script = self.conn.register_script(META_SCRIPT)
+        self._lease_script = self.conn.register_script(LEASE_SCRIPT)
+        self._release_script = self.conn.register_script(RELEASE_SCRIPT)
+        self._add_script = self.conn.register_script(ADD_SCRIPT)
+        self._backfill_script = self.conn.register_script(BACKFILL_SCRIPT)
+        self._log_script = self.conn.register_script(LOG_SCRIPT)
+        self._changes_script = self.conn.register_script(CHANGES_SCRIPT)
+        self._trim_changes_script = self.conn.register_script(TRIM_CHANGES_SCRIPT)
+
+    @staticmethod
+    def get_protocol(proxy: str) -> str:
+        """从代理URL中解析协议"""
+        return proxy.split("://")[0].lower() if "://" in proxy else "unknown"
+
+    def protocol_key(self, protocol: str) -> str:
+        """获取指定协议的索引键名"""
+        return f"{self.protocol_key_prefix}:{protocol.lower()}"
+
+    def protocol_keys(self) -> List[str]:
+        """获取所有协议索引键名"""
+        return [self.protocol_key(protocol) for protocol in settings.PROTOCOLS]
+
+    def _member_keys(self) -> Tuple[List[str], List[str], List[str]]:
+        """所有以代理为成员的键：(分数集合, 其他有序集合, 哈希)"""
+        return [self.proxy_key, *self.protocol_keys()], [self.checked_key], [self.fail_key, self.meta_key]
+
+    def _script_keys(self) -> Tuple[List[str], List[int]]:
+        """按SCRIPT_PRELUDE约定的顺序返回脚本的KEYS和ARGV前缀"""
+        score_keys, zset_keys, hash_keys = self._member_keys()
+        return [*score_keys, *zset_keys, *hash_keys, self.changes_key, self.version_key], [len(score_keys), len(zset_keys)]
+
+    def _encode(self, proxies) -> List[str]:
+        return [self.codec.encode(proxy) for proxy in proxies]
+
+    def _decode(self, members) -> List[str]:
+        return [self.codec.decode(member) for member in members]
+
+    def _decode_scores(self, pairs) -> List[Tuple[str, float]]:
+        return [(self.codec.decode(member), score) for member, score in pairs]
+
+    def _queue_remove(self, pipe, members: List[str]) -> None:
+        """在管道中加入移除代理（已编码的成员）及其所有关联数据的命令"""
+        score_keys, zset_keys, hash_keys = self._member_keys()
+        for key in score_keys + zset_keys:
+            pipe.zrem(key, *members)
+        for key in hash_keys:
+            pipe.hdel(key, *members)
+
+    def _queue_notify(self, pipe) -> None:
+        """在管道中加入代理池变更通知（PUBLISH），API进程据此刷新内存快照"""
+        pipe.publish(self.change_channel, "1")
+
+    async def _queue_changes(self, pipe, members: List[str]) -> None:
+        """在管道中加入变更日志记录（已编码的成员），须与主集合的写入在同一事务中"""
+        await self._log_script(keys=[self.changes_key, self.version_key], args=members, client=pipe)
+
+    async def _count(self, **counts) -> None:
+        """累加统计计数（HINCRBY），用于只有在写入完成后才知道的数量（新增、移除的代理数）"""
+        counts = {field: n for field, n in counts.items() if n}
+        if not counts:
+            return
+        async with self.conn.pipeline(transaction=False) as pipe:
+            for field, n in counts.items():
+                pipe.hincrby(self.stats_key, field, n)
+            await pipe.execute()
+
+    def _read_key(self, protocol: Optional[str]) -> str:
+        """按协议过滤时读取索引，否则读取主集合"""
+        return self.protocol_key(protocol) if protocol else self.proxy_key
+
+    def _index_key(self, proxy: str) -> Optional[str]:
+        """获取代理所属协议的索引键名，不支持的协议不建立索引"""
+        protocol = self.get_protocol(proxy)
+        if protocol in settings.PROTOCOLS:
+            return self.protocol_key(protocol)
+        return None
+
+    @staticmethod
+    def _pair_scores(result) -> List[Tuple[str, float]]:
+        """将ZRANDMEMBER WITHSCORES的返回值整理为(代理, 分数)列表"""
+        if not result:
+            return []
+        # 新版redis-py返回嵌套列表，旧版返回扁平列表
+        if isinstance(result[0], (list, tuple)):
+            return [(member, float(score)) for member, score in result]
+        return [(result[i], float(result[i + 1])) for i in range(0, len(result), 2)]
 
     async def add_proxy(self, proxy: str, score: float) -> bool:
-        """添加代理并返回是否为新代理"""
-        # 使用NX选项避免重复添加
-        added = await self.conn.zadd(
-            self.proxy_key,
-            {proxy: score},
-            nx=True,
-            ch=True
-        )
-        # 如果返回1表示新增，0表示已存在
-        is_new = added == 1
+        """添加代理并返回是否为新代理，最近验证失效的代理不会加入"""
+        is_new = await self.add_proxies_bulk([proxy], score) == 1
         if is_new:
             logger.debug(f"新增代理: {proxy}")
         else:
-            logger.debug(f"代理已存在: {proxy}")
+            logger.debug(f"代理已存在或最近已失效: {proxy}")
         return is_new
 
+    async def add_proxies_bulk(
+        self, proxies, score: float = 10, chunk_size: int = settings.BULK_CHUNK_SIZE
+    ) -> int:
+        """分块批量添加代理（脚本中ZADD NX），返回新增代理数量
+
+        与add_candidates一样先检查失效集合，DEAD_TTL秒内验证失效的代理跳过
+        """
+        proxies = list(dict.fromkeys(proxies))
+        keys = [self.proxy_key, *self.protocol_keys(), self.checked_key, self.dead_key, self.changes_key, self.version_key]
+        positions = {key: i for i, key in enumerate(keys, 1)}
+        now = time.time()
+        new_count = 0
+        for start in range(0, len(proxies), chunk_size):
+            chunk = proxies[start:start + chunk_size]
+            args = []
+            for proxy, member in zip(chunk, self._encode(chunk)):
+                args += [positions.get(self._index_key(proxy), 0), member]
+            # 每个分块一次往返，主集合与协议索引在同一脚本中写入
+            async with self.conn.pipeline(transaction=True) as pipe:
+                await self._add_script(keys=keys, args=[score, now, *args], client=pipe)
+                self._queue_notify(pipe)
+                added, _ = await pipe.execute()
+            new_count += added
+        await self._count(added=new_count)
+        logger.debug(f"批量添加代理: {len(proxies)}个，新增{new_count}个")
+        return new_count
+
+    async def add_candidates(
+        self, proxies, source: Optional[str] = None, max_size: int = settings.CANDIDATE_MAX_SIZE,
+        chunk_size: int = settings.BULK_CHUNK_SIZE
+    ) -> int:
+        """把爬取到的代理加入待验证集合，返回新加入的数量
+
+        待验证的代理不在代理池中，验证通过后由验证结果写入（record_results）进入代理池；
+        source为代理来源（爬虫名），与入队时间一起记入元数据
+        """
+        return (await self.enqueue_candidates(proxies, source, max_size, chunk_size))[0]
+
+    async def enqueue_candidates(
+        self, proxies, source: Optional[str] = None, max_size: int = settings.CANDIDATE_MAX_SIZE,
+        chunk_size: int = settings.BULK_CHUNK_SIZE
+    ) -> Tuple[int, int]:
+        """与add_candidates相同，返回(新加入数, 因待验证集合已满而丢弃的数量)"""
+        proxies = list(dict.fromkeys(proxies))
+        now = time.time()
+        meta = json.dumps({"source": source, "added": int(now)}) if source else ""
+        new_count = dropped = 0
+        for start in range(0, len(proxies), chunk_size):
+            chunk = proxies[start:start + chunk_size]
+            if dropped:
+                dropped += len(chunk)
+                continue
+            added, chunk_dropped = await self._candidate_script(
+                keys=[self.proxy_key, self.candidate_key, self.dead_key, self.meta_key],
+                args=[max_size, now, meta, *self._encode(chunk)]
+            )
+            new_count += added
+            dropped += chunk_dropped
+        if dropped:
+            logger.warning(f"待验证集合已满（上限{max_size}），丢弃{dropped}个代理")
+        elif new_count < len(proxies):
+            logger.debug(f"待验证代理: {len(proxies)}个，新加入{new_count}个（其余已在代理池、最近已失效或已在队列中）")
+        return new_count, dropped
+
+    async def pop_candidates(self, count: int) -> List[str]:
+        """按入队顺序取出最多count个待验证代理（ZPOPMIN，多个进程同时取出也不会重复）"""
+        return [self.codec.decode(member) for member, _ in await self.conn.zpopmin(self.candidate_key, count)]
+
+    async def wait_candidate(self, timeout: float) -> Optional[str]:
+        """阻塞等待一个待验证代理，超时返回None"""
+        result = await self.conn.bzpopmin(self.candidate_key, timeout)
+        return self.codec.decode(result[1]) if result else None
+
+    async def count_candidates(self) -> int:
+        """获取待验证代理数量"""
+        return await self.conn.zcard(self.candidate_key)
+
+    async def mark_dead(self, proxies: List[str]) -> None:
+        """把验证失效的代理记入失效集合，DEAD_TTL秒内不再入队验证，同时清理已过期的记录"""
+        await self._mark_dead_members(self._encode(proxies))
+
+    async def _mark_dead_members(self, members: List[str]) -> None:
+        if not members:
+            return
+        now = time.time()
+        async with self.conn.pipeline(transaction=True) as pipe:
+            # 失效的代理不在代理池中，元数据不再需要
+            pipe.hdel(self.meta_key, *members)
+            if self.dead_ttl > 0:
+                pipe.zadd(self.dead_key, dict.fromkeys(members, now + self.dead_ttl))
+                pipe.zremrangebyscore(self.dead_key, "-inf", now)
+            await pipe.execute()
+
+    async def filter_dead(self, proxies: List[str]) -> List[str]:
+        """去掉最近验证失效的代理"""
+        if not proxies or self.dead_ttl <= 0:
+            return proxies
+        now = time.time()
+        expires = await self.conn.zmscore(self.dead_key, self._encode(proxies))
+        return [proxy for proxy, expire in zip(proxies, expires) if not (expire and expire > now)]
+
+    async def count_dead(self) -> int:
+        """获取未过期的失效代理数量"""
+        return await self.conn.zcount(self.dead_key, time.time(), "+inf")
+
+    def _queue_scores(self, pipe, scores: dict, existing_only: bool = False) -> None:
+        """在管道中加入更新代理分数的命令，同时更新协议索引；existing_only为True时只更新已在代理池中的代理"""
+        mapping = {}
+        index_mappings = {}
+        for proxy, score in scores.items():
+            member = self.codec.encode(proxy)
+            mapping[member] = score
+            index_key = self._index_key(proxy)
+            if index_key:
+                index_mappings.setdefault(index_key, {})[member] = score
+        pipe.zadd(self.proxy_key, mapping, xx=existing_only)
+        for index_key, index_mapping in index_mappings.items():
+            pipe.zadd(index_key, index_mapping, xx=existing_only)
+
+    async def update_scores(self, scores: dict) -> None:
+        """批量更新代理分数，同时更新协议索引"""
+        if not scores:
+            return
+        async with self.conn.pipeline(transaction=True) as pipe:
+            self._queue_scores(pipe, scores)
+            await self._queue_changes(pipe, self._encode(scores))
+            self._queue_notify(pipe)
+            await pipe.execute()
+
+    async def record_results(
+        self, scores: dict, failures: List[str], details: Optional[dict] = None,
+        failure_scores: Optional[dict] = None, source: str = "validate"
+    ) -> int:
+        """在同一事务中写入一批验证结果，返回因连续失败被移除的代理数量
+
+        - 验证通过的代理更新分数并清零连续失败次数，不在代理池中的待验证代理由此加入代理池；
+          只有验证器的结果会加入新代理，其他来源的成功结果只更新仍在代理池中的代理
+          （客户端或网关可能在代理已被移除后才报告结果）
+        - 验证失败的代理连续失败次数加1，分数更新为failure_scores中的值（未给出时扣FAIL_PENALTY分），
+          达到MAX_FAIL_COUNT次或分数不大于0时移除；不在代理池中的代理直接忽略
+        - 被移除的代理和验证失败的待验证代理记入失效集合，DEAD_TTL秒内不会再次入队验证
+        - 元数据与分数在同一事务中更新：检查时间、成功/失败次数，以及details中代理 -> 字段字典
+          （响应时间、匿名度、评分估计值等）
+        - 累加统计计数：结果数、成功数、新加入和移除的代理数，并记录最近写入时间；
+          source为结果来源（validate: 验证器, feedback: 客户端使用反馈, gateway: 转发网关），计数字段见RESULT_COUNTERS
+        """
+        if not scores and not failures:
+            return 0
+        now = time.time()
+        async with self.conn.pipeline(transaction=True) as pipe:
+            # 通知在事务开头，主集合ZADD的返回值（新加入代理池的数量）为第5项，失败脚本的返回值为最后一项
+            self._queue_notify(pipe)
+            total_field, success_field, time_field = RESULT_COUNTERS[source]
+            pipe.hincrby(self.stats_key, total_field, len(scores) + len(failures))
+            pipe.hincrby(self.stats_key, success_field, len(scores))
+            pipe.hset(self.stats_key, time_field, now)
+            if scores:
+                admit = source == "validate"
+                self._queue_scores(pipe, scores, existing_only=not admit)
+                passed = self._encode(scores)
+                pipe.hdel(self.fail_key, *passed)
+                pipe.zadd(self.checked_key, dict.fromkeys(passed, now), xx=not admit)
+                if admit:
+                    pipe.zrem(self.dead_key, *passed)
+                await self._queue_changes(pipe, passed)
+            await self._queue_meta(pipe, scores, failures, details or {}, now)
+            if failures:
+                failure_scores = failure_scores or {}
+                failed = self._encode(failures)
+                # 先更新检查时间，随后被移除的代理会由脚本一并清除
+                pipe.zadd(self.checked_key, dict.fromkeys(failed, now), xx=True)
+                keys, prefix = self._script_keys()
+                await self._failure_script(
+                    keys=keys,
+                    args=[*prefix, settings.FAIL_PENALTY, settings.MAX_FAIL_COUNT,
+                          *(arg for proxy, member in zip(failures, failed)
+                            for arg in (member, failure_scores.get(proxy, "")))],
+                    client=pipe
+                )
+            results = await pipe.execute()
+        evicted = 0
+        if failures:
+            evicted, *dead = results[-1]
+            await self._mark_dead_members(dead)
+        await self._count(added=results[4] if scores else 0, removed=evicted)
+        if evicted:
+            logger.info(f"移除连续验证失败的代理: {evicted}个")
+        return evicted
+
+    async def _queue_meta(self, pipe, scores: dict, failures: List[str], details: dict, now: float) -> None:
+        """在管道中加入更新元数据的脚本调用，须在失败脚本之前（被移除的代理随后连同元数据一起清除）"""
+        args = []
+        for proxy in [*scores, *failures]:
+            fields = {field: value for field, value in details.get(proxy, {}).items() if value is not None}
+            args += [self.codec.encode(proxy), json.dumps(fields)]
+        await self._meta_script(
+            keys=[self.proxy_key, self.meta_key],
+            args=[int(now), len(scores), *args],
+            client=pipe
+        )
+
+    async def get_meta(self, proxies: List[str]) -> List[dict]:
+        """一次HMGET读取多个代理的元数据，没有元数据的代理返回空字典"""
+        if not proxies:
+            return []
+        values = await self.conn.hmget(self.meta_key, self._encode(proxies))
+        return [json.loads(value) if value else {} for value in values]
+
+    async def lease_proxies(
+        self, count: int = 1, protocol: Optional[str] = None, ttl: int = settings.LEASE_TTL,
+        exclusive: bool = settings.LEASE_EXCLUSIVE
+    ) -> List[Tuple[str, str, float]]:
+        """随机租用最多count个代理，返回(租约ID, 代理, 分数)列表
+
+        租约在ttl秒后到期；exclusive为True时租约到期或结束前该代理不会再租给其他客户端（无论是否独占）
+        """
+        now = time.time()
+        result = await self._lease_script(
+            keys=[self._read_key(protocol), self.leased_key, self.lease_key, self.lease_expiry_key],
+            args=[count, now, now + ttl, int(exclusive), *(secrets.token_hex(8) for _ in range(count))]
+        )
+        return [(result[i], self.codec.decode(result[i + 1]), float(result[i + 2])) for i in range(0, len(result), 3)]
+
+    async def release_leases(self, lease_ids: List[str]) -> List[Tuple[str, str, dict]]:
+        """结束租约，返回仍有效且代理仍在代理池中的(租约ID, 代理, 元数据)列表，每个租约只能结束一次"""
+        if not lease_ids:
+            return []
+        result = await self._release_script(
+            keys=[self.proxy_key, self.leased_key, self.lease_key, self.lease_expiry_key, self.meta_key],
+            args=[time.time(), *lease_ids]
+        )
+        return [
+            (result[i], self.codec.decode(result[i + 1]), json.loads(result[i + 2]) if result[i + 2] else {})
+            for i in range(0, len(result), 3)
+        ]
+
     async def get_proxies(self, count: int = 100) -> List[str]:
         """获取分数最高的前N个代理"""
-        return await self.conn.zrevrange(
+        return self._decode(await self.conn.zrevrange(
             self.proxy_key, 0, count-1, withscores=False
-        )
+        ))
+
+    async def get_proxies_page(
+        self, offset: int = 0, limit: int = 100, protocol: Optional[str] = None
+    ) -> List[Tuple[str, float]]:
+        """按分数倒序分页获取代理，指定协议时只读取该协议的索引"""
+        return self._decode_scores(await self.conn.zrevrange(
+            self._read_key(protocol), offset, offset + limit - 1, withscores=True
+        ))
 
-    async def count_proxies(self) -> int:
-        """获取当前代理总数"""
-        return await self.conn.zcard(self.proxy_key)
+    async def all_proxies(self, protocol: Optional[str] = None) -> List[str]:
+        """获取全部代理，指定协议时只读取该协议的索引"""
+        return self._decode(await self.conn.zrange(self._read_key(protocol), 0, -1))
+
+    async def pool_state(self) -> Tuple[int, List[Tuple[str, float]]]:
+        """在同一事务中读取变更版本号和整个代理池及分数（按分数升序），用于API进程的内存快照"""
+        async with self.conn.pipeline(transaction=True) as pipe:
+            pipe.hget(self.version_key, "version")
+            pipe.zrange(self.proxy_key, 0, -1, withscores=True)
+            version, pairs = await pipe.execute()
+        return int(version or 0), self._decode_scores(pairs)
+
+    async def pool_changes(self, since: int) -> Tuple[int, Optional[List[Tuple[str, Optional[float]]]]]:
+        """读取版本号since之后变更的代理，返回(当前版本号, [(代理, 当前分数，已移除时为None), ...])
+
+        耗时只与变更的代理数有关；变更日志已被裁剪、无法给出完整变更时列表为None，调用方应重新读取整个代理池
+        """
+        result = await self._changes_script(keys=[self.changes_key, self.version_key, self.proxy_key], args=[since])
+        version, floor, *pairs = result
+        if int(floor) > since:
+            return int(version), None
+        return int(version), [
+            (self.codec.decode(pairs[i]), float(pairs[i + 1]) if pairs[i + 1] != "" else None)
+            for i in range(0, len(pairs), 2)
+        ]
+
+    async def trim_changes(self, max_size: int = settings.POOL_CHANGE_LOG_SIZE) -> int:
+        """裁剪变更日志，只保留最近变更的max_size个代理，返回裁剪的数量"""
+        return await self._trim_changes_script(keys=[self.changes_key, self.version_key], args=[max_size])
+
+    async def iter_proxies(self, protocol: Optional[str] = None, batch_size: int = 500):
+        """用ZSCAN分批遍历代理，指定协议时只遍历该协议的索引"""
+        async for member, _ in self.conn.zscan_iter(self._read_key(protocol), count=batch_size):
+            yield self.codec.decode(member)
+
+    async def claim_stalest(self, count: int) -> List[str]:
+        """取出最久未检查的count个代理，并将其检查时间标记为当前时间"""
+        return self._decode(await self._claim_script(keys=[self.checked_key], args=[count, time.time()]))
+
+    async def random_proxies(self, count: int = 1, protocol: Optional[str] = None) -> List[Tuple[str, float]]:
+        """在服务端随机选取不重复的代理，耗时与代理池大小无关"""
+        result = await self.conn.zrandmember(self._read_key(protocol), count, withscores=True)
+        return self._decode_scores(self._pair_scores(result))
+
+    async def count_proxies(self, protocol: Optional[str] = None) -> int:
+        """获取当前代理总数，指定协议时返回该协议的代理数"""
+        return await self.conn.zcard(self._read_key(protocol))
+
+    async def count_by_protocol(self) -> Dict[str, int]:
+        """获取各协议代理数量，不在协议索引中的代理计为unknown"""
+        async with self.conn.pipeline(transaction=True) as pipe:
+            pipe.zcard(self.proxy_key)
+            for key in self.protocol_keys():
+                pipe.zcard(key)
+            total, *counts = await pipe.execute()
+        return self._protocol_counts(total, counts)
+
+    @staticmethod
+    def _protocol_counts(total: int, counts: List[int]) -> Dict[str, int]:
+        protocol_counts = {
+            protocol: count
+            for protocol, count in zip(settings.PROTOCOLS, counts)
+            if count
+        }
+        unknown = total - sum(counts)
+        if unknown > 0:
+            protocol_counts["unknown"] = unknown
+        return protocol_counts
+
+    @staticmethod
+    def _parse_counters(raw: dict) -> dict:
+        """把统计哈希的值还原为数字，last_cycle为JSON"""
+        counters = {}
+        for field, value in raw.items():
+            if field == "last_cycle":
+                counters[field] = json.loads(value)
+            else:
+                counters[field] = float(value) if field.startswith("last_") else int(value)
+        return counters
+
+    async def get_counters(self) -> dict:
+        """读取写入时累加的统计计数"""
+        return self._parse_counters(await self.conn.hgetall(self.stats_key))
+
+    async def record_crawl(self, crawled: int) -> None:
+        """记录一轮爬取：爬取轮数、爬取到的代理数和完成时间"""
+        async with self.conn.pipeline(transaction=True) as pipe:
+            pipe.hincrby(self.stats_key, "crawls", 1)
+            pipe.hincrby(self.stats_key, "crawled", crawled)
+            pipe.hset(self.stats_key, "last_crawl", time.time())
+            await pipe.execute()
+
+    async def record_cycle(self, summary: dict) -> None:
+        """记录最近一轮增量验证的汇总（新增、移除、验证、通过数等）"""
+        await self.conn.hset(self.stats_key, "last_cycle", json.dumps(summary))
+
+    async def get_stats(self, score_edges: Optional[List[float]] = None) -> dict:
+        """一次往返读取统计信息：代理总数、各协议数量、待验证与失效代理数、有效租约数、统计计数
+
+        每项都是O(1)（ZCARD/HGETALL一个小哈希）；score_edges不为None时附带分数直方图，
+        在服务端按区间ZCOUNT（每个区间O(log N)），区间为(-inf, e1], (e1, e2], ..., (en, +inf)，结果为各区间的代理数
+        """
+        ranges = []
+        if score_edges is not None:
+            ranges = zip(["-inf", *(f"({edge}" for edge in score_edges)], [*score_edges, "+inf"])
+        async with self.conn.pipeline(transaction=True) as pipe:
+            pipe.zcard(self.proxy_key)
+            for key in self.protocol_keys():
+                pipe.zcard(key)
+            pipe.zcard(self.candidate_key)
+            pipe.zcount(self.dead_key, time.time(), "+inf")
+            pipe.zcount(self.lease_expiry_key, time.time(), "+inf")
+            pipe.hgetall(self.stats_key)
+            for lower, upper in ranges:
+                pipe.zcount(self.proxy_key, lower, upper)
+            results = await pipe.execute()
+        n = len(settings.PROTOCOLS)
+        total, counts = results[0], results[1:n + 1]
+        candidates, dead, leases, raw, *histogram = results[n + 1:]
+        return {
+            "total": total,
+            "protocols": self._protocol_counts(total, counts),
+            "candidates": candidates,
+            "dead": dead,
+            "leases": leases,
+            "counters": self._parse_counters(raw),
+            "histogram": histogram
+        }
+
+    async def exists(self, proxy: str) -> bool:
+        """检查代理是否在代理池中"""
+        return await self.conn.zscore(self.proxy_key, self.codec.encode(proxy)) is not None
 
     async def remove_proxy(self, proxy: str) -> None:
         """移除失效代理"""
-        await self.conn.zrem(self.proxy_key, proxy)
+        member = self.codec.encode(proxy)
+        async with self.conn.pipeline(transaction=True) as pipe:
+            self._queue_remove(pipe, [member])
+            await self._queue_changes(pipe, [member])
+            self._queue_notify(pipe)
+            removed, *_ = await pipe.execute()
+        await self._count(removed=removed)
         logger.info(f"已移除代理: {proxy}")
 
     async def cleanup_old_proxies(self, max_count: int = settings.MAX_PROXIES) -> int:
         """清理超过最大限制的旧代理"""
-        current_count = await self.count_proxies()
-        if current_count > max_count:
-            remove_count = current_count - max_count
-            # 移除分数最低的旧代理
-            await self.conn.zpopmin(self.proxy_key, remove_count)
+        # 移除分数最低的旧代理，主集合、协议索引和关联数据在同一脚本中原子更新
+        keys, prefix = self._script_keys()
+        remove_count = await self._cleanup_script(keys=keys, args=[*prefix, max_count])
+        await self.trim_changes()
+        if remove_count:
+            await self.conn.publish(self.change_channel, "1")
+            await self._count(removed=remove_count)
             logger.info(f"清理旧代理: 移除了{remove_count}个")
-            return remove_count
-        return 0
+        return remove_count
+
+    async def backfill_indexes(self, batch_size: int = settings.BULK_CHUNK_SIZE) -> int:
+        """为主集合中缺少协议索引或检查时间的代理补写条目，返回补写的索引条目数
+
+        用于升级前已存在的数据，作为一次性迁移运行（python -m app.storage.migrate --indexes）；
+        分批ZSCAN主集合，每批在一个脚本中原子地补写，不删除也不覆盖已有的索引，服务运行时也可以执行
+        """
+        keys = [self.proxy_key, *self.protocol_keys(), self.checked_key]
+        positions = {key: i for i, key in enumerate(keys, 1)}
+        added = scanned = 0
+        args = []
+        async for member, _ in self.conn.zscan_iter(self.proxy_key, count=batch_size):
+            args += [positions.get(self._index_key(self.codec.decode(member)), 0), member]
+            if len(args) >= batch_size * 2:
+                added += await self._backfill_script(keys=keys, args=args)
+                scanned += len(args) // 2
+                args = []
+        if args:
+            added += await self._backfill_script(keys=keys, args=args)
+            scanned += len(args) // 2
+        if added:
+            await self.conn.publish(self.change_channel, "1")
+        logger.info(f"协议索引补全完成，检查{scanned}个代理，补写{added}个索引条目")
+        return added
 
     async def test_connection(self):
         """测试Redis连接"""
@@ -0,0 +1,164 @@
+import asyncio
+import errno
+import logging
+import time
+from collections import deque
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 验证请求的结果分类
+SUCCESS = "success"        # 请求完成（无论状态码）
+TIMEOUT = "timeout"        # 请求超时
+ERROR = "error"            # 连接被拒绝、重置等网络错误
+EXHAUSTED = "exhausted"    # 本机资源耗尽（文件描述符、端口、缓冲区）
+
+# 表示本机资源耗尽的错误码
+EXHAUSTION_ERRNOS = {errno.EMFILE, errno.ENFILE, errno.ENOBUFS, errno.ENOMEM, errno.EADDRNOTAVAIL}
+
+# 为Redis连接、API服务等保留的文件描述符数量
+RESERVED_FDS = 128
+
+
+def fd_limit_cap(default: int) -> int:
+    """根据RLIMIT_NOFILE计算并发上限，不支持resource模块的平台返回default"""
+    try:
+        import resource
+    except ImportError:
+        return default
+    soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft == resource.RLIM_INFINITY:
+        return default
+    return max(1, min(default, soft - RESERVED_FDS))
+
+
+def classify_error(error: BaseException) -> str:
+    """将验证请求的异常归类为TIMEOUT/EXHAUSTED/ERROR"""
+    if isinstance(error, asyncio.TimeoutError):
+        return TIMEOUT
+    # aiohttp的连接错误把底层OSError放在os_error属性中
+    os_error = getattr(error, "os_error", error)
+    if isinstance(os_error, OSError) and os_error.errno in EXHAUSTION_ERRNOS:
+        return EXHAUSTED
+    return ERROR
+
+
+class SlotLimiter:
+    """
+    并发名额 - 同时最多limit个持有者，limit可以随时调整
+
+    等待者各自创建Future，不绑定创建时的事件循环，可以作为模块级单例在多个事件循环中使用。
+    """
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self._waiters = deque()
+
+    async def acquire(self):
+        while self.in_flight >= self.limit:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # 已被唤醒但放弃了名额，转交给下一个等待者
+                    self._wake()
+                raise
+        self.in_flight += 1
+
+    def release(self):
+        self.in_flight -= 1
+        self._wake()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+
+    def _wake(self):
+        free = self.limit - self.in_flight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+
+class AdaptiveLimiter(SlotLimiter):
+    """
+    AIMD自适应并发限制器
+
+    每完成limit个请求统计一次错误率（超时与连接错误）：错误率低于目标值时加性增加并发，
+    高于退避阈值时乘性减少；一旦出现文件描述符等本机资源耗尽立即减少。
+    并发上限同时受RLIMIT_NOFILE约束。
+    """
+    def __init__(self, initial: int = settings.VALIDATOR_INITIAL_CONCURRENCY,
+                 min_limit: int = settings.VALIDATOR_MIN_CONCURRENCY,
+                 max_limit: int = settings.VALIDATOR_MAX_CONCURRENCY,
+                 target_error_ratio: float = settings.VALIDATOR_TARGET_ERROR_RATIO,
+                 backoff_error_ratio: float = settings.VALIDATOR_BACKOFF_ERROR_RATIO,
+                 decrease_factor: float = 0.7, increase_step: int = 5, cooldown: float = 1.0):
+        self.max_limit = fd_limit_cap(max_limit)
+        self.min_limit = min(min_limit, self.max_limit)
+        super().__init__(max(self.min_limit, min(initial, self.max_limit)))
+        self.target_error_ratio = target_error_ratio
+        self.backoff_error_ratio = backoff_error_ratio
+        self.decrease_factor = decrease_factor
+        self.increase_step = increase_step
+        self.cooldown = cooldown
+        self._completed = 0
+        self._errors = 0
+        self._last_decrease = 0.0
+
+    def record(self, outcome: str):
+        """记录一次请求结果并按需调整并发上限"""
+        if outcome == EXHAUSTED:
+            self._decrease("本机资源耗尽")
+            return
+        self._completed += 1
+        if outcome != SUCCESS:
+            self._errors += 1
+        if self._completed < self.limit:
+            return
+        error_ratio = self._errors / self._completed
+        if error_ratio > self.backoff_error_ratio:
+            self._decrease(f"错误率 {error_ratio:.0%}")
+        elif error_ratio < self.target_error_ratio:
+            self._increase()
+        self._reset_window()
+
+    def _increase(self):
+        if self.limit < self.max_limit:
+            self.limit = min(self.max_limit, self.limit + self.increase_step)
+            self._wake()
+
+    def _decrease(self, reason: str):
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        old_limit = self.limit
+        self.limit = max(self.min_limit, int(self.limit * self.decrease_factor))
+        self._reset_window()
+        if self.limit != old_limit:
+            logger.info(f"验证并发从 {old_limit} 降至 {self.limit}（{reason}）")
+
+    def _reset_window(self):
+        self._completed = 0
+        self._errors = 0
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "min_limit": self.min_limit,
+            "max_limit": self.max_limit
+        }
+
+
+# 验证器（TCP预筛与HTTP验证两个阶段、同时运行的各轮验证）共用的文件描述符预算：每个套接字占用一个名额，
+# 总数不超过RLIMIT_NOFILE减去保留数量
+fd_budget = SlotLimiter(fd_limit_cap(settings.VALIDATOR_MAX_CONCURRENCY + settings.VALIDATOR_CONNECT_CONCURRENCY))
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+from typing import List, Optional, Tuple
+from app.core.config import settings
+from app.storage.redis_client import redis_storage
+from app.validator.scoring import scoring_engine
+
+logger = logging.getLogger(__name__)
+
+
+async def _record(passed: dict, failures: List[str], states: List[dict], storage, engine, source: str) -> int:
+    """按EWMA更新一批使用结果的评分估计值并写入，返回被移除的代理数"""
+    if not passed and not failures:
+        return 0
+    scores, failure_scores, details = engine.apply(passed, failures, states)
+    return await storage.record_results(scores, failures, details, failure_scores, source=source)
+
+
+async def apply_feedback(reports: List[Tuple[str, bool, Optional[float]]], storage=None, engine=None) -> dict:
+    """把客户端的使用反馈计入代理评分，返回{"accepted", "ignored", "evicted"}
+
+    reports为(租约ID, 是否成功, 响应时间毫秒或None)列表。反馈与验证结果一样按EWMA更新评分估计值，
+    在同一事务中写入分数和元数据，连续失败达到MAX_FAIL_COUNT次的代理立即移除。
+    租约已到期、不存在或已提交过反馈的结果被忽略；同一批中同一代理有多个结果时只计第一个。
+    """
+    storage = storage or redis_storage
+    engine = engine or scoring_engine
+    results = {}
+    for lease_id, success, latency in reports:
+        results.setdefault(lease_id, (success, latency))
+    passed, failures, passed_states, failure_states = {}, [], [], []
+    for lease_id, proxy, meta in await storage.release_leases(list(results)):
+        if proxy in passed or proxy in failures:
+            continue
+        success, latency = results[lease_id]
+        if success:
+            passed[proxy] = latency
+            passed_states.append(meta)
+        else:
+            failures.append(proxy)
+            failure_states.append(meta)
+    evicted = await _record(passed, failures, passed_states + failure_states, storage, engine, "feedback")
+    accepted = len(passed) + len(failures)
+    logger.debug(f"使用反馈: {len(reports)}条，计入{accepted}条，移除代理{evicted}个")
+    return {"accepted": accepted, "ignored": len(reports) - accepted, "evicted": evicted}
+
+
+async def record_usage(results: List[Tuple[str, bool, Optional[float]]], storage=None, engine=None,
+                       source: str = "gateway") -> int:
+    """把(代理, 是否成功, 响应时间毫秒或None)列表计入代理评分，返回被移除的代理数
+
+    同一代理的多个结果按顺序逐个更新EWMA估计值；最后一个结果失败时，末尾连续失败的次数都计入
+    连续失败次数（达到MAX_FAIL_COUNT次即移除），否则按成功写入并清零连续失败次数
+    """
+    storage = storage or redis_storage
+    engine = engine or scoring_engine
+    grouped = {}
+    for proxy, success, latency in results:
+        grouped.setdefault(proxy, []).append((success, latency))
+    proxies = list(grouped)
+    states = await storage.get_meta(proxies)
+    scores, failures, failure_scores, details = {}, [], {}, {}
+    for proxy, state in zip(proxies, states):
+        latency = None
+        trailing_failures = 0
+        for success, observed in grouped[proxy]:
+            state = engine.update(state, success, observed)
+            if success:
+                latency = observed if observed is not None else latency
+                trailing_failures = 0
+            else:
+                trailing_failures += 1
+        details[proxy] = state if latency is None else {**state, "rt": round(latency, 1)}
+        if trailing_failures:
+            failures += [proxy] * trailing_failures
+            failure_scores[proxy] = engine.score(state)
+        else:
+            scores[proxy] = engine.score(state)
+    if not scores and not failures:
+        return 0
+    return await storage.record_results(scores, failures, details, failure_scores, source=source)
+
+
+class UsageRecorder:
+    """
+    使用结果记录器 - 在内存中累积代理的使用结果，按固定间隔批量计入代理评分
+
+    转发网关每建立一条上游连接就记录一次结果，逐条写入会让Redis负载随连接数线性增长；
+    累积后每个间隔只需一次HMGET和一次事务
+    """
+    def __init__(self, storage=None, engine=None, flush_interval: float = settings.GATEWAY_FLUSH_INTERVAL,
+                 source: str = "gateway"):
+        self.storage = storage
+        self.engine = engine
+        self.flush_interval = flush_interval
+        self.source = source
+        self._results = []
+        self._stopped = False
+
+    def add(self, proxy: str, success: bool, latency: Optional[float] = None) -> None:
+        self._results.append((proxy, success, latency))
+
+    async def flush(self) -> int:
+        """写入累积的结果，返回被移除的代理数"""
+        results, self._results = self._results, []
+        if not results:
+            return 0
+        try:
+            return await record_usage(results, self.storage, self.engine, self.source)
+        except Exception as e:
+            logger.error(f"写入使用结果失败: {str(e)}")
+            return 0
+
+    async def run(self):
+        """按间隔持续写入，直到调用stop()，停止前写入剩余结果"""
+        self._stopped = False
+        try:
+            while not self._stopped:
+                await asyncio.sleep(self.flush_interval)
+                await self.flush()
+        finally:
+            await self.flush()
+
+    def stop(self):
+        self._stopped = True
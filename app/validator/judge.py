@@ -0,0 +1,72 @@
+"""
+本地判定服务
+
+回显客户端IP与请求头，供验证器代替httpbin等公共服务使用。
+公共判定服务在高并发下会限流，且离线时无法验证和做基准测试。
+
+独立运行:
+    python -m app.validator.judge --host 0.0.0.0 --port 8001
+
+然后设置 JUDGE_URL=http://<本机外网地址>:8001/ip 即可让验证器改用本服务。
+FastAPI应用的 /judge 端点返回相同内容，部署了API服务时也可以直接使用。
+"""
+
+import argparse
+from typing import Mapping, Optional
+
+from aiohttp import web
+
+# 代理转发时可能附加的、会暴露真实IP或代理身份的请求头
+PROXY_HEADERS = ("Via", "X-Forwarded-For", "X-Real-Ip", "Forwarded", "Proxy-Connection")
+# 其中通常携带客户端真实IP的请求头
+CLIENT_IP_HEADERS = ("X-Forwarded-For", "X-Real-Ip", "Forwarded")
+
+TRANSPARENT = "transparent"  # 暴露客户端真实IP
+ANONYMOUS = "anonymous"      # 不暴露真实IP，但暴露使用了代理
+ELITE = "elite"              # 看不出使用了代理
+
+
+def judge_payload(origin: Optional[str], headers: Mapping[str, str]) -> dict:
+    """生成判定结果：客户端IP、请求头以及代理相关请求头"""
+    headers = dict(headers)
+    lowered = {name.lower() for name in headers}
+    return {
+        "origin": origin or "",
+        "headers": headers,
+        "proxy_headers": [name for name in PROXY_HEADERS if name.lower() in lowered]
+    }
+
+
+def anonymity(payload) -> Optional[str]:
+    """根据经代理请求得到的判定结果判断代理匿名度，不是判定结果（如公共服务的响应）时返回None"""
+    if not isinstance(payload, dict) or "proxy_headers" not in payload:
+        return None
+    found = set(payload["proxy_headers"])
+    if found.intersection(CLIENT_IP_HEADERS):
+        return TRANSPARENT
+    if found:
+        return ANONYMOUS
+    return ELITE
+
+
+async def handle_judge(request: web.Request) -> web.Response:
+    return web.json_response(judge_payload(request.remote, request.headers))
+
+
+def create_app() -> web.Application:
+    """创建判定服务应用，任意路径均返回判定结果"""
+    app = web.Application()
+    app.router.add_route("GET", "/{tail:.*}", handle_judge)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="代理验证判定服务")
+    parser.add_argument("--host", default="0.0.0.0", help="监听地址")
+    parser.add_argument("--port", type=int, default=8001, help="监听端口")
+    args = parser.parse_args()
+    web.run_app(create_app(), host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,20 @@
 import aiohttp
 import asyncio
 import logging
+import ssl
 from datetime import datetime
+from urllib.parse import urlsplit
 from app.core.config import settings
-from app.storage.redis_client import redis_conn, redis_storage
+from app.storage.redis_client import redis_storage
+from app.validator.concurrency import AdaptiveLimiter, classify_error, fd_budget, fd_limit_cap, SUCCESS, TIMEOUT, EXHAUSTED
+from app.validator.judge import anonymity
+from app.validator.scoring import scoring_engine
 
 logger = logging.getLogger(__name__)
 
+# TCP预筛遇到本机资源耗尽后，等待多少秒再重试连接
+EXHAUSTED_RETRY_DELAY = 0.1
+
 class ProxyValidator:
     def __init__(self):
         # 使用多个测试URL，增加验证的可靠性
@@ -28,20 +36,91 @@ class ProxyValidator:
                 "http://httpbin.org/ip"
             ]
         }
+        if settings.JUDGE_URLS:
+            # 使用自建判定服务（见app/validator/judge.py），避免公共服务限流
+            self.test_urls = {protocol: list(settings.JUDGE_URLS) for protocol in self.test_urls}
         self.timeout = aiohttp.ClientTimeout(total=settings.PROXY_TIMEOUT)
-        self.semaphore = asyncio.Semaphore(50)  # 并发控制
+        self.limiter = AdaptiveLimiter()  # 自适应并发控制
+        # 两个阶段的每个连接都占用进程内共享的文件描述符预算，同时运行的多轮验证合计也不会超出RLIMIT_NOFILE
+        self.fd_budget = fd_budget
+        # TCP预筛：只尝试建立TCP连接，超时短、并发高，先淘汰端口已关闭的代理
+        self.connect_timeout = settings.VALIDATOR_CONNECT_TIMEOUT
+        self.connect_concurrency = fd_limit_cap(settings.VALIDATOR_CONNECT_CONCURRENCY)
+        # 各验证来源（增量验证、待验证代理等，可能同时运行）最近一轮各阶段的通过率与耗时
+        self.stage_stats = {}
+        # 按代理历史响应时间与成功率评分
+        self.scoring = scoring_engine
         self.headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
             "Accept": "application/json, text/plain, */*",
-            "Accept-Language": "en-US,en;q=0.9",
-            "Connection": "close"  # 避免保持连接
+            "Accept-Language": "en-US,en;q=0.9"
         }
         # 优先验证的协议顺序
         self.protocol_priority = ["http", "https", "socks5", "socks4"]
+        # SSL上下文只创建一次，所有验证会话复用（不校验证书以支持自签名证书）
+        self.ssl_context = ssl.create_default_context()
+        self.ssl_context.check_hostname = False
+        self.ssl_context.verify_mode = ssl.CERT_NONE
+
+    def create_session(self) -> aiohttp.ClientSession:
+        """创建一次验证任务共享的会话
+
+        DNS缓存和SSL上下文在整个任务内复用。连接不保活：aiohttp按(目标地址, 代理)区分连接，
+        每个代理每轮只验证一次、成功即停止，空闲连接不会被复用，只会占用文件描述符
+        """
+        connector = aiohttp.TCPConnector(
+            limit=0,  # 并发由验证器自身控制
+            ttl_dns_cache=settings.VALIDATOR_DNS_CACHE_TTL,
+            ssl=self.ssl_context,
+            force_close=True
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=self.timeout,
+            headers=self.headers
+        )
+
+    async def _connect_proxy(self, proxy_url):
+        """TCP预筛：能在connect_timeout内与代理端口建立TCP连接即视为通过
+
+        本机资源耗尽（EMFILE等）不是代理的问题：通知限制器降低HTTP验证并发，等待其他连接释放后重试；
+        connect_timeout内仍无法发起连接时返回None，本轮不判断该代理
+        """
+        try:
+            parts = urlsplit(proxy_url)
+            host, port = parts.hostname, parts.port
+        except ValueError:
+            return False
+        if not host or not port:
+            # 无法解析端口时交给HTTP验证阶段判断
+            return True
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.connect_timeout
+        while True:
+            async with self.fd_budget:
+                try:
+                    _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), self.connect_timeout)
+                except asyncio.TimeoutError:
+                    return False
+                except OSError as e:
+                    if classify_error(e) != EXHAUSTED:
+                        return False
+                    self.limiter.record(EXHAUSTED)
+                else:
+                    writer.close()
+                    try:
+                        await writer.wait_closed()
+                    except OSError:
+                        pass
+                    return True
+            if loop.time() >= deadline:
+                logger.debug(f"本机资源耗尽，跳过TCP预筛: {proxy_url}")
+                return None
+            await asyncio.sleep(EXHAUSTED_RETRY_DELAY)
 
-    async def _verify_proxy(self, proxy_url):
+    async def _verify_proxy(self, proxy_url, session):
         """验证代理有效性"""
-        async with self.semaphore:
+        async with self.limiter, self.fd_budget:
             # 解析代理URL
             try:
                 protocol, address = proxy_url.split("://", 1)
@@ -62,6 +141,7 @@ class ProxyValidator:
             # 测试响应时间和有效性
             best_response_time = float('inf')
             success = False
+            level = None
             
             # 根据协议类型设置代理
             proxy = f"{protocol}://{address}"
@@ -70,108 +150,238 @@ class ProxyValidator:
             for test_url in test_urls:
                 start_time = datetime.now()
                 try:
-                    async with aiohttp.ClientSession(timeout=self.timeout) as session:
-                        async with session.get(
-                            test_url,
-                            proxy=proxy,
-                            headers=self.headers,
-                            ssl=False  # 禁用SSL验证以支持自签名证书
-                        ) as resp:
-                            if resp.status == 200:
-                                # 计算响应时间（毫秒）
-                                response_time = (datetime.now() - start_time).total_seconds() * 1000
-                                logger.debug(f"代理有效: {proxy_url}, URL: {test_url}, 响应时间: {response_time:.2f}ms")
-                                
-                                # 更新最佳响应时间
-                                if response_time < best_response_time:
-                                    best_response_time = response_time
-                                
-                                success = True
-                                # 一旦成功，不需要测试其他URL
-                                break
-                            else:
-                                logger.debug(f"代理无效: {proxy_url}, URL: {test_url}, 状态码: {resp.status}")
+                    async with session.get(test_url, proxy=proxy) as resp:
+                        self.limiter.record(SUCCESS)
+                        if resp.status == 200:
+                            # 计算响应时间（毫秒）
+                            response_time = (datetime.now() - start_time).total_seconds() * 1000
+                            logger.debug(f"代理有效: {proxy_url}, URL: {test_url}, 响应时间: {response_time:.2f}ms")
+                            
+                            # 更新最佳响应时间
+                            if response_time < best_response_time:
+                                best_response_time = response_time
+                            
+                            success = True
+                            # 判定服务的响应中带有经代理转发后的请求头，可以判断匿名度
+                            if resp.content_type == "application/json":
+                                try:
+                                    level = anonymity(await resp.json())
+                                except Exception:
+                                    pass
+                            # 一旦成功，不需要测试其他URL
+                            break
+                        else:
+                            logger.debug(f"代理无效: {proxy_url}, URL: {test_url}, 状态码: {resp.status}")
                 except asyncio.TimeoutError:
+                    self.limiter.record(TIMEOUT)
                     logger.debug(f"代理超时: {proxy_url}, URL: {test_url}")
-                except aiohttp.ClientProxyConnectionError:
+                except aiohttp.ClientProxyConnectionError as e:
+                    self.limiter.record(classify_error(e))
                     logger.debug(f"代理连接错误: {proxy_url}, URL: {test_url}")
-                except aiohttp.ClientConnectorError:
+                except aiohttp.ClientConnectorError as e:
+                    self.limiter.record(classify_error(e))
                     logger.debug(f"代理连接器错误: {proxy_url}, URL: {test_url}")
                 except Exception as e:
+                    self.limiter.record(classify_error(e))
                     logger.debug(f"代理验证异常: {proxy_url}, URL: {test_url}, {str(e)}")
             
             if success:
-                return proxy_url, True, best_response_time
-            else:
-                # 如果是HTTP代理，尝试作为HTTPS代理使用
-                if protocol == "http":
-                    https_proxy_url = f"https://{address}"
-                    logger.debug(f"HTTP代理验证失败，尝试作为HTTPS代理: {https_proxy_url}")
-                    return await self._verify_proxy(https_proxy_url)
-                
+                return proxy_url, True, best_response_time, level
+            if protocol != "http":
                 return proxy_url, False, 0
+        
+        # 如果是HTTP代理，尝试作为HTTPS代理使用（在释放并发许可后重试，避免占满许可时死锁）
+        https_proxy_url = f"https://{address}"
+        logger.debug(f"HTTP代理验证失败，尝试作为HTTPS代理: {https_proxy_url}")
+        return await self._verify_proxy(https_proxy_url, session)
+
+    def score(self, response_time):
+        """没有历史记录的代理第一次验证通过时的分数：基础分10分 + 响应时间分数(0-10分)"""
+        return self.scoring.score(self.scoring.update(None, True, response_time))
+
+    async def _flush_results(self, passed, failures):
+        """将一批验证结果写回Redis，返回被移除的代理数
+
+        passed为验证通过的代理 -> (响应时间, 匿名度)。先用一次HMGET读取这批代理的评分估计值，
+        按EWMA更新后与分数、元数据在同一事务中写入。
+        """
+        if not passed and not failures:
+            return 0
+        evicted = 0
+        try:
+            states = await redis_storage.get_meta([*passed, *failures])
+            scores, failure_scores, details = self.scoring.apply(
+                {proxy: response_time for proxy, (response_time, _) in passed.items()}, failures, states
+            )
+            for proxy, (_, level) in passed.items():
+                details[proxy]["anon"] = level
+            evicted = await redis_storage.record_results(scores, failures, details, failure_scores)
+        except Exception as e:
+            logger.error(f"写入验证结果失败: {str(e)}")
+        passed.clear()
+        failures.clear()
+        return evicted
 
-    async def validate_proxies(self, proxies):
-        """验证多个代理并更新到Redis"""
+    async def validate_proxies(self, proxies, source: str = "validate"):
+        """流式验证代理并分批写回Redis
+
+        验证分两个阶段：先以短超时、高并发尝试TCP连接，淘汰端口不通的代理；
+        只有通过预筛的代理才发起HTTP验证请求。两个阶段的连接共用文件描述符预算（fd_budget）。
+        proxies可以是普通可迭代对象或异步迭代器。各阶段队列都有上限，
+        峰值内存与代理总数无关；结果按VALIDATE_FLUSH_SIZE条或VALIDATE_FLUSH_INTERVAL秒
+        分批写入，验证通过的代理无需等待整轮验证结束即可被使用。
+        各阶段统计按source分别保存在stage_stats中。
+        """
         if not proxies:
             logger.warning("没有代理需要验证")
             return 0
-            
-        logger.info(f"开始验证 {len(proxies)} 个代理")
-        tasks = [self._verify_proxy(proxy) for proxy in proxies]
-        results = await asyncio.gather(*tasks)
         
-        # 筛选有效代理
-        valid_proxies = [(proxy, response_time) for proxy, status, response_time in results if status]
+        logger.info("开始流式验证代理")
+        loop = asyncio.get_running_loop()
+        # 按并发上限启动工作协程，实际并发由自适应限制器控制
+        workers = self.limiter.max_limit
+        prefilter = self.connect_timeout > 0
+        connect_workers = self.connect_concurrency if prefilter else 0
+        pending = asyncio.Queue(maxsize=max(workers, connect_workers))
+        # 通过TCP预筛的代理进入HTTP验证队列；关闭预筛时HTTP验证直接读取待验证队列
+        reachable = asyncio.Queue(maxsize=workers) if prefilter else pending
+        results = asyncio.Queue(maxsize=settings.VALIDATE_FLUSH_SIZE * 2)
+        counts = {"total": 0, "valid": 0, "evicted": 0}
+        stages = {
+            name: {"checked": 0, "passed": 0, "seconds": 0.0}
+            for name in (["connect", "http"] if prefilter else ["http"])
+        }
         
-        if not valid_proxies:
-            logger.warning("没有有效代理")
-            return 0
+        def track(stage, passed, started):
+            stats = stages[stage]
+            stats["checked"] += 1
+            stats["passed"] += bool(passed)
+            stats["seconds"] += loop.time() - started
         
-        # 计算分数：基础分10分 + 响应时间评分（最快的代理获得最高分）
-        # 响应时间评分：将响应时间映射到0-10分，响应时间越短分数越高
-        if valid_proxies:
-            max_response_time = max(response_time for _, response_time in valid_proxies)
-            min_response_time = min(response_time for _, response_time in valid_proxies)
-            response_time_range = max(1, max_response_time - min_response_time)  # 避免除以0
+        async def produce():
+            if hasattr(proxies, "__aiter__"):
+                async for proxy in proxies:
+                    await pending.put(proxy)
+            else:
+                for proxy in proxies:
+                    await pending.put(proxy)
+            for _ in range(connect_workers or workers):
+                await pending.put(None)
         
-        # 更新Redis
-        now = datetime.now().timestamp()
-        async with redis_conn.pipeline() as pipe:
-            for proxy, response_time in valid_proxies:
-                # 计算响应时间分数（0-10分）
-                if max_response_time == min_response_time:
-                    response_score = 10  # 如果所有代理响应时间相同，都给10分
+        async def connect_work():
+            while True:
+                proxy = await pending.get()
+                if proxy is None:
+                    break
+                started = loop.time()
+                passed = await self._connect_proxy(proxy)
+                if passed is None:
+                    # 本机资源耗尽时不判断，也不写入结果
+                    continue
+                track("connect", passed, started)
+                if passed:
+                    await reachable.put(proxy)
                 else:
-                    # 响应时间越短，分数越高
-                    response_score = 10 - 10 * (response_time - min_response_time) / response_time_range
-                
-                # 总分 = 基础分(10) + 响应时间分数(0-10)
-                total_score = 10 + response_score
-                
-                # 使用时间戳作为分数，便于排序和清理
-                pipe.zadd(settings.PROXY_KEY, {proxy: total_score})
-                
-            # 如果代理数量超过最大限制，移除分数最低的代理
-            await pipe.execute()
+                    await results.put((proxy, (proxy, False, 0)))
+        
+        async def connect_stage():
+            await asyncio.gather(*(connect_work() for _ in range(connect_workers)))
+            for _ in range(workers):
+                await reachable.put(None)
+        
+        async def work(session):
+            while True:
+                proxy = await reachable.get()
+                if proxy is None:
+                    break
+                started = loop.time()
+                result = await self._verify_proxy(proxy, session)
+                track("http", result[1], started)
+                await results.put((proxy, result))
+        
+        async def write():
+            passed = {}
+            failures = []
+            deadline = loop.time() + settings.VALIDATE_FLUSH_INTERVAL
+            while True:
+                try:
+                    item = await asyncio.wait_for(results.get(), max(0, deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    item = False
+                if item is None:
+                    break
+                if item:
+                    original, (proxy, status, response_time, *extra) = item
+                    counts["total"] += 1
+                    if status:
+                        counts["valid"] += 1
+                        passed[proxy] = (response_time, extra[0] if extra else None)
+                    # HTTP代理仅以HTTPS方式可用时，原HTTP代理同样记为失败
+                    if not status or proxy != original:
+                        failures.append(original)
+                if len(passed) + len(failures) >= settings.VALIDATE_FLUSH_SIZE or loop.time() >= deadline:
+                    counts["evicted"] += await self._flush_results(passed, failures)
+                    deadline = loop.time() + settings.VALIDATE_FLUSH_INTERVAL
+            counts["evicted"] += await self._flush_results(passed, failures)
+        
+        writer = asyncio.create_task(write())
+        try:
+            async with self.create_session() as session:
+                stage_tasks = [asyncio.create_task(produce())]
+                if prefilter:
+                    stage_tasks.append(asyncio.create_task(connect_stage()))
+                stage_tasks += [asyncio.create_task(work(session)) for _ in range(workers)]
+                try:
+                    await asyncio.gather(*stage_tasks)
+                finally:
+                    # 任一阶段出错（如读取代理时Redis断开）时取消其余阶段，否则工作协程会永远阻塞在队列上
+                    for task in stage_tasks:
+                        task.cancel()
+                    await asyncio.gather(*stage_tasks, return_exceptions=True)
+        finally:
+            # 出错时同样写入已得到的结果
+            if not writer.done():
+                await results.put(None)
+            await writer
         
         # 清理旧代理
         await redis_storage.cleanup_old_proxies(settings.MAX_PROXIES)
         
-        logger.info(f"验证完成，有效代理: {len(valid_proxies)}/{len(proxies)}")
-        return len(valid_proxies)
+        self.stage_stats[source] = stage_stats = self._summarize_stages(stages)
+        if not counts["valid"]:
+            logger.warning("没有有效代理")
+        logger.info(f"验证完成（{source}），有效代理: {counts['valid']}/{counts['total']}，移除失效代理: {counts['evicted']}")
+        for name, stats in stage_stats.items():
+            logger.info(f"{name}阶段: 通过 {stats['passed']}/{stats['checked']} ({stats['pass_rate']:.1%})，"
+                        f"平均耗时 {stats['avg_ms']:.1f}ms")
+        return counts["valid"]
+
+    @staticmethod
+    def _summarize_stages(stages):
+        """计算各阶段通过率与平均耗时"""
+        summary = {}
+        for name, stats in stages.items():
+            checked = stats["checked"]
+            summary[name] = {
+                "checked": checked,
+                "passed": stats["passed"],
+                "pass_rate": stats["passed"] / checked if checked else 0.0,
+                "avg_ms": stats["seconds"] * 1000 / checked if checked else 0.0,
+                "seconds": round(stats["seconds"], 3)
+            }
+        return summary
 
-    async def check_all_proxies(self):
-        """定期检查所有代理"""
+    async def check_all_proxies(self, protocol=None):
+        """定期检查所有代理，指定协议时只检查该协议的代理"""
         try:
-            # 获取所有代理
-            all_proxies = await redis_conn.zrange(settings.PROXY_KEY, 0, -1)
-            if not all_proxies:
+            # 分批扫描代理，不一次性加载整个代理池
+            total = await redis_storage.count_proxies(protocol)
+            if not total:
                 logger.warning("没有代理需要检查")
                 return 0
                 
-            logger.info(f"开始检查 {len(all_proxies)} 个代理")
-            valid_count = await self.validate_proxies(all_proxies)
+            logger.info(f"开始检查 {total} 个代理")
+            valid_count = await self.validate_proxies(redis_storage.iter_proxies(protocol), "check_all")
             
             # 检查是否需要触发爬虫任务
             total_count = await redis_storage.count_proxies()
@@ -183,3 +393,7 @@ class ProxyValidator:
         except Exception as e:
             logger.error(f"检查代理异常: {str(e)}")
             return 0
+
+
+# 全局验证器，API与后台任务共用，便于在/stats中查看并发状态
+proxy_validator = ProxyValidator()
@@ -0,0 +1,135 @@
+import time
+import asyncio
+import logging
+from typing import Optional
+from app.core.config import settings
+from app.storage.redis_client import redis_storage
+
+logger = logging.getLogger(__name__)
+
+# 每轮增量验证记录增量的统计计数
+CYCLE_COUNTERS = ["validated", "passed", "added", "removed"]
+
+class RevalidationScheduler:
+    """
+    增量验证调度器 - 按最近检查时间从旧到新，以固定速率持续验证代理
+
+    每次从检查时间集合中取出最久未检查的一小批代理交给验证器，
+    验证负载平滑分布，不会每隔CHECK_INTERVAL集中爆发一次。
+    """
+    def __init__(self, validator, rate: float = settings.VALIDATE_RATE,
+                 batch_size: int = settings.VALIDATE_BATCH_SIZE):
+        self.validator = validator
+        self.rate = rate
+        self.batch_size = batch_size
+        self._stopped = False
+
+    def current_rate(self, pool_size: int) -> float:
+        """当前验证速率（个/秒），未配置时按每个CHECK_INTERVAL覆盖一遍代理池计算"""
+        if self.rate > 0:
+            return self.rate
+        return max(1.0, pool_size / settings.CHECK_INTERVAL)
+
+    async def _stream(self, total: int):
+        """按速率持续产出最久未检查的代理，产出total个后结束一轮"""
+        loop = asyncio.get_running_loop()
+        rate = self.current_rate(total)
+        yielded = 0
+        while not self._stopped and yielded < total:
+            started = loop.time()
+            batch = await redis_storage.claim_stalest(min(self.batch_size, total - yielded))
+            if not batch:
+                break
+            for proxy in batch:
+                yield proxy
+            yielded += len(batch)
+            # 产出阻塞在验证队列上的时间也计入间隔，验证器跟不上时自然降速
+            await asyncio.sleep(max(0.0, len(batch) / rate - (loop.time() - started)))
+
+    async def run_cycle(self, total: int) -> int:
+        """验证一轮（total个代理），返回有效代理数量"""
+        logger.info(f"开始增量验证，本轮 {total} 个代理，速率 {self.current_rate(total):.1f} 个/秒")
+        started = time.time()
+        before = await redis_storage.get_counters()
+        valid = await self.validator.validate_proxies(self._stream(total), "revalidate")
+        after = await redis_storage.get_counters()
+        # 本轮期间统计计数的增量（包括同时进行的待验证代理验证）
+        summary = {field: after.get(field, 0) - before.get(field, 0) for field in CYCLE_COUNTERS}
+        summary.update(started=int(started), duration=round(time.time() - started, 1))
+        await redis_storage.record_cycle(summary)
+        return valid
+
+    async def run(self):
+        """持续运行，直到调用stop()"""
+        self._stopped = False
+        while not self._stopped:
+            try:
+                total = await redis_storage.count_proxies()
+                if total:
+                    await self.run_cycle(total)
+                else:
+                    # 代理池为空时等待爬虫补充
+                    await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                logger.info("增量验证任务被取消")
+                break
+            except Exception as e:
+                logger.error(f"增量验证异常: {str(e)}", exc_info=True)
+                await asyncio.sleep(60)  # 出错后等待1分钟再重试
+
+    def stop(self):
+        self._stopped = True
+
+
+class CandidateValidator:
+    """
+    待验证代理消费者 - 持续验证爬虫新加入待验证集合的代理
+
+    爬虫只把代理写入待验证集合，不直接进入代理池；本消费者阻塞等待新代理，
+    一有代理就连续取出并交给验证器，验证通过的代理随验证结果写入代理池，
+    失败的代理直接丢弃。待验证集合在Redis中，多个进程可以同时消费。
+    """
+    def __init__(self, validator, batch_size: int = settings.CANDIDATE_BATCH_SIZE,
+                 poll_timeout: float = settings.CANDIDATE_POLL_TIMEOUT):
+        self.validator = validator
+        self.batch_size = batch_size
+        self.poll_timeout = poll_timeout
+        self._stopped = False
+
+    async def _stream(self, first: Optional[str] = None):
+        """产出待验证代理，直到待验证集合被取空
+
+        入队后才失效的代理（例如被其他进程验证失败）在这里丢弃，不再发起任何网络请求
+        """
+        batch = [first] if first else []
+        while True:
+            for proxy in await redis_storage.filter_dead(batch):
+                yield proxy
+            if self._stopped:
+                break
+            batch = await redis_storage.pop_candidates(self.batch_size)
+            if not batch:
+                break
+
+    async def run_once(self, first: Optional[str] = None) -> int:
+        """验证当前所有待验证代理，返回验证通过（进入代理池）的数量"""
+        return await self.validator.validate_proxies(self._stream(first), "candidates")
+
+    async def run(self):
+        """持续运行，直到调用stop()"""
+        self._stopped = False
+        while not self._stopped:
+            try:
+                first = await redis_storage.wait_candidate(self.poll_timeout)
+                if first:
+                    logger.info("发现待验证代理，开始验证")
+                    await self.run_once(first)
+            except asyncio.CancelledError:
+                logger.info("待验证代理消费任务被取消")
+                break
+            except Exception as e:
+                logger.error(f"待验证代理消费异常: {str(e)}", exc_info=True)
+                await asyncio.sleep(60)  # 出错后等待1分钟再重试
+
+    def stop(self):
+        self._stopped = True
@@ -0,0 +1,73 @@
+from typing import Dict, List, Optional, Tuple
+from app.core.config import settings
+
+MAX_SCORE = 20.0
+
+
+class ScoringEngine:
+    """
+    基于指数加权移动平均（EWMA）的代理评分
+
+    每个代理保存两项跨验证轮次的估计值（存放在代理元数据中）：
+    - lat: 响应时间的EWMA（毫秒），只由成功的验证更新
+    - rel: 成功率的EWMA，成功记1、失败记0
+
+    分数 = rel * (10 + 10 * 延迟系数)，延迟系数 = max(0, 1 - lat / 超时时间)，取值0~20。
+    分数只取决于代理自身的历史，不受同批验证的其他代理影响；单次超时或偶发的慢响应
+    只会让分数按权重小幅变化，代理池的排序因此保持稳定。
+    """
+    def __init__(self, latency_alpha: float = settings.SCORE_LATENCY_ALPHA,
+                 success_alpha: float = settings.SCORE_SUCCESS_ALPHA,
+                 timeout_ms: Optional[float] = None):
+        self.latency_alpha = latency_alpha
+        self.success_alpha = success_alpha
+        self.timeout_ms = timeout_ms or settings.PROXY_TIMEOUT * 1000
+
+    def update(self, state: Optional[dict], success: bool, response_time: Optional[float] = None) -> dict:
+        """根据一次验证结果返回新的估计值{"lat", "rel"}，state为之前的估计值（可以为空或缺少字段）
+
+        没有延迟历史的代理以第一次成功的响应时间作为初始估计；没有成功率历史的代理
+        （新代理或升级前已在代理池中的代理）先视为可靠，第一次失败后按权重下降
+        """
+        state = state or {}
+        lat = state.get("lat")
+        rel = state.get("rel", 1.0)
+        if success and response_time is not None:
+            lat = response_time if lat is None else lat + self.latency_alpha * (response_time - lat)
+        rel += self.success_alpha * ((1.0 if success else 0.0) - rel)
+        result = {"rel": round(rel, 4)}
+        if lat is not None:
+            result["lat"] = round(lat, 1)
+        return result
+
+    def latency_factor(self, latency: Optional[float]) -> float:
+        if latency is None:
+            return 0.0
+        return max(0.0, 1 - latency / self.timeout_ms)
+
+    def score(self, state: dict) -> float:
+        """由估计值计算代理池中的分数"""
+        return state.get("rel", 0.0) * (10 + 10 * self.latency_factor(state.get("lat")))
+
+    def apply(self, passed: Dict[str, Optional[float]], failures: List[str],
+              states: List[dict]) -> Tuple[dict, dict, dict]:
+        """把一批结果换算为record_results的参数(scores, failure_scores, details)
+
+        passed为成功的代理 -> 响应时间（可以为None），states依次为passed和failures中代理之前的估计值
+        """
+        scores, failure_scores, details = {}, {}, {}
+        for (proxy, response_time), state in zip(passed.items(), states):
+            estimate = self.update(state, True, response_time)
+            scores[proxy] = self.score(estimate)
+            details[proxy] = estimate
+            if response_time is not None:
+                details[proxy] = {**estimate, "rt": round(response_time, 1)}
+        for proxy, state in zip(failures, states[len(passed):]):
+            estimate = self.update(state, False)
+            failure_scores[proxy] = self.score(estimate)
+            details[proxy] = estimate
+        return scores, failure_scores, details
+
+
+# 全局评分引擎
+scoring_engine = ScoringEngine()
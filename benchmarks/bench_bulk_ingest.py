@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+爬虫入库吞吐量基准测试
+
+对比逐个 add_proxy（每个代理一次往返）与 add_proxies_bulk（分块管道）
+写入同一批代理的耗时和吞吐量。
+
+用法:
+    python benchmarks/bench_bulk_ingest.py --count 5000
+    python benchmarks/bench_bulk_ingest.py --fake
+"""
+
+import time
+import asyncio
+
+from common import base_parser, make_storage, clear_storage, random_proxies
+
+
+async def ingest_one_by_one(storage, proxies):
+    new_count = 0
+    for proxy in proxies:
+        if await storage.add_proxy(proxy, 10):
+            new_count += 1
+    return new_count
+
+
+async def ingest_bulk(storage, proxies, chunk_size):
+    return await storage.add_proxies_bulk(proxies, 10, chunk_size=chunk_size)
+
+
+async def main():
+    parser = base_parser("爬虫入库吞吐量基准测试")
+    parser.add_argument("--count", type=int, default=5000, help="代理数量")
+    parser.add_argument("--chunk-size", type=int, default=500, help="批量入库分块大小")
+    args = parser.parse_args()
+
+    storage = make_storage(args.fake)
+    proxies = random_proxies(args.count)
+    try:
+        for name, func in [
+            ("逐个写入", lambda: ingest_one_by_one(storage, proxies)),
+            ("批量管道", lambda: ingest_bulk(storage, proxies, args.chunk_size)),
+        ]:
+            await clear_storage(storage)
+            start = time.perf_counter()
+            new_count = await func()
+            elapsed = time.perf_counter() - start
+            print(f"{name}: 新增{new_count}个, 耗时{elapsed:.3f}s, 吞吐量{args.count / elapsed:,.0f} 个/秒")
+    finally:
+        await clear_storage(storage)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
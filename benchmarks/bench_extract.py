@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+代理提取基准测试
+
+对比旧的BeautifulSoup(html.parser)解析与 app.crawlers.extract 的快速路径：
+- 表格页面：BeautifulSoup逐行find_all vs FreeProxyListCrawler（lxml + XPath）
+- 快代理页面：修正JSON后json.loads vs 按字段正则提取
+- 纯文本列表：逐行split校验 vs 预编译正则
+
+用法:
+    python benchmarks/bench_extract.py --rows 2000 --repeat 5
+"""
+
+import os
+import json
+import time
+import argparse
+
+import common  # noqa: F401  添加项目根目录到Python路径
+from bs4 import BeautifulSoup
+
+from app.crawlers import extract
+from app.crawlers.sources.free_proxy_list import FreeProxyListCrawler
+from app.crawlers.sources.kuaidaili import KuaiDaiLiCrawler, FPS_LIST_RE
+from bench_parse_offload import make_page
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def soup_table(html: str):
+    """旧实现：FreeProxyListCrawler使用BeautifulSoup解析表格"""
+    proxies = []
+    tbody = BeautifulSoup(html, 'html.parser').find('table', {'id': 'proxylisttable'}).find('tbody')
+    for row in tbody.find_all('tr'):
+        cols = row.find_all('td')
+        if len(cols) >= 7:
+            protocol = "https" if cols[6].text.strip().lower() == 'yes' else "http"
+            proxies.append(f"{protocol}://{cols[0].text.strip()}:{cols[1].text.strip()}")
+    return proxies
+
+
+def json_kuaidaili(html: str):
+    """旧实现：修正缺失的逗号后json.loads"""
+    match = FPS_LIST_RE.search(html)
+    proxy_list = json.loads(match.group(1).replace('} {', '}, {'))
+    return [f"http://{item['ip']}:{item['port']}" for item in proxy_list if item.get('ip') and item.get('port')]
+
+
+def split_lines(text: str):
+    """旧实现：逐行split并校验"""
+    proxies = []
+    for line in text.splitlines():
+        line = line.strip()
+        if ':' not in line:
+            continue
+        ip, port = line.split(':', 1)
+        if extract.valid_ip(ip) and extract.valid_port(port):
+            proxies.append((ip, port))
+    return proxies
+
+
+def best_of(func, arg, repeat: int):
+    """返回最快一次的耗时（毫秒）与结果"""
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(arg)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="代理提取基准测试")
+    parser.add_argument("--rows", type=int, default=2000, help="合成表格与纯文本的代理行数")
+    parser.add_argument("--repeat", type=int, default=5, help="每项重复次数，取最快一次")
+    args = parser.parse_args()
+
+    table = make_page(args.rows)
+    with open(os.path.join(ROOT, "kuaidaili.html"), encoding="utf-8") as f:
+        kuaidaili = f.read()
+    text = "\n".join(f"10.0.{i // 256 % 256}.{i % 256}:{1024 + i}" for i in range(args.rows))
+
+    cases = [
+        (f"表格 {args.rows} 行", table, soup_table, FreeProxyListCrawler().parse),
+        ("快代理页面", kuaidaili, json_kuaidaili, KuaiDaiLiCrawler().parse),
+        (f"纯文本 {args.rows} 行", text, split_lines, extract.extract_ip_ports),
+    ]
+    print(f"{'页面':>14} | {'旧实现':>9} | {'新实现':>9} | {'加速':>6} | 代理数")
+    for name, page, old, new in cases:
+        old_ms, old_result = best_of(old, page, args.repeat)
+        new_ms, new_result = best_of(new, page, args.repeat)
+        assert len(old_result) == len(new_result), f"{name} 结果不一致"
+        print(f"{name:>14} | {old_ms:>7.2f}ms | {new_ms:>7.2f}ms | {old_ms / new_ms:>5.1f}x | {len(new_result)}")
+
+
+if __name__ == "__main__":
+    main()
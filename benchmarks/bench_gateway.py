@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+转发网关吞吐量基准测试
+
+启动本地判定服务和正向代理模拟器（见standins.py），部分代理为无人监听的端口，
+把它们写入代理池后启动网关（app/gateway/server.py），对比：
+- 直连：客户端直接经单个正常的代理模拟器访问判定服务
+- 网关：客户端经网关访问，网关按分数选择上游，遇到失效上游时自动重试
+
+每个请求新建一条连接（CONNECT隧道或绝对URI请求），报告每秒请求数、p50/p99延迟、失败数，
+以及网关的上游重试次数和同时转发的最大连接数。--hold 让每条隧道建立后保持一段时间再发送请求，
+用于测量数千条隧道同时打开时的表现。
+
+用法:
+    python benchmarks/bench_gateway.py --fake --requests 5000 --concurrency 500 --proxies 50 --dead-ratio 0.2
+    python benchmarks/bench_gateway.py --fake --requests 3000 --concurrency 3000 --hold 1
+"""
+
+import time
+import random
+import asyncio
+from urllib.parse import urlsplit
+
+from common import base_parser, make_storage, clear_storage, percentile
+from standins import start_judge, start_standin_proxies, dead_ports, stop_servers
+from app.api.snapshot import PoolSnapshot
+from app.gateway.server import ProxyGateway
+from app.gateway.upstream import UpstreamSelector
+from app.validator.feedback import UsageRecorder
+
+
+async def one_request(port: int, judge_url: str, mode: str, hold: float) -> bool:
+    """经port上的代理请求一次判定服务，返回是否成功"""
+    target = urlsplit(judge_url).netloc
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        if mode == "connect":
+            writer.write(f"CONNECT {target} HTTP/1.1\r\nHost: {target}\r\n\r\n".encode())
+            head = await reader.readuntil(b"\r\n\r\n")
+            if b" 200 " not in head.split(b"\r\n", 1)[0]:
+                return False
+            if hold:
+                await asyncio.sleep(hold)
+            writer.write(f"GET /ip HTTP/1.1\r\nHost: {target}\r\nConnection: close\r\n\r\n".encode())
+        else:
+            if hold:
+                await asyncio.sleep(hold)
+            writer.write(f"GET {judge_url} HTTP/1.1\r\nHost: {target}\r\nConnection: close\r\n\r\n".encode())
+        response = await reader.read()
+        return response.startswith(b"HTTP/1.1 200")
+    except (OSError, asyncio.IncompleteReadError):
+        return False
+    finally:
+        writer.close()
+
+
+async def run_load(port: int, judge_url: str, args) -> dict:
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+    failures = 0
+
+    async def worker():
+        nonlocal failures
+        async with semaphore:
+            started = time.perf_counter()
+            ok = await one_request(port, judge_url, args.mode, args.hold)
+            latencies.append((time.perf_counter() - started) * 1000)
+            failures += not ok
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.requests)))
+    elapsed = time.perf_counter() - started
+    return {
+        "rps": args.requests / elapsed,
+        "p50": percentile(latencies, 50),
+        "p99": percentile(latencies, 99),
+        "failures": failures,
+    }
+
+
+async def watch_active(gateway: ProxyGateway, peak: list) -> None:
+    while True:
+        peak[0] = max(peak[0], gateway.active)
+        await asyncio.sleep(0.01)
+
+
+async def main():
+    parser = base_parser("转发网关吞吐量基准测试")
+    parser.add_argument("--requests", type=int, default=5000, help="请求总数")
+    parser.add_argument("--concurrency", type=int, default=500, help="同时进行的请求数")
+    parser.add_argument("--proxies", type=int, default=50, help="代理池中的代理数")
+    parser.add_argument("--dead-ratio", type=float, default=0.2, help="失效代理（端口无人监听）的比例")
+    parser.add_argument("--mode", choices=["connect", "http"], default="connect", help="CONNECT隧道或绝对URI请求")
+    parser.add_argument("--hold", type=float, default=0.0, help="连接建立后保持的秒数")
+    parser.add_argument("--latency", type=float, default=0.0, help="代理模拟器附加的延迟（毫秒）")
+    args = parser.parse_args()
+
+    judge_runner, judge_url = await start_judge()
+    dead_count = int(args.proxies * args.dead_ratio)
+    servers, ports = await start_standin_proxies(args.proxies - dead_count, latency=args.latency / 1000)
+    proxies = [f"http://127.0.0.1:{port}" for port in ports + dead_ports(dead_count)]
+
+    storage = make_storage(args.fake)
+    await clear_storage(storage)
+    await storage.add_proxies_bulk(proxies, 10)
+    # 随机打散分数，失效代理也可能排在前面
+    await storage.update_scores({proxy: random.uniform(10, 20) for proxy in proxies})
+
+    snapshot = PoolSnapshot(storage)
+    await snapshot.reload()
+    gateway = ProxyGateway(
+        selector=UpstreamSelector(storage, snapshot, top_n=args.proxies),
+        recorder=UsageRecorder(storage), retries=3
+    )
+    gateway_port = await gateway.start("127.0.0.1", 0)
+    peak = [0]
+    watcher = asyncio.create_task(watch_active(gateway, peak))
+    try:
+        print(f"模式 {args.mode}，{args.requests} 个请求，并发 {args.concurrency}，"
+              f"代理 {args.proxies} 个（失效 {dead_count} 个）")
+        print(f"{'方式':>6} | {'请求/秒':>8} | {'p50':>8} | {'p99':>8} | {'失败':>6}  (ms)")
+        for name, port in [("直连", ports[0]), ("网关", gateway_port)]:
+            result = await run_load(port, judge_url, args)
+            print(f"{name:>6} | {result['rps']:>8.0f} | {result['p50']:>8.1f} | {result['p99']:>8.1f} | "
+                  f"{result['failures']:>6}")
+        await gateway.recorder.flush()
+        print(f"网关: 上游重试 {gateway.stats['upstream_failures']} 次，502 {gateway.stats['bad_gateway']} 次，"
+              f"最多同时转发 {peak[0]} 条连接，失效代理剩余 "
+              f"{sum([await storage.exists(proxy) for proxy in proxies[len(ports):]])}/{dead_count}")
+    finally:
+        watcher.cancel()
+        await gateway.stop()
+        await stop_servers(servers)
+        await judge_runner.cleanup()
+        await clear_storage(storage)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+GET /proxy 选取路径基准测试
+
+对比旧实现（拉取整个有序集合后在Python中过滤并random.sample）、
+新实现（协议索引 + ZRANDMEMBER）与API进程内快照（app.api.snapshot）在不同代理池规模下的p50/p99延迟，
+以及快照重新加载一次的耗时，和1%的代理变更后按变更日志增量更新一次的耗时。
+
+用法:
+    python benchmarks/bench_get_proxy.py --sizes 1000 10000 50000
+    python benchmarks/bench_get_proxy.py --fake
+"""
+
+import time
+import random
+import asyncio
+
+from common import base_parser, make_storage, clear_storage, random_proxies, percentile
+from app.api.snapshot import PoolSnapshot
+
+
+async def legacy_select(storage, count, protocol):
+    """旧实现：全量拉取后过滤"""
+    proxies = await storage.conn.zrevrangebyscore(storage.proxy_key, "+inf", "-inf", withscores=True)
+    if protocol:
+        proxies = [(p, s) for p, s in proxies if p.startswith(f"{protocol}://")]
+    return random.sample(proxies, min(count, len(proxies)))
+
+
+async def indexed_select(storage, count, protocol):
+    """新实现：服务端随机选取"""
+    return await storage.random_proxies(count, protocol)
+
+
+def snapshot_select(snapshot):
+    """进程内快照：不访问Redis"""
+    async def select(storage, count, protocol):
+        return snapshot.random(count, protocol)
+    return select
+
+
+async def measure(func, storage, requests, count, protocol):
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        await func(storage, count, protocol)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return percentile(latencies, 50), percentile(latencies, 99)
+
+
+async def main():
+    parser = base_parser("GET /proxy 选取路径基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000], help="代理池规模")
+    parser.add_argument("--requests", type=int, default=200, help="每组请求次数")
+    parser.add_argument("--count", type=int, default=1, help="每次请求的代理数量")
+    parser.add_argument("--protocol", default="https", help="协议过滤，传空字符串表示不过滤")
+    args = parser.parse_args()
+
+    storage = make_storage(args.fake)
+    protocol = args.protocol or None
+    print(f"{'池大小':>8} | {'旧实现 p50':>10} {'p99':>8} | {'新实现 p50':>10} {'p99':>8} | "
+          f"{'快照 p50':>8} {'p99':>8} | {'快照加载':>8} | {'增量更新':>8}  (ms)")
+    try:
+        for size in args.sizes:
+            await clear_storage(storage)
+            proxies = random_proxies(size)
+            async with storage.conn.pipeline(transaction=False) as pipe:
+                for proxy in proxies:
+                    pipe.zadd(storage.proxy_key, {proxy: random.uniform(10, 20)})
+                await pipe.execute()
+            await storage.backfill_indexes()
+
+            old_p50, old_p99 = await measure(legacy_select, storage, args.requests, args.count, protocol)
+            new_p50, new_p99 = await measure(indexed_select, storage, args.requests, args.count, protocol)
+            snapshot = PoolSnapshot(storage, max_age=3600)
+            start = time.perf_counter()
+            await snapshot.reload()
+            reload_ms = (time.perf_counter() - start) * 1000
+            snap_p50, snap_p99 = await measure(snapshot_select(snapshot), storage, args.requests, args.count, protocol)
+            # 一次验证结果写入：1%的代理更新分数
+            await storage.record_results({proxy: random.uniform(10, 20) for proxy in proxies[:max(1, size // 100)]}, [])
+            start = time.perf_counter()
+            await snapshot.update()
+            update_ms = (time.perf_counter() - start) * 1000
+            print(f"{size:>8} | {old_p50:>10.3f} {old_p99:>8.3f} | {new_p50:>10.3f} {new_p99:>8.3f} | "
+                  f"{snap_p50:>8.3f} {snap_p99:>8.3f} | {reload_ms:>8.1f} | {update_ms:>8.1f}")
+    finally:
+        await clear_storage(storage)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
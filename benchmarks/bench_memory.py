@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+代理编码内存基准测试
+
+分别用普通编码（protocol://ip:port字符串）与紧凑编码写入同一批代理，对比：
+- 代理池相关键（主集合、协议索引、检查时间）占用的内存：真实Redis使用MEMORY USAGE，
+  fakeredis不支持该命令，改为统计成员本身的字节数
+- 分页读取并还原为代理URL的耗时
+
+用法:
+    python benchmarks/bench_memory.py --sizes 10000 100000
+    python benchmarks/bench_memory.py --fake --sizes 10000
+"""
+
+import time
+import asyncio
+
+from common import base_parser, make_storage, clear_storage, random_proxies
+from app.storage.codec import PLAIN, COMPACT
+
+
+async def memory_usage(storage) -> tuple:
+    """返回(占用字节数, 统计方式)"""
+    keys = [storage.proxy_key, *storage.protocol_keys(), storage.checked_key]
+    try:
+        usages = [await storage.conn.memory_usage(key, samples=0) for key in keys]
+        return sum(usage or 0 for usage in usages), "MEMORY USAGE"
+    except Exception:
+        encoding = storage.conn.get_encoder().encoding
+        total = 0
+        for key in keys:
+            total += sum(len(member.encode(encoding)) for member in await storage.conn.zrange(key, 0, -1))
+        return total, "成员字节数"
+
+
+async def read_pages(storage, size: int, page: int = 1000) -> float:
+    """分页读取整个代理池，返回耗时（秒）"""
+    start = time.perf_counter()
+    for offset in range(0, size, page):
+        await storage.get_proxies_page(offset, page)
+    return time.perf_counter() - start
+
+
+async def main():
+    parser = base_parser("代理编码内存基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000], help="代理池规模")
+    args = parser.parse_args()
+
+    print(f"{'规模':>8} | {'编码':>7} | {'内存':>12} | {'每代理':>8} | {'分页读取':>8} | 统计方式")
+    for size in args.sizes:
+        proxies = random_proxies(size)
+        for encoding in [PLAIN, COMPACT]:
+            storage = make_storage(args.fake, encoding)
+            await clear_storage(storage)
+            try:
+                await storage.add_proxies_bulk(proxies, 10)
+                used, method = await memory_usage(storage)
+                elapsed = await read_pages(storage, size)
+                print(f"{size:>8} | {encoding:>7} | {used:>10,}B | {used / size:>7.1f}B | "
+                      f"{elapsed * 1000:>6.0f}ms | {method}")
+            finally:
+                await clear_storage(storage)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
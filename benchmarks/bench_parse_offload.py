@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+爬取期间API延迟基准测试
+
+在同一事件循环中运行FastAPI应用（ASGI传输，不监听端口）和一轮爬取，
+爬取期间持续请求 GET /proxy，对比页面解析的三种执行方式下的API延迟：
+- none: 直接在事件循环中解析（旧实现）
+- thread: 线程池
+- process: 进程池
+
+爬虫使用 FreeProxyListCrawler 的解析逻辑，页面由本地生成的大表格模拟。
+
+用法:
+    python benchmarks/bench_parse_offload.py --fake --pages 8 --rows 2000
+"""
+
+import time
+import asyncio
+
+import httpx
+from fastapi import FastAPI
+
+from common import base_parser, make_storage, clear_storage, random_proxies, percentile
+import app.api.router as api_router
+from app.crawlers import base_crawler, executor
+from app.crawlers.limiter import HostLimiter
+from app.crawlers.sources.free_proxy_list import FreeProxyListCrawler
+
+
+def make_page(rows: int) -> str:
+    body = "".join(
+        f"<tr><td>10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}</td><td>{1024 + i % 60000}</td>"
+        f"<td>CN</td><td>China</td><td>anonymous</td><td>no</td><td>{'yes' if i % 2 else 'no'}</td><td>1 min</td></tr>"
+        for i in range(rows)
+    )
+    return f'<html><body><table id="proxylisttable"><tbody>{body}</tbody></table></body></html>'
+
+
+class BenchCrawler(FreeProxyListCrawler):
+    """只统计解析出的代理数量，不写入Redis"""
+    async def save_proxies(self, proxies):
+        return len(proxies)
+
+
+async def crawl_once(kind: str, pages: int, page: str) -> float:
+    crawler = BenchCrawler()
+    crawler.urls = [f"https://free-proxy-list.net/?page={i}" for i in range(pages)]
+    crawler.parse_executor = kind
+    crawler.cache.ttl = 0  # 关闭响应缓存，每轮都完整解析
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, text=page))
+    start = time.perf_counter()
+    async with httpx.AsyncClient(transport=transport) as client:
+        await crawler.crawl(client)
+    return time.perf_counter() - start
+
+
+async def measure(api: httpx.AsyncClient, kind: str, pages: int, page: str, interval: float):
+    """按固定节拍发请求，延迟从计划发送时间算起
+
+    事件循环被阻塞时错过的节拍也计入延迟（避免协调遗漏），否则阻塞期间根本不会产生样本
+    """
+    latencies = []
+    crawl = asyncio.create_task(crawl_once(kind, pages, page))
+    finished = []
+    crawl.add_done_callback(lambda _: finished.append(time.perf_counter()))
+    scheduled = time.perf_counter()
+    # 爬取结束前计划发送的请求都要发出，包括事件循环阻塞期间错过的节拍
+    while not finished or scheduled <= finished[0]:
+        wait = scheduled - time.perf_counter()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        resp = await api.get("/proxy")
+        latencies.append((time.perf_counter() - scheduled) * 1000)
+        resp.raise_for_status()
+        scheduled += interval
+    return await crawl, latencies
+
+
+async def main():
+    parser = base_parser("爬取期间API延迟基准测试")
+    parser.add_argument("--pages", type=int, default=8, help="每轮爬取的页面数")
+    parser.add_argument("--rows", type=int, default=2000, help="每个页面的代理行数")
+    parser.add_argument("--interval", type=float, default=0.01, help="API请求间隔（秒）")
+    args = parser.parse_args()
+
+    storage = make_storage(args.fake)
+    await clear_storage(storage)
+    await storage.add_proxies_bulk(random_proxies(1000), 10)
+    api_router.redis_storage = storage
+    base_crawler.host_limiter = HostLimiter(concurrency=args.pages, interval=0)
+
+    app = FastAPI()
+    app.include_router(api_router.router)
+    page = make_page(args.rows)
+
+    # 预热：启动进程池并在工作进程中导入解析所需模块
+    await executor.run_parse(BenchCrawler(), make_page(1), "warmup", executor.PROCESS)
+
+    print(f"{'解析方式':>8} | {'爬取耗时':>8} | {'请求数':>6} | {'p50':>7} {'p99':>8} {'max':>8}  (ms)")
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as api:
+            for kind in [executor.INLINE, executor.THREAD, executor.PROCESS]:
+                elapsed, latencies = await measure(api, kind, args.pages, page, args.interval)
+                print(f"{kind:>8} | {elapsed:>7.2f}s | {len(latencies):>6} | "
+                      f"{percentile(latencies, 50):>7.2f} {percentile(latencies, 99):>8.2f} {max(latencies):>8.2f}")
+    finally:
+        executor.shutdown_parse_executors()
+        await clear_storage(storage)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
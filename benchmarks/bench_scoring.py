@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+代理评分离线回放基准测试
+
+生成一份验证记录（每个代理有固定的真实成功率与响应时间分布，按批次多轮验证），
+用三种评分方式回放同一份记录，对比：
+- 排序质量：最终分数与真实质量（成功率 × 延迟系数）的Spearman秩相关系数，以及前10%的命中率
+- 稳定性：同一代理相邻两次验证后分数变化的平均绝对值
+
+评分方式:
+- batch:     按同批次的最小/最大响应时间归一化（最早的实现），失败扣5分
+- stateless: 按超时时间归一化，只看最近一次结果，失败扣5分
+- ewma:      app.validator.scoring.ScoringEngine
+
+用法:
+    python benchmarks/bench_scoring.py --proxies 2000 --rounds 30 --batch 200
+"""
+
+import random
+import argparse
+from collections import defaultdict
+
+import common  # noqa: F401  添加项目根目录到Python路径
+from app.validator.scoring import ScoringEngine
+
+TIMEOUT_MS = 15000
+PENALTY = 5
+
+
+def make_trace(proxies: int, rounds: int, batch: int, seed: int):
+    """返回(真实质量, 验证记录)，验证记录为批次列表，每批为[(代理编号, 是否成功, 响应时间)]"""
+    rng = random.Random(seed)
+    truth = []
+    for _ in range(proxies):
+        reliability = rng.uniform(0.3, 1.0)
+        median = rng.uniform(100, 8000)
+        truth.append((reliability, median))
+    trace = []
+    for _ in range(rounds * proxies // batch):
+        records = []
+        for index in rng.sample(range(proxies), batch):
+            reliability, median = truth[index]
+            if rng.random() < reliability:
+                records.append((index, True, min(TIMEOUT_MS, rng.lognormvariate(0, 0.6) * median)))
+            else:
+                records.append((index, False, None))
+        trace.append(records)
+    quality = [reliability * (10 + 10 * max(0.0, 1 - median / TIMEOUT_MS)) for reliability, median in truth]
+    return quality, trace
+
+
+def replay_batch(trace):
+    scores = defaultdict(lambda: 10.0)
+    changes = []
+    for records in trace:
+        times = [rt for _, ok, rt in records if ok]
+        low, high = (min(times), max(times)) if times else (0, 0)
+        for index, ok, rt in records:
+            old = scores[index]
+            if ok:
+                scores[index] = 10 + 10 * (1 - (rt - low) / (high - low) if high > low else 1)
+            else:
+                scores[index] = old - PENALTY
+            changes.append(abs(scores[index] - old))
+    return scores, changes
+
+
+def replay_stateless(trace):
+    scores = defaultdict(lambda: 10.0)
+    changes = []
+    for records in trace:
+        for index, ok, rt in records:
+            old = scores[index]
+            scores[index] = 10 + 10 * max(0.0, 1 - rt / TIMEOUT_MS) if ok else old - PENALTY
+            changes.append(abs(scores[index] - old))
+    return scores, changes
+
+
+def replay_ewma(trace):
+    engine = ScoringEngine(timeout_ms=TIMEOUT_MS)
+    states = {}
+    scores = defaultdict(lambda: 10.0)
+    changes = []
+    for records in trace:
+        for index, ok, rt in records:
+            old = scores[index]
+            states[index] = engine.update(states.get(index), ok, rt)
+            scores[index] = engine.score(states[index])
+            changes.append(abs(scores[index] - old))
+    return scores, changes
+
+
+def ranks(values):
+    order = sorted(range(len(values)), key=values.__getitem__)
+    result = [0.0] * len(values)
+    for rank, index in enumerate(order):
+        result[index] = rank
+    return result
+
+
+def spearman(a, b):
+    ra, rb = ranks(a), ranks(b)
+    n = len(a)
+    mean = (n - 1) / 2
+    cov = sum((x - mean) * (y - mean) for x, y in zip(ra, rb))
+    var = sum((x - mean) ** 2 for x in ra)
+    return cov / var
+
+
+def top_hit_rate(scores, quality, fraction=0.1):
+    k = max(1, int(len(quality) * fraction))
+    best = set(sorted(range(len(quality)), key=quality.__getitem__, reverse=True)[:k])
+    picked = sorted(range(len(quality)), key=scores.__getitem__, reverse=True)[:k]
+    return len(best.intersection(picked)) / k
+
+
+def main():
+    parser = argparse.ArgumentParser(description="代理评分离线回放基准测试")
+    parser.add_argument("--proxies", type=int, default=2000, help="代理数量")
+    parser.add_argument("--rounds", type=int, default=30, help="平均每个代理被验证的次数")
+    parser.add_argument("--batch", type=int, default=200, help="每批验证的代理数")
+    parser.add_argument("--seed", type=int, default=1, help="随机种子")
+    args = parser.parse_args()
+
+    quality, trace = make_trace(args.proxies, args.rounds, args.batch, args.seed)
+    print(f"{'评分方式':>10} | {'Spearman':>8} | {'前10%命中率':>10} | {'平均分数变化':>10}")
+    for name, replay in [("batch", replay_batch), ("stateless", replay_stateless), ("ewma", replay_ewma)]:
+        scores, changes = replay(trace)
+        final = [scores[index] for index in range(args.proxies)]
+        print(f"{name:>10} | {spearman(final, quality):>8.3f} | {top_hit_rate(final, quality):>10.1%} | "
+              f"{sum(changes) / len(changes):>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+会话粘滞路由基准测试
+
+在不同规模的代理池上构建一致性哈希环（app/api/hash_ring.py），报告：
+- 构建时间：从空环同步全部代理
+- 同步时间：移除/加入一部分代理后增量同步，以及只移除1个、加入1个代理时的同步（原数组上插入/删除）
+- 事件循环阻塞：sync_async()同步（移除并加入一部分代理）期间，事件循环最长一次没有得到执行的时间
+- 查找速率：每秒可查找的会话数
+- 迁移比例：代理变化后改变代理的会话比例（理想值约为变化代理数 / 代理总数）
+
+用法:
+    python benchmarks/bench_sticky.py --sizes 1000 10000 50000 --churn 0.01 --sessions 100000
+"""
+
+import time
+import asyncio
+
+from common import base_parser, random_proxies
+from app.api.hash_ring import HashRing
+
+
+def owners(ring: HashRing, sessions) -> list:
+    return [ring.lookup(session)[0] for session in sessions]
+
+
+def moved_ratio(before: list, after: list) -> float:
+    return sum(a != b for a, b in zip(before, after)) / len(before)
+
+
+async def max_stall(ring: HashRing, members) -> float:
+    """sync_async()期间事件循环最长一次没有得到执行的时间（毫秒）"""
+    loop = asyncio.get_running_loop()
+    stalls = [0.0]
+
+    async def ticker():
+        last = loop.time()
+        while True:
+            await asyncio.sleep(0.001)
+            stalls.append(loop.time() - last - 0.001)
+            last = loop.time()
+
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(0)
+    await ring.sync_async(members)
+    task.cancel()
+    return max(stalls) * 1000
+
+
+def run(size: int, args) -> dict:
+    proxies = random_proxies(size + int(size * args.churn))
+    pool, extra = proxies[:size], proxies[size:]
+    churn = len(extra)
+    sessions = [f"session-{i}" for i in range(args.sessions)]
+    ring = HashRing(args.vnodes)
+
+    started = time.perf_counter()
+    ring.sync(pool)
+    build = time.perf_counter() - started
+
+    started = time.perf_counter()
+    before = owners(ring, sessions)
+    lookup_rate = len(sessions) / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    ring.sync(pool[churn:])
+    evict_time = time.perf_counter() - started
+    evicted = owners(ring, sessions)
+
+    started = time.perf_counter()
+    ring.sync(pool[churn:] + extra)
+    add_time = time.perf_counter() - started
+    added = owners(ring, sessions)
+
+    # 验证器移除1个代理、爬虫补充1个代理
+    started = time.perf_counter()
+    ring.sync(pool[churn + 1:] + extra + pool[:1])
+    single_time = time.perf_counter() - started
+
+    stall = asyncio.run(max_stall(ring, pool[:churn] + pool[2 * churn + 1:] + extra))
+    return {
+        "build": build * 1000,
+        "evict": evict_time * 1000,
+        "add": add_time * 1000,
+        "single": single_time * 1000,
+        "stall": stall,
+        "lookup_rate": lookup_rate,
+        "evict_moved": moved_ratio(before, evicted),
+        "add_moved": moved_ratio(evicted, added),
+        "ideal": churn / size,
+    }
+
+
+def main():
+    parser = base_parser("会话粘滞路由基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000], help="代理池规模")
+    parser.add_argument("--churn", type=float, default=0.01, help="每次移除/加入的代理比例")
+    parser.add_argument("--sessions", type=int, default=100000, help="会话数")
+    parser.add_argument("--vnodes", type=int, default=32, help="每个代理的虚拟节点数")
+    args = parser.parse_args()
+
+    print(f"虚拟节点 {args.vnodes}，会话 {args.sessions} 个，每次变化 {args.churn:.1%} 的代理")
+    print(f"{'代理数':>8} | {'构建':>8} | {'移除同步':>8} | {'加入同步':>8} | {'单个变化':>8} | {'循环阻塞':>8} | "
+          f"{'查找/秒':>9} | {'移除迁移':>8} | {'加入迁移':>8} | {'理想':>6}  (ms)")
+    for size in args.sizes:
+        r = run(size, args)
+        print(f"{size:>8} | {r['build']:>8.1f} | {r['evict']:>8.1f} | {r['add']:>8.1f} | {r['single']:>8.2f} | "
+              f"{r['stall']:>8.1f} | {r['lookup_rate']:>9.0f} | {r['evict_moved']:>8.2%} | {r['add_moved']:>8.2%} | "
+              f"{r['ideal']:>6.2%}")
+
+
+if __name__ == "__main__":
+    main()
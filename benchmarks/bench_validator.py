@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+验证器吞吐量基准测试
+
+使用本地判定服务和正向代理模拟器（见standins.py）测量每秒可验证的代理数量，
+不依赖外网，结果可重复。对比：
+- 每次验证新建会话（旧实现：每个代理/测试URL重建连接器、DNS缓存和SSL上下文）
+- 整个任务共享一个会话（新实现）
+- 共享会话 + TCP预筛（先建立TCP连接淘汰端口不通的代理，再对通过者发起HTTP验证）
+
+用法:
+    python benchmarks/bench_validator.py --proxies 2000 --dead-ratio 0.3 --blackhole-ratio 0.05 --latency 20
+"""
+
+import time
+import random
+import asyncio
+
+import aiohttp
+
+import common  # noqa: F401  设置项目路径
+from standins import start_judge, start_standin_proxies, dead_ports, stop_servers, BLACKHOLE, ERROR
+from app.validator.proxy_validator import ProxyValidator
+
+
+def make_validator(judge_url: str, timeout: float) -> ProxyValidator:
+    validator = ProxyValidator()
+    validator.test_urls = {protocol: [judge_url] for protocol in validator.test_urls}
+    validator.timeout = aiohttp.ClientTimeout(total=timeout)
+    validator.connect_timeout = min(validator.connect_timeout, timeout)
+    return validator
+
+
+async def run_per_check_session(validator, proxies):
+    """旧方式：每个代理使用独立会话"""
+    async def verify(proxy):
+        async with validator.create_session() as session:
+            return await validator._verify_proxy(proxy, session)
+    return await asyncio.gather(*(verify(proxy) for proxy in proxies))
+
+
+async def run_shared_session(validator, proxies):
+    """新方式：整个任务共享一个会话"""
+    async with validator.create_session() as session:
+        return await asyncio.gather(*(validator._verify_proxy(proxy, session) for proxy in proxies))
+
+
+async def run_prefiltered(validator, proxies):
+    """两阶段：TCP预筛后仅对通过者发起HTTP验证"""
+    semaphore = asyncio.Semaphore(validator.connect_concurrency)
+
+    async def connect(proxy):
+        async with semaphore:
+            return await validator._connect_proxy(proxy)
+
+    reachable = await asyncio.gather(*(connect(proxy) for proxy in proxies))
+    survivors = [proxy for proxy, ok in zip(proxies, reachable) if ok]
+    print(f"  TCP预筛通过 {len(survivors)}/{len(proxies)} ({len(survivors) / len(proxies):.1%})")
+    results = await run_shared_session(validator, survivors)
+    return results + [(proxy, False, 0) for proxy, ok in zip(proxies, reachable) if not ok]
+
+
+async def main():
+    parser = common.base_parser("验证器吞吐量基准测试")
+    parser.add_argument("--proxies", type=int, default=2000, help="待验证代理数量")
+    parser.add_argument("--dead-ratio", type=float, default=0.3, help="无人监听端口的比例")
+    parser.add_argument("--blackhole-ratio", type=float, default=0.0, help="接受连接但不响应的代理比例")
+    parser.add_argument("--error-ratio", type=float, default=0.0, help="返回502的代理比例")
+    parser.add_argument("--latency", type=float, default=0.0, help="可用代理的转发延迟（毫秒）")
+    parser.add_argument("--timeout", type=float, default=2.0, help="验证超时（秒）")
+    parser.add_argument("--seed", type=int, default=1, help="随机种子")
+    args = parser.parse_args()
+
+    # 每个代理对应一个独立端口，避免连接池把不同代理视为同一个
+    dead_count = int(args.proxies * args.dead_ratio)
+    blackhole_count = int(args.proxies * args.blackhole_ratio)
+    error_count = int(args.proxies * args.error_ratio)
+    live_count = args.proxies - dead_count - blackhole_count - error_count
+
+    judge_runner, judge_url = await start_judge()
+    servers, ports = await start_standin_proxies(live_count, latency=args.latency / 1000)
+    for behaviour, count in [(BLACKHOLE, blackhole_count), (ERROR, error_count)]:
+        more_servers, more_ports = await start_standin_proxies(count, behaviour)
+        servers += more_servers
+        ports += more_ports
+    ports += dead_ports(dead_count)
+    random.Random(args.seed).shuffle(ports)
+    proxies = [f"http://127.0.0.1:{port}" for port in ports]
+
+    try:
+        for name, func in [
+            ("每次新建会话", run_per_check_session),
+            ("共享会话", run_shared_session),
+            ("共享会话+TCP预筛", run_prefiltered),
+        ]:
+            validator = make_validator(judge_url, args.timeout)
+            start = time.perf_counter()
+            results = await func(validator, proxies)
+            elapsed = time.perf_counter() - start
+            valid = sum(1 for _, ok, *_ in results if ok)
+            print(f"{name}: 有效{valid}/{len(proxies)}, 耗时{elapsed:.2f}s, {len(proxies) / elapsed:,.0f} 个/秒")
+    finally:
+        await stop_servers(servers)
+        await judge_runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
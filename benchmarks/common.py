@@ -0,0 +1,78 @@
+"""
+基准测试公共工具
+
+默认连接配置中的Redis（REDIS_HOST/REDIS_PORT），使用 --fake 时改用fakeredis。
+所有基准测试都使用 bench: 前缀的独立键，不会影响线上代理池数据。
+"""
+
+import os
+import sys
+import random
+import argparse
+from typing import List
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.core.config import settings
+from app.storage.codec import COMPACT
+from app.storage.redis_client import RedisStorage
+
+BENCH_PREFIX = "bench:"
+
+
+def base_parser(description: str) -> argparse.ArgumentParser:
+    """创建带公共参数的命令行解析器"""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--fake", action="store_true", help="使用fakeredis代替真实Redis")
+    return parser
+
+
+def make_storage(fake: bool = False, encoding: str = settings.PROXY_ENCODING) -> RedisStorage:
+    """创建使用独立键名的RedisStorage"""
+    conn = None
+    if fake:
+        import fakeredis
+        conn = fakeredis.FakeAsyncRedis(decode_responses=True, encoding="latin-1" if encoding == COMPACT else "utf-8")
+    storage = RedisStorage(conn, encoding)
+    storage.proxy_key = BENCH_PREFIX + settings.PROXY_KEY
+    storage.protocol_key_prefix = BENCH_PREFIX + settings.PROTOCOL_KEY_PREFIX
+    storage.fail_key = BENCH_PREFIX + settings.FAIL_KEY
+    storage.checked_key = BENCH_PREFIX + settings.CHECKED_KEY
+    storage.candidate_key = BENCH_PREFIX + settings.CANDIDATE_KEY
+    storage.dead_key = BENCH_PREFIX + settings.DEAD_KEY
+    storage.meta_key = BENCH_PREFIX + settings.META_KEY
+    storage.lease_key = BENCH_PREFIX + settings.LEASE_KEY
+    storage.lease_expiry_key = BENCH_PREFIX + settings.LEASE_KEY + ":expiry"
+    storage.leased_key = BENCH_PREFIX + settings.LEASED_KEY
+    storage.stats_key = BENCH_PREFIX + settings.STATS_KEY
+    storage.change_channel = BENCH_PREFIX + settings.POOL_CHANGE_CHANNEL
+    storage.changes_key = BENCH_PREFIX + settings.POOL_CHANGES_KEY
+    storage.version_key = BENCH_PREFIX + settings.POOL_CHANGES_KEY + ":version"
+    return storage
+
+
+async def clear_storage(storage: RedisStorage) -> None:
+    """删除基准测试写入的所有键"""
+    keys = [key async for key in storage.conn.scan_iter(match=BENCH_PREFIX + "*")]
+    if keys:
+        await storage.conn.delete(*keys)
+
+
+def random_proxies(count: int, protocols: List[str] = None) -> List[str]:
+    """生成指定数量的随机代理URL"""
+    protocols = protocols or settings.PROTOCOLS
+    proxies = set()
+    while len(proxies) < count:
+        ip = ".".join(str(random.randint(1, 254)) for _ in range(4))
+        proxies.add(f"{random.choice(protocols)}://{ip}:{random.randint(1024, 65535)}")
+    return list(proxies)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """计算百分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
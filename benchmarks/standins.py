@@ -0,0 +1,158 @@
+"""
+本地代理模拟器
+
+在127.0.0.1上启动本地判定服务（app/validator/judge.py）和若干正向代理模拟器，
+代理把请求真实转发到判定服务，用于在单机上确定性地测量验证器吞吐量。
+
+代理模拟器支持几种行为：
+- live: 正常转发（支持绝对URI形式的HTTP请求和CONNECT隧道），可附加固定延迟
+- blackhole: 接受连接但从不响应，模拟导致验证超时的代理
+- error: 直接返回502
+另外 dead_ports() 提供无人监听的端口，模拟已关闭的代理。
+"""
+
+import socket
+import asyncio
+from typing import List, Tuple
+from urllib.parse import urlsplit
+
+from aiohttp import web
+
+import common  # noqa: F401  设置项目路径
+from app.validator.judge import create_app
+
+LIVE = "live"
+BLACKHOLE = "blackhole"
+ERROR = "error"
+
+BAD_GATEWAY = b"HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+CONNECTED = b"HTTP/1.1 200 Connection established\r\n\r\n"
+
+
+async def start_judge() -> Tuple[web.AppRunner, str]:
+    """启动本地判定服务，返回runner和判定URL"""
+    runner = web.AppRunner(create_app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0, backlog=1024)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/ip"
+
+
+async def _pipe(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            writer.write(data)
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def _read_head(reader: asyncio.StreamReader) -> List[bytes]:
+    """读取请求行和请求头，连接关闭时返回空列表"""
+    lines = []
+    while True:
+        line = await reader.readline()
+        if not line:
+            return []
+        if line in (b"\r\n", b"\n"):
+            return lines
+        lines.append(line)
+
+
+async def _tunnel(target: str, reader, writer) -> None:
+    host, _, port = target.partition(":")
+    try:
+        upstream_reader, upstream_writer = await asyncio.open_connection(host, int(port or 443))
+    except OSError:
+        writer.write(BAD_GATEWAY)
+        return
+    writer.write(CONNECTED)
+    await writer.drain()
+    await asyncio.gather(_pipe(reader, upstream_writer), _pipe(upstream_reader, writer))
+
+
+async def _forward(method: str, url: str, headers: List[bytes], writer) -> None:
+    """把一个绝对URI请求转发给目标服务，读取完整响应后原样返回"""
+    parts = urlsplit(url)
+    try:
+        upstream_reader, upstream_writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+    except OSError:
+        writer.write(BAD_GATEWAY)
+        return
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+    request = [f"{method} {path} HTTP/1.1\r\n".encode()]
+    request += [line for line in headers
+                if not line.lower().startswith((b"proxy-", b"connection:"))]
+    request.append(b"Via: 1.1 proxy-simulator\r\nConnection: close\r\n\r\n")
+    upstream_writer.write(b"".join(request))
+    await upstream_writer.drain()
+    writer.write(await upstream_reader.read())
+    upstream_writer.close()
+
+
+def _make_handler(behaviour: str, latency: float):
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                head = await _read_head(reader)
+                if not head:
+                    break
+                if behaviour == BLACKHOLE:
+                    # 读完请求后不再响应，直到客户端超时断开
+                    await reader.read()
+                    break
+                if latency:
+                    await asyncio.sleep(latency)
+                if behaviour == ERROR:
+                    writer.write(BAD_GATEWAY)
+                    break
+                method, target, _ = head[0].decode("latin-1").split(" ", 2)
+                if method == "CONNECT":
+                    await _tunnel(target, reader, writer)
+                    break
+                await _forward(method, target, head[1:], writer)
+                # 上游响应带有Connection: close，转发一次后关闭连接
+                break
+            await writer.drain()
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+    return handle
+
+
+async def start_standin_proxies(count: int, behaviour: str = LIVE,
+                                latency: float = 0.0) -> Tuple[List[asyncio.AbstractServer], List[int]]:
+    """启动count个代理模拟器（每个一个端口），返回服务对象和端口列表"""
+    handler = _make_handler(behaviour, latency)
+    servers = []
+    ports = []
+    for _ in range(count):
+        server = await asyncio.start_server(handler, "127.0.0.1", 0, backlog=1024)
+        servers.append(server)
+        ports.append(server.sockets[0].getsockname()[1])
+    return servers, ports
+
+
+def dead_ports(count: int) -> List[int]:
+    """获取count个当前无人监听的端口，连接会被立即拒绝"""
+    ports = []
+    for _ in range(count):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            ports.append(sock.getsockname()[1])
+    return ports
+
+
+async def stop_servers(servers: List[asyncio.AbstractServer]) -> None:
+    for server in servers:
+        server.close()
+        await server.wait_closed()
@@ -5,8 +5,11 @@ import signal
 import sys
 from fastapi import FastAPI
 from app.api.router import router
-from app.crawlers import discover_crawlers
-from app.validator.proxy_validator import ProxyValidator
+from app.api.snapshot import pool_snapshot
+from app.crawlers import run_crawlers
+from app.crawlers.executor import shutdown_parse_executors
+from app.validator.proxy_validator import proxy_validator as validator
+from app.validator.scheduler import RevalidationScheduler, CandidateValidator
 from app.storage.redis_client import redis_storage
 from app.core.config import settings
 import logging
@@ -25,40 +28,11 @@ app.include_router(router)
 
 # 全局变量，用于控制后台任务
 running = True
-validator = ProxyValidator()
+scheduler = RevalidationScheduler(validator)
+candidates = CandidateValidator(validator)
 
-async def run_crawlers():
-    """运行所有爬虫"""
-    crawler_classes = discover_crawlers()
-    if not crawler_classes:
-        logger.warning("未发现爬虫类")
-        return 0
-        
-    logger.info(f"开始运行 {len(crawler_classes)} 个爬虫")
-    tasks = []
-    
-    for crawler_cls in crawler_classes:
-        crawler = crawler_cls()
-        tasks.append(crawler.crawl())
-    
-    results = await asyncio.gather(*tasks, return_exceptions=True)
-    
-    # 处理结果，记录错误
-    total_proxies = 0
-    success_count = 0
-    for i, result in enumerate(results):
-        if isinstance(result, Exception):
-            logger.error(f"爬虫 {crawler_classes[i].__name__} 执行出错: {str(result)}")
-        elif isinstance(result, int):
-            total_proxies += result
-            if result > 0:
-                success_count += 1
-    
-    logger.info(f"爬虫任务完成，{success_count}/{len(crawler_classes)} 个爬虫成功，共获取 {total_proxies} 个代理")
-    return total_proxies
-
-async def validate_task():
-    """定期验证代理的后台任务"""
+async def maintain_task():
+    """定期检查代理数量并按需触发爬虫的后台任务"""
     # 记录上次爬虫执行时间，避免频繁触发
     last_crawl_time = 0
     
@@ -66,7 +40,7 @@ async def validate_task():
         try:
             current_time = time.time()
             
-            # 检查代理数量
+            # 检查代理数量（验证由增量调度器持续进行，这里只负责补充代理）
             proxy_count = await redis_storage.count_proxies()
             logger.info(f"当前代理数量: {proxy_count}")
             
@@ -78,29 +52,24 @@ async def validate_task():
                     last_crawl_time = current_time
                 else:
                     logger.info(f"代理池为空，但距离上次爬虫任务不足{settings.CRAWL_MIN_INTERVAL}秒，跳过")
-            else:
-                # 验证所有代理
-                valid_count = await validator.check_all_proxies()
-                logger.info(f"验证完成，有效代理数量: {valid_count}")
-                
-                # 如果代理数量低于阈值，触发爬虫任务
-                if valid_count < settings.MIN_PROXIES and current_time - last_crawl_time > settings.CRAWL_MIN_INTERVAL:
-                    logger.warning(f"代理数量 ({valid_count}) 低于最小阈值 ({settings.MIN_PROXIES})，触发爬虫任务")
-                    await run_crawlers()
-                    last_crawl_time = current_time
-                # 定期触发爬虫任务，即使代理数量足够，也要保持新鲜度
-                elif current_time - last_crawl_time > settings.CRAWL_INTERVAL:
-                    logger.info(f"距离上次爬虫任务已超过{settings.CRAWL_INTERVAL}秒，定期触发爬虫任务")
-                    await run_crawlers()
-                    last_crawl_time = current_time
+            # 如果代理数量低于阈值，触发爬虫任务
+            elif proxy_count < settings.MIN_PROXIES and current_time - last_crawl_time > settings.CRAWL_MIN_INTERVAL:
+                logger.warning(f"代理数量 ({proxy_count}) 低于最小阈值 ({settings.MIN_PROXIES})，触发爬虫任务")
+                await run_crawlers()
+                last_crawl_time = current_time
+            # 定期触发爬虫任务，即使代理数量足够，也要保持新鲜度
+            elif current_time - last_crawl_time > settings.CRAWL_INTERVAL:
+                logger.info(f"距离上次爬虫任务已超过{settings.CRAWL_INTERVAL}秒，定期触发爬虫任务")
+                await run_crawlers()
+                last_crawl_time = current_time
             
-            # 等待下一次验证
+            # 等待下一次检查
             await asyncio.sleep(settings.CHECK_INTERVAL)
         except asyncio.CancelledError:
-            logger.info("验证任务被取消")
+            logger.info("维护任务被取消")
             break
         except Exception as e:
-            logger.error(f"验证任务异常: {str(e)}", exc_info=True)
+            logger.error(f"维护任务异常: {str(e)}", exc_info=True)
             await asyncio.sleep(60)  # 出错后等待1分钟再重试
 
 async def startup_event():
@@ -122,15 +91,30 @@ async def startup_event():
         # 创建一个新的任务来执行爬虫，避免阻塞启动过程
         asyncio.create_task(run_crawlers())
     
-    # 启动验证任务
-    asyncio.create_task(validate_task())
+    # 启动增量验证、待验证代理消费和维护任务
+    asyncio.create_task(scheduler.run())
+    asyncio.create_task(candidates.run())
+    asyncio.create_task(maintain_task())
+    asyncio.create_task(pool_snapshot.run())
     logger.info("后台验证任务已启动")
 
+async def shutdown_event():
+    """应用关闭时释放爬虫解析进程池"""
+    shutdown_parse_executors()
+
 def handle_exit(signum, frame):
     """处理退出信号"""
     global running
     logger.info("接收到退出信号，正在关闭...")
     running = False
+    scheduler.stop()
+    candidates.stop()
+    pool_snapshot.stop()
+
+async def crawl_and_validate():
+    """运行爬虫并验证本轮新加入的待验证代理（命令行 --crawl）"""
+    await run_crawlers()
+    await candidates.run_once()
 
 async def run_api_server():
     """运行API服务器"""
@@ -150,10 +134,11 @@ if __name__ == "__main__":
     signal.signal(signal.SIGTERM, handle_exit)
     
     if args.crawl:
-        asyncio.run(run_crawlers())
+        asyncio.run(crawl_and_validate())
     elif args.validate:
         asyncio.run(validator.check_all_proxies())
     else:
         # 启动API服务器和后台任务
         app.add_event_handler("startup", startup_event)
+        app.add_event_handler("shutdown", shutdown_event)
         asyncio.run(run_api_server())
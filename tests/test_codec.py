@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+代理紧凑编码测试
+
+检查编码还原、紧凑编码下的存储读写与编码迁移
+"""
+
+import os
+import sys
+import asyncio
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from app.storage import codec
+from app.storage.migrate import migrate
+from app.storage.redis_client import RedisStorage
+
+
+def make_storage(encoding):
+    conn = fakeredis.FakeAsyncRedis(decode_responses=True, encoding="latin-1")
+    return RedisStorage(conn, encoding)
+
+
+@pytest.mark.parametrize("proxy", ["http://1.2.3.4:8080", "socks5://255.255.255.255:65535", "https://[2001:db8::1]:443"])
+def test_compact_round_trip(proxy):
+    member = codec.CompactCodec().encode(proxy)
+    assert len(member) in (codec.IPV4_SIZE, codec.IPV6_SIZE)
+    assert codec.CompactCodec().decode(member) == proxy
+    assert codec.PlainCodec().decode(member) == proxy
+
+
+@pytest.mark.parametrize("proxy", ["http://example.com:80", "http://user:pw@1.2.3.4:80", "ftp://1.2.3.4:21", "http://1.2.3.4:0"])
+def test_unencodable_proxies_stay_plain(proxy):
+    assert codec.CompactCodec().encode(proxy) == proxy
+
+
+def test_compact_storage_is_transparent():
+    async def run():
+        storage = make_storage(codec.COMPACT)
+        proxies = ["http://1.1.1.1:80", "https://2.2.2.2:443", "http://example.com:8080"]
+        await storage.add_proxies_bulk(proxies, 10)
+        assert await storage.count_proxies("https") == 1
+        assert sorted(await storage.all_proxies()) == sorted(proxies)
+        assert [proxy for proxy, _ in await storage.random_proxies(1, "https")] == ["https://2.2.2.2:443"]
+        assert sorted(await storage.claim_stalest(3)) == sorted(proxies)
+
+        await storage.record_results({"http://1.1.1.1:80": 15}, ["https://2.2.2.2:443"])
+        assert await storage.get_proxies_page(0, 1) == [("http://1.1.1.1:80", 15.0)]
+        assert await storage.conn.hget(storage.fail_key, codec.CompactCodec().encode("https://2.2.2.2:443")) == "1"
+        # Redis中保存的是紧凑编码
+        assert len((await storage.conn.zrange(storage.proxy_key, 0, 0))[0]) == codec.IPV4_SIZE
+
+    asyncio.run(run())
+
+
+def test_migrate_between_encodings():
+    async def run():
+        storage = make_storage(codec.PLAIN)
+        await storage.add_proxies_bulk(["http://1.1.1.1:80", "https://2.2.2.2:443"], 10)
+        await storage.record_results({"http://1.1.1.1:80": 15}, ["https://2.2.2.2:443"])
+        await storage.add_candidates(["socks5://3.3.3.3:1080"])
+        (lease_id, _, _), = await storage.lease_proxies(1, "http", exclusive=True)
+        before = await storage.get_proxies_page(0, 10)
+
+        # 主集合2 + 协议索引2 + 检查时间2 + 待验证1 + 失败计数1 + 元数据2 + 独占记录1 + 租约1
+        assert await migrate(codec.COMPACT, storage) == 12
+        compact = RedisStorage(storage.conn, codec.COMPACT)
+        assert await compact.get_proxies_page(0, 10) == before
+        # 迁移前的租约仍然独占代理，结束租约时能找到代理
+        assert await compact.lease_proxies(1, "http", exclusive=False) == []
+        assert [proxy for _, proxy, _ in await compact.release_leases([lease_id])] == ["http://1.1.1.1:80"]
+        assert await compact.pop_candidates(1) == ["socks5://3.3.3.3:1080"]
+        assert await compact.conn.hget(compact.fail_key, compact.codec.encode("https://2.2.2.2:443")) == "1"
+        assert all(len(member) == codec.IPV4_SIZE for member in await compact.conn.zrange(compact.checked_key, 0, -1))
+
+        assert await migrate(codec.PLAIN, storage) == 9
+        assert await storage.conn.zrange(storage.proxy_key, 0, -1) == ["https://2.2.2.2:443", "http://1.1.1.1:80"]
+
+    asyncio.run(run())
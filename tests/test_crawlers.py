@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+爬虫并发获取测试
+
+替换真实的网络请求，检查按主机的并发限制、备用地址与响应缓存的处理
+"""
+
+import os
+import sys
+import asyncio
+import functools
+from collections import Counter
+
+import httpx
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.core.config import settings
+from app.crawlers import executor
+from app.crawlers.base_crawler import BaseCrawler
+from app.crawlers.cache import ResponseCache
+from app.crawlers.limiter import HostLimiter
+from app.crawlers.sources.free_proxy_list import FreeProxyListCrawler
+from app.storage.redis_client import RedisStorage
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+@pytest.fixture(autouse=True)
+def inline_parse(monkeypatch):
+    # 测试中的爬虫类需要构造参数，无法在工作进程中重建，默认直接在事件循环中解析
+    monkeypatch.setattr(settings, "CRAWL_PARSE_EXECUTOR", "none")
+
+
+@pytest.fixture(autouse=True)
+def cache(monkeypatch):
+    cache = ResponseCache(fakeredis.FakeAsyncRedis(decode_responses=True))
+    monkeypatch.setattr("app.crawlers.base_crawler.response_cache", cache)
+    return cache
+
+
+class FakeCrawler(BaseCrawler):
+    """每个URL的响应内容为一个代理地址，记录各主机的并发请求数"""
+    def __init__(self, urls, delay=0.05, empty=()):
+        super().__init__()
+        self.site_name = "fake"
+        self.urls = urls
+        self.delay = delay
+        self.empty = set(empty)
+        self.active = Counter()
+        self.peak = Counter()
+        self.saved = []
+
+    def make_client(self):
+        async def handler(request):
+            host = request.url.host
+            self.active[host] += 1
+            self.peak[host] = max(self.peak[host], self.active[host])
+            await asyncio.sleep(self.delay)
+            self.active[host] -= 1
+            if str(request.url) in self.empty:
+                return httpx.Response(200, text="")
+            return httpx.Response(200, text=f"http://{host}:{len(str(request.url))}")
+        return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    def parse(self, html):
+        return [html]
+
+    async def save_proxies(self, proxies):
+        self.saved.extend(proxies)
+        return len(proxies)
+
+    async def run(self):
+        async with self.make_client() as client:
+            return await self.crawl(client)
+
+
+def test_fetch_all_limits_each_host(monkeypatch):
+    monkeypatch.setattr("app.crawlers.base_crawler.host_limiter", HostLimiter(concurrency=2, interval=0))
+    urls = [f"http://a.test/{i}" for i in range(6)] + [f"http://b.test/{i}" for i in range(2)]
+    crawler = FakeCrawler(urls)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        assert await crawler.run() == 8
+        return loop.time() - started
+
+    elapsed = asyncio.run(run())
+    assert crawler.peak == {"a.test": 2, "b.test": 2}
+    # a.test的6个请求分3批，耗时取决于最慢的主机而不是所有请求之和
+    assert elapsed < 0.05 * 8 * 0.75
+
+
+def test_first_success_only_keeps_url_order(monkeypatch):
+    monkeypatch.setattr("app.crawlers.base_crawler.host_limiter", HostLimiter(concurrency=4, interval=0))
+    urls = ["http://a.test/x", "http://b.test/yy", "http://c.test/zzz"]
+    crawler = FakeCrawler(urls, empty={urls[0]})
+    crawler.first_success_only = True
+
+    assert asyncio.run(crawler.run()) == 1
+    assert crawler.saved == ["http://b.test:16"]
+
+
+def test_fetch_uses_shared_client_headers_and_methods(monkeypatch):
+    monkeypatch.setattr("app.crawlers.base_crawler.host_limiter", HostLimiter(concurrency=4, interval=0))
+    requests = []
+
+    def handler(request):
+        requests.append((request.method, request.headers["User-Agent"]))
+        # 只接受POST，模拟需要换用请求方法的站点
+        if request.method == "POST":
+            return httpx.Response(200, text="1.2.3.4:80")
+        return httpx.Response(405)
+
+    class PostCrawler(BaseCrawler):
+        def __init__(self):
+            super().__init__()
+            self.urls = ["http://a.test/list"]
+            self.headers = {"User-Agent": "test-agent"}
+            self.methods = ["GET", "POST"]
+            self.max_retries = 1  # 不重试，测试中不产生退避等待
+
+        def parse(self, html):
+            return [f"http://{html}"]
+
+        async def save_proxies(self, proxies):
+            return len(proxies)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await PostCrawler().crawl(client)
+
+    assert asyncio.run(run()) == 1
+    assert requests == [("GET", "test-agent"), ("POST", "test-agent")]
+
+
+def test_unchanged_responses_skip_parse_and_ingest(monkeypatch):
+    monkeypatch.setattr("app.crawlers.base_crawler.host_limiter", HostLimiter(concurrency=4, interval=0))
+    pages = {"http://a.test/etag": "1.1.1.1:80", "http://b.test/plain": "2.2.2.2:80"}
+    conditional = []
+
+    def handler(request):
+        url = str(request.url)
+        conditional.append(request.headers.get("If-None-Match"))
+        # a.test支持ETag，b.test不支持，只能依赖内容哈希
+        if url.endswith("etag"):
+            etag = f'"{len(pages[url])}"'
+            if request.headers.get("If-None-Match") == etag:
+                return httpx.Response(304)
+            return httpx.Response(200, text=pages[url], headers={"ETag": etag})
+        return httpx.Response(200, text=pages[url])
+
+    class ListCrawler(BaseCrawler):
+        def __init__(self):
+            super().__init__()
+            self.urls = list(pages)
+            self.parsed = []
+
+        def parse(self, html):
+            self.parsed.append(html)
+            return [f"http://{html}"]
+
+        async def save_proxies(self, proxies):
+            return len(proxies)
+
+    async def crawl():
+        crawler = ListCrawler()
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await crawler.crawl(client), crawler.parsed
+
+    assert asyncio.run(crawl()) == (2, ["1.1.1.1:80", "2.2.2.2:80"])
+    # 内容未变：a.test返回304，b.test内容哈希一致，均不解析也不入库
+    assert asyncio.run(crawl()) == (0, [])
+    assert '"10"' in conditional
+
+    pages["http://b.test/plain"] = "3.3.3.3:8080"
+    assert asyncio.run(crawl()) == (1, ["3.3.3.3:8080"])
+
+
+def test_cache_recorded_only_after_ingest(cache, monkeypatch):
+    monkeypatch.setattr("app.crawlers.base_crawler.host_limiter", HostLimiter(concurrency=4, interval=0))
+    storage = RedisStorage(fakeredis.FakeAsyncRedis(decode_responses=True))
+    monkeypatch.setattr("app.crawlers.base_crawler.redis_storage", storage)
+    enqueue = storage.enqueue_candidates
+
+    class IngestCrawler(FakeCrawler):
+        async def save_proxies(self, proxies):
+            return await BaseCrawler.save_proxies(self, proxies)
+
+    crawler = IngestCrawler(["http://a.test/x", "http://b.test/y"], delay=0)
+
+    async def fail(*args, **kwargs):
+        raise ConnectionError("Redis连接断开")
+
+    async def run():
+        # 入库失败：不记录缓存
+        monkeypatch.setattr(storage, "enqueue_candidates", fail)
+        with pytest.raises(ConnectionError):
+            await crawler.run()
+        assert not await cache.get("http://a.test/x")
+
+        # 待验证集合已满，只入队一个：不记录缓存，下次仍重新入库
+        monkeypatch.setattr(storage, "enqueue_candidates", functools.partial(enqueue, max_size=1))
+        assert await crawler.run() == 1 and crawler.truncated
+        assert not await cache.get("http://a.test/x")
+
+        monkeypatch.setattr(storage, "enqueue_candidates", enqueue)
+        assert await crawler.run() == 1 and not crawler.truncated
+        assert await storage.count_candidates() == 2
+        # 全部入队后记录缓存，内容未变时跳过
+        assert await crawler.run() == 0
+        assert crawler.unchanged == {"http://a.test/x", "http://b.test/y"}
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("kind", [executor.PROCESS, executor.THREAD])
+def test_parse_runs_in_executor(kind):
+    rows = "".join(
+        f"<tr><td>10.0.0.{i}</td><td>80{i}</td><td></td><td></td><td></td><td></td><td>{'yes' if i % 2 else 'no'}</td></tr>"
+        for i in range(3)
+    )
+    html = f'<table id="proxylisttable"><tbody>{rows}</tbody></table>'
+
+    async def run():
+        try:
+            return await executor.run_parse(FreeProxyListCrawler(), html, "https://free-proxy-list.net/", kind)
+        finally:
+            executor.shutdown_parse_executors()
+
+    assert asyncio.run(run()) == ["http://10.0.0.0:800", "https://10.0.0.1:801", "http://10.0.0.2:802"]
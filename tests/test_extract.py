@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+代理提取工具测试
+
+检查正则提取的合法性校验、lxml与BeautifulSoup表格解析结果一致，以及快代理页面的解析
+"""
+
+import os
+import sys
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.crawlers import extract
+from app.crawlers.sources.kuaidaili import KuaiDaiLiCrawler
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+TABLE_HTML = """
+<table id="list" class="bg proxies">
+  <thead><tr><th>IP</th><th>Port</th></tr></thead>
+  <tbody>
+    <tr><td> 1.2.3.4 </td><td>8080</td><td>HTTPS</td></tr>
+    <tr><td>5.6.7.8</td><td>3128</td><td><table><tr><td>nested</td></tr></table></td></tr>
+  </tbody>
+</table>
+<table class="other"><tr><td>9.9.9.9</td><td>80</td></tr></table>
+"""
+
+
+def test_extract_ip_ports_rejects_invalid_addresses():
+    text = "1.2.3.4:8080\n999.1.1.1:80\n5.6.7.8:70000\n10.0.0.1:3128x\n10.0.0.2:123456"
+    assert extract.extract_ip_ports(text) == [("1.2.3.4", "8080"), ("10.0.0.1", "3128")]
+
+
+def test_extract_json_ip_ports_without_commas():
+    text = '[{"ip": "1.2.3.4", "last_check_time": "x", "port": "8080"} {"ip": "5.6.7.8", "port": 3128}]'
+    assert extract.extract_json_ip_ports(text) == [("1.2.3.4", "8080"), ("5.6.7.8", "3128")]
+
+
+@pytest.mark.skipif(extract.lxml is None, reason="未安装lxml")
+@pytest.mark.parametrize("selector", [{}, {"table_id": "list"}, {"table_class": "bg"}, {"table_class": "missing"}])
+def test_lxml_and_soup_tables_match(selector):
+    expected = extract._soup_tables(TABLE_HTML, selector.get("table_id"), selector.get("table_class"))
+    assert extract._lxml_tables(TABLE_HTML, selector.get("table_id"), selector.get("table_class")) == expected
+
+
+def test_table_rows_and_scan_row():
+    rows = extract.table_rows(TABLE_HTML, table_class="bg")
+    assert rows[0] == []
+    assert [extract.scan_row(row) for row in rows] == [None, ("1.2.3.4", "8080", "https"), ("5.6.7.8", "3128", "http")]
+
+
+def test_kuaidaili_fixture():
+    with open(os.path.join(ROOT, "kuaidaili.html"), encoding="utf-8") as f:
+        proxies = KuaiDaiLiCrawler().parse(f.read())
+    assert len(proxies) == 12
+    assert all(proxy.startswith("http://") for proxy in proxies)
@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+转发网关测试
+
+在本机启动目标服务、HTTP/SOCKS5上游代理和无人监听的端口，检查CONNECT隧道与普通HTTP请求的转发、
+上游连接失败时的重试、目标不可达时不重试，以及上游使用结果计入代理评分
+"""
+
+import os
+import sys
+import socket
+import asyncio
+import itertools
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from app.api.snapshot import PoolSnapshot
+from app.gateway.server import ProxyGateway
+from app.gateway.upstream import UpstreamSelector
+from app.storage.redis_client import RedisStorage
+from app.validator.feedback import UsageRecorder
+from app.validator.scoring import ScoringEngine
+
+
+async def serve_target(reader, writer):
+    """目标服务：回显请求行"""
+    head = await reader.readuntil(b"\r\n\r\n")
+    line = head.split(b"\r\n", 1)[0]
+    writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\nConnection: close\r\n\r\n%s" % (len(line), line))
+    await writer.drain()
+    writer.close()
+
+
+async def relay(reader, writer, upstream_reader, upstream_writer):
+    async def pipe(src, dst):
+        while data := await src.read(65536):
+            dst.write(data)
+            await dst.drain()
+        dst.close()
+    await asyncio.gather(pipe(reader, upstream_writer), pipe(upstream_reader, writer))
+
+
+async def serve_http_proxy(reader, writer):
+    """HTTP上游代理：支持CONNECT和绝对URI请求"""
+    head = await reader.readuntil(b"\r\n\r\n")
+    method, target, _ = head.split(b"\r\n", 1)[0].decode().split(" ", 2)
+    if method == "CONNECT":
+        host, port = target.rsplit(":", 1)
+        upstream = await asyncio.open_connection(host, int(port))
+        writer.write(b"HTTP/1.1 200 Connection established\r\n\r\n")
+    else:
+        host_port = target.split("/")[2]
+        host, port = host_port.rsplit(":", 1)
+        upstream = await asyncio.open_connection(host, int(port))
+        path = "/" + target.split("/", 3)[3]
+        upstream[1].write(head.replace(target.encode(), path.encode(), 1))
+    await relay(reader, writer, *upstream)
+
+
+async def serve_socks5_proxy(reader, writer):
+    """SOCKS5上游代理：无认证，只支持IPv4地址"""
+    await reader.readexactly(3)
+    writer.write(b"\x05\x00")
+    request = await reader.readexactly(10)
+    host = socket.inet_ntoa(request[4:8])
+    port = int.from_bytes(request[8:10], "big")
+    upstream = await asyncio.open_connection(host, port)
+    writer.write(b"\x05\x00\x00\x01" + bytes(6))
+    await relay(reader, writer, *upstream)
+
+
+async def serve_unreachable_target(reader, writer):
+    """HTTP上游代理：代理本身正常，但目标主机不可达"""
+    await reader.readuntil(b"\r\n\r\n")
+    writer.write(b"HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\n\r\n")
+    await writer.drain()
+    writer.close()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def start(handler):
+    server = await asyncio.start_server(handler, "127.0.0.1", 0)
+    return server, server.sockets[0].getsockname()[1]
+
+
+async def request(gateway_port, head):
+    reader, writer = await asyncio.open_connection("127.0.0.1", gateway_port)
+    writer.write(head)
+    response = await reader.read()
+    writer.close()
+    return response
+
+
+def test_gateway_retries_and_records_upstream_results():
+    async def run():
+        storage = RedisStorage(fakeredis.FakeAsyncRedis(decode_responses=True))
+        servers = []
+        for handler in (serve_target, serve_http_proxy, serve_socks5_proxy):
+            servers.append(await start(handler))
+        (_, target_port), (_, http_port), (_, socks_port) = servers
+        dead = f"http://127.0.0.1:{free_port()}"
+        live = {f"http://127.0.0.1:{http_port}", f"socks5://127.0.0.1:{socks_port}"}
+        await storage.add_proxies_bulk([dead, *live], 10)
+        await storage.update_scores({dead: 19})
+
+        engine = ScoringEngine(latency_alpha=0.5, success_alpha=0.25, timeout_ms=1000)
+        gateway = ProxyGateway(
+            selector=UpstreamSelector(storage, PoolSnapshot(storage, max_age=0), top_n=3),
+            recorder=UsageRecorder(storage, engine, flush_interval=3600), retries=2, connect_timeout=1
+        )
+        # 失效代理总是首选，两个可用代理每两个请求（一次隧道、一次普通请求）轮换作为重试
+        http_live = f"http://127.0.0.1:{http_port}"
+        orders = itertools.cycle([[dead, *sorted(live)]] * 2 + [[dead, *sorted(live, reverse=True)]] * 2)
+
+        async def choose(count):
+            return next(orders)[:count]
+        gateway.selector.choose = choose
+        port = await gateway.start("127.0.0.1", 0)
+        try:
+            target = f"127.0.0.1:{target_port}"
+            for _ in range(3):
+                response = await request(port, f"CONNECT {target} HTTP/1.1\r\nHost: {target}\r\n\r\n"
+                                               f"GET /tunnel HTTP/1.1\r\nHost: {target}\r\n\r\n".encode())
+                assert response.startswith(b"HTTP/1.1 200 Connection established") and response.endswith(b"GET /tunnel HTTP/1.1")
+                response = await request(port, f"GET http://{target}/plain?x=1 HTTP/1.1\r\nHost: {target}\r\n"
+                                               f"Proxy-Connection: keep-alive\r\n\r\n".encode())
+                assert response.endswith(b"GET /plain?x=1 HTTP/1.1")
+            assert gateway.stats["bad_gateway"] == 0
+
+            results = gateway.recorder._results
+            assert {proxy for proxy, _, _ in results} == {dead, *live}
+            assert all(not ok for proxy, ok, _ in results if proxy == dead)
+            assert all(ok for proxy, ok, _ in results if proxy in live)
+            # 经HTTP上游的普通请求只建立了TCP连接，不记录响应时间；其余经握手到达目标，记录响应时间
+            assert [latency is None for proxy, _, latency in results if proxy in live] == [False, True, False, False, False, True]
+            assert all(latency >= 0 for proxy, _, latency in results if proxy in live and latency is not None)
+            # 失效代理连续失败6次，一次写入即被移除；可用代理按EWMA加分
+            assert await gateway.recorder.flush() == 1
+            scores = dict(await storage.get_proxies_page(0, 3))
+            assert dead not in scores and all(scores[proxy] > 10 for proxy in live)
+            assert (await storage.get_counters())["relayed"] == len(live) + 6
+        finally:
+            await gateway.stop()
+            for server, _ in servers:
+                server.close()
+
+    asyncio.run(run())
+
+
+def test_gateway_returns_bad_gateway_when_all_upstreams_fail():
+    async def run():
+        storage = RedisStorage(fakeredis.FakeAsyncRedis(decode_responses=True))
+        await storage.add_proxies_bulk([f"http://127.0.0.1:{free_port()}"], 10)
+        gateway = ProxyGateway(
+            selector=UpstreamSelector(storage, PoolSnapshot(storage, max_age=0)),
+            recorder=UsageRecorder(storage, flush_interval=3600), connect_timeout=1
+        )
+        port = await gateway.start("127.0.0.1", 0)
+        try:
+            assert (await request(port, b"CONNECT 127.0.0.1:1 HTTP/1.1\r\n\r\n")).startswith(b"HTTP/1.1 502")
+            assert (await request(port, b"GET /relative HTTP/1.1\r\n\r\n")).startswith(b"HTTP/1.1 400")
+        finally:
+            await gateway.stop()
+
+    asyncio.run(run())
+
+
+def test_target_errors_are_not_charged_to_upstreams():
+    async def run():
+        storage = RedisStorage(fakeredis.FakeAsyncRedis(decode_responses=True))
+        server, port = await start(serve_unreachable_target)
+        gateway = ProxyGateway(
+            selector=UpstreamSelector(storage, PoolSnapshot(storage, max_age=0)),
+            recorder=UsageRecorder(storage, flush_interval=3600), connect_timeout=1
+        )
+
+        async def choose(count):
+            return [f"http://127.0.0.1:{port}", "http://127.0.0.1:1"][:count]
+        gateway.selector.choose = choose
+        gateway_port = await gateway.start("127.0.0.1", 0)
+        try:
+            assert (await request(gateway_port, b"CONNECT 10.255.255.1:443 HTTP/1.1\r\n\r\n")).startswith(b"HTTP/1.1 502")
+            # 目标不可达：不换用其他上游重试，也不记录为上游代理失败
+            assert gateway.stats["target_errors"] == 1 and gateway.stats["upstream_failures"] == 0
+            assert gateway.recorder._results == []
+        finally:
+            await gateway.stop()
+            server.close()
+
+    asyncio.run(run())
+
+
+def test_selector_prefers_high_scores():
+    async def run():
+        storage = RedisStorage(fakeredis.FakeAsyncRedis(decode_responses=True))
+        await storage.add_proxies_bulk(["http://1.1.1.1:80", "http://2.2.2.2:80", "http://3.3.3.3:80"], 10)
+        await storage.update_scores({"http://1.1.1.1:80": 20, "http://2.2.2.2:80": 2, "http://3.3.3.3:80": 1})
+        selector = UpstreamSelector(storage, PoolSnapshot(storage, max_age=60), top_n=2)
+        await selector.snapshot.reload()
+        picks = [tuple(await selector.choose(2)) for _ in range(500)]
+        # 只在分数最高的2个代理中选择，不重复
+        assert set(picks) <= {("http://1.1.1.1:80", "http://2.2.2.2:80"), ("http://2.2.2.2:80", "http://1.1.1.1:80")}
+        assert sum(pick[0] == "http://1.1.1.1:80" for pick in picks) > 400
+
+    asyncio.run(run())
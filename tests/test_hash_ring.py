@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+会话粘滞路由测试
+
+检查同一会话总是得到同一个代理、代理增删时只有少量会话改变代理，以及按协议分环
+"""
+
+import os
+import sys
+import asyncio
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from app.api.hash_ring import HashRing, SessionRouter
+from app.api.snapshot import PoolSnapshot
+from app.storage.redis_client import RedisStorage
+
+PROXIES = [f"http://10.0.{i // 256}.{i % 256}:8080" for i in range(1000)]
+SESSIONS = [f"session-{i}" for i in range(10000)]
+
+
+def owners(ring):
+    return {session: ring.lookup(session)[0] for session in SESSIONS}
+
+
+def successors(ring):
+    return [ring.lookup(session, 3) for session in SESSIONS]
+
+
+def test_ring_remaps_only_sessions_of_changed_proxies():
+    ring = HashRing(vnodes=32)
+    assert ring.lookup("session-0") == []
+    assert ring.sync(PROXIES) == (1000, 0)
+    before = owners(ring)
+    assert owners(ring) == before
+    # 会话大致均匀地分布到各个代理
+    assert len(set(before.values())) > 950
+
+    # 移除10个代理：只有原本落在它们上的会话改变代理
+    evicted = set(PROXIES[:10])
+    assert ring.sync(PROXIES[10:]) == (0, 10)
+    after = owners(ring)
+    moved = {session for session in SESSIONS if before[session] != after[session]}
+    assert moved == {session for session in SESSIONS if before[session] in evicted}
+    assert len(moved) < len(SESSIONS) * 0.02
+
+    # 加入10个代理：改变代理的会话都改到新代理上
+    added = [f"socks5://10.1.0.{i}:1080" for i in range(10)]
+    assert ring.sync(PROXIES[10:] + added) == (10, 0)
+    rejoined = owners(ring)
+    moved = {session for session in SESSIONS if after[session] != rejoined[session]}
+    assert {rejoined[session] for session in moved} <= set(added)
+    assert 0 < len(moved) < len(SESSIONS) * 0.02
+
+    # 增量同步的结果与重新构建的环一致
+    rebuilt = HashRing(vnodes=32)
+    rebuilt.sync(PROXIES[10:] + added)
+    assert successors(rebuilt) == successors(ring) and len(rebuilt) == 1000
+
+    backups = ring.lookup("session-0", 3)
+    assert len(set(backups)) == 3 and backups[0] == rejoined["session-0"]
+
+
+def test_router_routes_sessions_per_protocol():
+    async def run():
+        storage = RedisStorage(fakeredis.FakeAsyncRedis(decode_responses=True))
+        proxies = {f"http://1.1.1.{i}:80": 10 + i for i in range(20)}
+        proxies.update({f"socks5://2.2.2.{i}:1080": 10 + i for i in range(20)})
+        await storage.add_proxies_bulk(proxies, 10)
+        await storage.update_scores(proxies)
+        # 快照未运行后台任务时按需加载
+        router = SessionRouter(PoolSnapshot(storage, max_age=60, min_interval=0), vnodes=16)
+
+        routed = await router.route("user-1", 2, "socks5")
+        assert len(routed) == 2 and all(proxy.startswith("socks5://") for proxy, _ in routed)
+        assert all(proxies[proxy] == score for proxy, score in routed)
+        assert await router.route("user-1", 2, "socks5") == routed
+        assert (await router.route("user-1"))[0][0] in proxies
+        assert await router.route("user-1", 1, "https") == []
+
+        # 会话的代理被移除后改用环上的下一个代理（即原来的备用代理）
+        await storage.remove_proxy(routed[0][0])
+        await router.snapshot.reload()
+        assert await router.route("user-1", 1, "socks5") == routed[1:]
+
+    asyncio.run(run())
+
+
+def test_ring_sync_does_not_block_event_loop():
+    async def run():
+        ring = HashRing(vnodes=32)
+        loop = asyncio.get_running_loop()
+        stalls = []
+
+        async def ticker():
+            last = loop.time()
+            while True:
+                await asyncio.sleep(0)
+                stalls.append(loop.time() - last)
+                last = loop.time()
+
+        task = asyncio.create_task(ticker())
+        await asyncio.sleep(0)
+        # 构建1万个代理的环：分批执行，期间事件循环持续处理其他任务
+        await ring.sync_async([f"http://10.1.{i // 256}.{i % 256}:80" for i in range(10000)])
+        task.cancel()
+        assert len(ring) == 10000 and len(stalls) > 10 and max(stalls) < 0.1
+
+        # 移除1个、加入1个代理：只替换有节点变化的段，其余段原样复用
+        members = [f"http://10.1.{i // 256}.{i % 256}:80" for i in range(1, 10000)] + ["http://10.2.0.1:80"]
+        before = ring._state[0]
+        started = loop.time()
+        assert await ring.sync_async(members) == (1, 1)
+        assert loop.time() - started < 0.05
+        assert sum(old is not new for old, new in zip(before, ring._state[0])) <= 64
+        fresh = HashRing(vnodes=32)
+        fresh.sync(members)
+        assert successors(fresh) == successors(ring)
+
+    asyncio.run(run())
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+本地判定服务测试
+"""
+
+import os
+import sys
+import asyncio
+
+from aiohttp.test_utils import TestClient, TestServer
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.core.config import settings
+from app.validator.judge import create_app, judge_payload, anonymity, TRANSPARENT, ANONYMOUS, ELITE
+from app.validator.proxy_validator import ProxyValidator
+
+
+def test_judge_echoes_origin_and_proxy_headers():
+    async def run():
+        async with TestClient(TestServer(create_app())) as client:
+            resp = await client.get("/ip", headers={"Via": "1.1 proxy", "X-Test": "1"})
+            assert resp.status == 200
+            data = await resp.json()
+        assert data["origin"] == "127.0.0.1"
+        assert data["headers"]["X-Test"] == "1"
+        assert data["proxy_headers"] == ["Via"]
+
+    asyncio.run(run())
+
+
+def test_validator_uses_configured_judge(monkeypatch):
+    monkeypatch.setattr(settings, "JUDGE_URLS", ["http://judge.local:8001/ip"])
+    validator = ProxyValidator()
+    assert all(urls == ["http://judge.local:8001/ip"] for urls in validator.test_urls.values())
+
+
+def test_anonymity_levels():
+    assert anonymity(judge_payload("1.1.1.1", {"X-Forwarded-For": "9.9.9.9"})) == TRANSPARENT
+    assert anonymity(judge_payload("1.1.1.1", {"Via": "1.1 proxy"})) == ANONYMOUS
+    assert anonymity(judge_payload("1.1.1.1", {"User-Agent": "x"})) == ELITE
+    assert anonymity({"origin": "1.1.1.1"}) is None
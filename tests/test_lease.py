@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+代理租用与使用反馈测试
+
+检查独占租用、租约结束与到期，反馈立即计入代理评分，以及使用结果不会让已移除的代理重新加入代理池
+"""
+
+import os
+import sys
+import asyncio
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from app.core.config import settings
+from app.storage.redis_client import RedisStorage
+from app.validator.feedback import apply_feedback, record_usage
+from app.validator.scoring import ScoringEngine
+
+PROXIES = ["http://1.1.1.1:80", "http://2.2.2.2:80", "https://3.3.3.3:443"]
+
+
+async def make_storage():
+    storage = RedisStorage(fakeredis.FakeAsyncRedis(decode_responses=True))
+    await storage.add_proxies_bulk(PROXIES, 10)
+    return storage
+
+
+def test_exclusive_leases_spread_across_pool():
+    async def run():
+        storage = await make_storage()
+        first = await storage.lease_proxies(2, "http", exclusive=True)
+        assert sorted(proxy for _, proxy, _ in first) == PROXIES[:2]
+        assert await storage.lease_proxies(1, "http", exclusive=True) == []
+        # 独占中的代理也不会租给非独占的请求
+        assert await storage.lease_proxies(2, "http", exclusive=False) == []
+
+        released = await storage.release_leases([first[0][0], first[0][0], "unknown"])
+        assert [(lease_id, proxy) for lease_id, proxy, _ in released] == [first[0][:2]]
+        assert [proxy for _, proxy, _ in await storage.lease_proxies(2, "http", exclusive=True)] == [first[0][1]]
+        assert (await storage.get_stats())["leases"] == 2
+
+    asyncio.run(run())
+
+
+def test_releasing_other_leases_keeps_exclusive_lock():
+    async def run():
+        storage = await make_storage()
+        # B先非独占租用，A随后独占租用同一个代理
+        shared = await storage.lease_proxies(1, "https", exclusive=False)
+        locked = await storage.lease_proxies(1, "https", exclusive=True)
+        assert [proxy for _, proxy, _ in shared] == [proxy for _, proxy, _ in locked] == [PROXIES[2]]
+        assert await storage.lease_proxies(1, "https", exclusive=False) == []
+
+        # B结束租约（反馈）不会解除A的独占
+        assert len(await storage.release_leases([shared[0][0]])) == 1
+        assert await storage.lease_proxies(1, "https", exclusive=True) == []
+        assert await storage.lease_proxies(1, "https", exclusive=False) == []
+
+        # A的租约到期后，A迟到的反馈不会解除C的独占
+        await storage.conn.zadd(storage.lease_expiry_key, {locked[0][0]: 1})
+        relocked = await storage.lease_proxies(1, "https", exclusive=True)
+        assert [proxy for _, proxy, _ in relocked] == [PROXIES[2]]
+        assert await storage.release_leases([locked[0][0]]) == []
+        assert await storage.lease_proxies(1, "https", exclusive=False) == []
+
+        assert len(await storage.release_leases([relocked[0][0]])) == 1
+        assert len(await storage.lease_proxies(1, "https", exclusive=False)) == 1
+
+    asyncio.run(run())
+
+
+def test_expired_leases_are_released():
+    async def run():
+        storage = await make_storage()
+        leases = await storage.lease_proxies(3, ttl=-1, exclusive=True)
+        assert len(leases) == 3
+        assert await storage.release_leases([lease_id for lease_id, _, _ in leases]) == []
+        assert len(await storage.lease_proxies(3, exclusive=True)) == 3
+        assert await storage.conn.hlen(storage.lease_key) == 3
+
+    asyncio.run(run())
+
+
+def test_feedback_adjusts_scores_immediately(monkeypatch):
+    async def run():
+        storage = await make_storage()
+        monkeypatch.setattr(settings, "MAX_FAIL_COUNT", 2)
+        engine = ScoringEngine(latency_alpha=0.5, success_alpha=0.25, timeout_ms=1000)
+        leases = dict((proxy, lease_id) for lease_id, proxy, _ in await storage.lease_proxies(3))
+        result = await apply_feedback([
+            (leases["http://1.1.1.1:80"], True, 200.0),
+            (leases["http://2.2.2.2:80"], False, None),
+            (leases["http://2.2.2.2:80"], True, 100.0),
+            ("expired", True, 100.0),
+        ], storage, engine)
+        assert result == {"accepted": 2, "ignored": 2, "evicted": 0}
+        assert dict(await storage.get_proxies_page(0, 3)) == {
+            "http://1.1.1.1:80": pytest.approx(18), "https://3.3.3.3:443": 10, "http://2.2.2.2:80": pytest.approx(7.5)
+        }
+        meta = (await storage.get_meta(["http://1.1.1.1:80"]))[0]
+        assert (meta["lat"], meta["rt"], meta["ok"]) == (200, 200, 1)
+
+        # 连续失败达到上限的代理立即移除
+        lease_id = next(lease for lease, proxy, _ in await storage.lease_proxies(3) if proxy == "http://2.2.2.2:80")
+        assert (await apply_feedback([(lease_id, False, None)], storage, engine))["evicted"] == 1
+        counters = await storage.get_counters()
+        assert (counters["reported"], counters["reported_ok"], counters.get("validated", 0)) == (3, 1, 0)
+
+    asyncio.run(run())
+
+
+def test_usage_results_do_not_readmit_evicted_proxies():
+    async def run():
+        storage = await make_storage()
+        await storage.remove_proxy("http://1.1.1.1:80")
+        await record_usage([("http://1.1.1.1:80", True, 100.0), ("http://2.2.2.2:80", True, 100.0)], storage)
+        assert not await storage.exists("http://1.1.1.1:80")
+        assert await storage.count_proxies("http") == 1
+        assert await storage.get_meta(["http://1.1.1.1:80"]) == [{}]
+        assert not await storage.conn.zscore(storage.checked_key, "http://1.1.1.1:80")
+        # 验证器的结果仍可以加入新代理
+        await storage.record_results({"http://1.1.1.1:80": 12}, [])
+        assert await storage.exists("http://1.1.1.1:80")
+
+    asyncio.run(run())
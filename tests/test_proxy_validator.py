@@ -0,0 +1,302 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+ProxyValidator 单元测试
+
+使用fakeredis模拟Redis，并替换真实的网络验证
+"""
+
+import os
+import sys
+import asyncio
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from app.core.config import settings
+from app.storage.redis_client import RedisStorage
+from app.validator import proxy_validator
+from app.validator import scheduler
+from app.validator.concurrency import AdaptiveLimiter, SlotLimiter, classify_error, SUCCESS, ERROR, EXHAUSTED
+from app.validator.proxy_validator import ProxyValidator
+from app.validator.scheduler import RevalidationScheduler, CandidateValidator
+
+
+@pytest.fixture
+def storage(monkeypatch):
+    storage = RedisStorage(fakeredis.FakeAsyncRedis(decode_responses=True))
+    monkeypatch.setattr(proxy_validator, "redis_storage", storage)
+    monkeypatch.setattr(scheduler, "redis_storage", storage)
+    return storage
+
+
+def make_validator(monkeypatch, alive, reachable=None):
+    """创建验证器，alive中的代理视为有效（响应时间100ms）
+
+    reachable为通过TCP预筛的代理，默认全部通过
+    """
+    validator = ProxyValidator()
+    verified = []
+
+    async def fake_connect(proxy_url):
+        await asyncio.sleep(0)
+        return reachable is None or proxy_url in reachable
+
+    async def fake_verify(proxy_url, session):
+        await asyncio.sleep(0)
+        verified.append(proxy_url)
+        if proxy_url in alive:
+            return proxy_url, True, 100.0
+        return proxy_url, False, 0
+
+    monkeypatch.setattr(validator, "_connect_proxy", fake_connect)
+    monkeypatch.setattr(validator, "_verify_proxy", fake_verify)
+    validator.verified = verified
+    return validator
+
+
+def test_validate_proxies_flushes_in_batches(storage, monkeypatch):
+    monkeypatch.setattr(settings, "VALIDATE_FLUSH_SIZE", 2)
+    proxies = [f"http://1.1.1.{i}:80" for i in range(5)]
+    validator = make_validator(monkeypatch, alive=set(proxies[:3]))
+
+    flushed = []
+    record_results = storage.record_results
+
+    async def spy(scores, failures, details=None, failure_scores=None):
+        flushed.append(len(scores) + len(failures))
+        return await record_results(scores, failures, details, failure_scores)
+
+    monkeypatch.setattr(storage, "record_results", spy)
+
+    async def run():
+        await storage.add_proxies_bulk(proxies, 10)
+        assert await validator.check_all_proxies() == 3
+        # 失败的代理被扣分但仍保留
+        assert await storage.count_proxies() == 5
+
+    asyncio.run(run())
+    assert sum(flushed) == 5
+    assert max(flushed) <= 2
+    assert validator.score(100.0) == pytest.approx(10 + 10 * (1 - 100 / (settings.PROXY_TIMEOUT * 1000)))
+
+
+def test_validate_proxies_accepts_plain_iterables(storage, monkeypatch):
+    validator = make_validator(monkeypatch, alive={"https://2.2.2.2:443"})
+
+    async def run():
+        valid = await validator.validate_proxies(["https://2.2.2.2:443", "http://3.3.3.3:80"])
+        assert valid == 1
+        assert await storage.count_proxies("https") == 1
+
+    asyncio.run(run())
+
+
+def test_http_proxy_only_usable_as_https_is_demoted(storage, monkeypatch):
+    validator = ProxyValidator()
+
+    async def fake_verify(proxy_url, session):
+        return "https://4.4.4.4:8080", True, 100.0
+
+    monkeypatch.setattr(validator, "_verify_proxy", fake_verify)
+
+    async def run():
+        await storage.add_proxy("http://4.4.4.4:8080", 10)
+        await validator.validate_proxies(["http://4.4.4.4:8080"])
+        assert await storage.conn.hget(storage.fail_key, "http://4.4.4.4:8080") == "1"
+        assert await storage.count_proxies("https") == 1
+
+    asyncio.run(run())
+
+
+def test_source_error_cancels_stages_and_flushes_results(storage, monkeypatch):
+    validator = make_validator(monkeypatch, alive={"http://1.1.1.1:80"})
+
+    async def source():
+        yield "http://1.1.1.1:80"
+        # 等第一个代理验证完成后再模拟Redis断开
+        while not validator.verified:
+            await asyncio.sleep(0)
+        raise ConnectionError("Redis连接断开")
+
+    async def run():
+        await storage.add_proxy("http://1.1.1.1:80", 10)
+        with pytest.raises(ConnectionError):
+            await validator.validate_proxies(source())
+        # 各阶段的工作协程都已结束，已得到的结果已写入
+        assert asyncio.all_tasks() == {asyncio.current_task()}
+        assert (await storage.get_counters())["validated"] == 1
+
+    asyncio.run(run())
+
+
+def test_scheduler_cycle_covers_pool_stalest_first(storage, monkeypatch):
+    proxies = [f"http://1.1.1.{i}:80" for i in range(6)]
+    validator = make_validator(monkeypatch, alive=set(proxies))
+    checked = []
+    verify = validator._verify_proxy
+
+    async def spy(proxy_url, session):
+        checked.append(proxy_url)
+        return await verify(proxy_url, session)
+
+    monkeypatch.setattr(validator, "_verify_proxy", spy)
+
+    async def run():
+        await storage.add_proxies_bulk(proxies[:3], 10)
+        await storage.record_results(dict.fromkeys(proxies[:3], 15), [])
+        await storage.add_proxies_bulk(proxies[3:], 10)
+
+        cycle = RevalidationScheduler(validator, rate=1000, batch_size=2)
+        assert await cycle.run_cycle(6) == 6
+        last_cycle = (await storage.get_counters())["last_cycle"]
+        assert (last_cycle["validated"], last_cycle["passed"], last_cycle["added"]) == (6, 6, 0)
+        assert validator.stage_stats["revalidate"]["http"]["checked"] == 6
+
+    asyncio.run(run())
+    # 从未检查过的代理最先被验证
+    assert set(checked[:3]) == set(proxies[3:])
+    assert sorted(checked) == sorted(proxies)
+
+
+def test_adaptive_limiter_aimd():
+    limiter = AdaptiveLimiter(initial=10, min_limit=2, max_limit=20, increase_step=5, cooldown=0)
+    for _ in range(10):
+        limiter.record(SUCCESS)
+    assert limiter.limit == 15
+
+    # 错误率超过退避阈值时乘性减少
+    for _ in range(15):
+        limiter.record(ERROR)
+    assert limiter.limit == 10
+
+    limiter.record(EXHAUSTED)
+    assert limiter.limit == 7
+    assert limiter.limit <= limiter.max_limit
+
+
+def test_adaptive_limiter_bounds_in_flight():
+    async def run():
+        limiter = AdaptiveLimiter(initial=2, min_limit=1, max_limit=4, cooldown=0)
+        peak = 0
+
+        async def task():
+            nonlocal peak
+            async with limiter:
+                peak = max(peak, limiter.in_flight)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(task() for _ in range(10)))
+        assert peak == 2
+        assert limiter.in_flight == 0
+
+    asyncio.run(run())
+
+
+def test_classify_error_detects_fd_exhaustion():
+    import errno
+    assert classify_error(OSError(errno.EMFILE, "Too many open files")) == EXHAUSTED
+    assert classify_error(ConnectionRefusedError(errno.ECONNREFUSED, "refused")) == ERROR
+
+
+def test_prefilter_skips_http_for_unreachable_proxies(storage, monkeypatch):
+    proxies = [f"http://3.3.3.{i}:80" for i in range(4)]
+    validator = make_validator(monkeypatch, alive={proxies[0]}, reachable=set(proxies[:2]))
+
+    async def run():
+        await storage.add_proxies_bulk(proxies, 10)
+        assert await validator.validate_proxies(proxies) == 1
+
+    asyncio.run(run())
+    # 只有通过TCP预筛的代理才发起HTTP验证
+    assert sorted(validator.verified) == sorted(proxies[:2])
+    assert validator.stage_stats["validate"]["connect"]["checked"] == 4
+    assert validator.stage_stats["validate"]["connect"]["pass_rate"] == 0.5
+    assert validator.stage_stats["validate"]["http"]["passed"] == 1
+
+
+def test_connect_proxy_checks_tcp_port():
+    async def run():
+        server = await asyncio.start_server(lambda r, w: w.close(), "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        validator = ProxyValidator()
+        try:
+            assert await validator._connect_proxy(f"http://127.0.0.1:{port}")
+        finally:
+            server.close()
+            await server.wait_closed()
+        # 服务关闭后端口无人监听，连接被拒绝
+        assert not await validator._connect_proxy(f"http://127.0.0.1:{port}")
+
+    asyncio.run(run())
+
+
+def test_connect_stage_shares_fd_budget_and_backs_off_when_exhausted(monkeypatch):
+    import errno
+    validator = ProxyValidator()
+    validator.fd_budget = SlotLimiter(2)
+    validator.connect_timeout = 0.5
+    monkeypatch.setattr(proxy_validator, "EXHAUSTED_RETRY_DELAY", 0.01)
+    peak = 0
+    exhausted = 0
+
+    class Writer:
+        def close(self):
+            pass
+
+        async def wait_closed(self):
+            pass
+
+    async def fake_open_connection(host, port):
+        nonlocal peak, exhausted
+        peak = max(peak, validator.fd_budget.in_flight)
+        await asyncio.sleep(0.01)
+        if host == "9.9.9.9" or (host == "8.8.8.8" and exhausted < 3):
+            exhausted += 1
+            raise OSError(errno.EMFILE, "Too many open files")
+        return None, Writer()
+
+    monkeypatch.setattr(asyncio, "open_connection", fake_open_connection)
+
+    async def run():
+        # 两轮验证同时运行，连接数合计不超过预算
+        first = [validator._connect_proxy(f"http://1.1.1.{i}:80") for i in range(5)]
+        second = [validator._connect_proxy(f"http://2.2.2.{i}:80") for i in range(5)]
+        assert all(await asyncio.gather(*first, *second))
+        # 资源耗尽时等待后重试，不把代理当作可连接
+        assert await validator._connect_proxy("http://8.8.8.8:80") is True
+        assert await validator._connect_proxy("http://9.9.9.9:80") is None
+        assert validator.fd_budget.in_flight == 0
+
+    asyncio.run(run())
+    assert peak == 2
+
+
+def test_candidates_promoted_only_after_validation(storage, monkeypatch):
+    candidates = [f"http://5.5.5.{i}:80" for i in range(5)]
+    validator = make_validator(monkeypatch, alive=set(candidates[:2]))
+
+    async def run():
+        await storage.add_candidates(candidates)
+        assert await storage.count_proxies() == 0
+
+        consumer = CandidateValidator(validator, batch_size=2)
+        assert await consumer.run_once() == 2
+        assert sorted(await storage.all_proxies()) == candidates[:2]
+        # 失败的待验证代理直接丢弃，不留下失败计数
+        assert await storage.count_candidates() == 0
+        assert not await storage.conn.hlen(storage.fail_key)
+
+        # 失败的代理记为失效，再次爬取到时不会入队，已在队列中的也不再验证
+        assert await storage.count_dead() == 3
+        assert await storage.add_candidates(candidates) == 0
+        await storage.conn.zadd(storage.candidate_key, {candidates[2]: 0})
+        assert await consumer.run_once() == 0
+
+    asyncio.run(run())
+    assert sorted(validator.verified) == candidates
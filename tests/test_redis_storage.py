@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+RedisStorage 单元测试
+
+使用fakeredis模拟Redis，验证代理池的存储逻辑
+"""
+
+import os
+import sys
+import asyncio
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from app.core.config import settings
+from app.storage.redis_client import RedisStorage
+
+
+def make_storage():
+    return RedisStorage(fakeredis.FakeAsyncRedis(decode_responses=True))
+
+
+def test_random_proxies_by_protocol():
+    async def run():
+        storage = make_storage()
+        await storage.add_proxy("http://1.1.1.1:80", 10)
+        await storage.add_proxy("https://2.2.2.2:443", 10)
+        await storage.add_proxy("socks5://3.3.3.3:1080", 10)
+
+        picked = await storage.random_proxies(5, "https")
+        assert picked == [("https://2.2.2.2:443", 10.0)]
+
+        picked = await storage.random_proxies(5)
+        assert len(picked) == 3
+        assert await storage.random_proxies(1, "socks4") == []
+
+    asyncio.run(run())
+
+
+def test_update_scores_keeps_index_in_sync():
+    async def run():
+        storage = make_storage()
+        await storage.add_proxy("http://1.1.1.1:80", 10)
+        await storage.update_scores({"http://1.1.1.1:80": 18.5})
+
+        assert await storage.random_proxies(1, "http") == [("http://1.1.1.1:80", 18.5)]
+
+        await storage.remove_proxy("http://1.1.1.1:80")
+        assert await storage.random_proxies(1, "http") == []
+
+    asyncio.run(run())
+
+
+def test_backfill_indexes_only_adds_missing_entries():
+    async def run():
+        storage = make_storage()
+        await storage.conn.zadd(storage.proxy_key, {"http://1.1.1.1:80": 12, "ftp://4.4.4.4:21": 10})
+        await storage.add_proxy("https://2.2.2.2:443", 10)
+        await storage.update_scores({"https://2.2.2.2:443": 15})
+        # 已有的索引条目和检查时间保持不变
+        await storage.conn.zadd(storage.checked_key, {"https://2.2.2.2:443": 100})
+
+        assert await storage.backfill_indexes(batch_size=1) == 1
+        assert await storage.random_proxies(5, "http") == [("http://1.1.1.1:80", 12.0)]
+        assert await storage.random_proxies(5, "https") == [("https://2.2.2.2:443", 15.0)]
+        assert await storage.conn.zscore(storage.checked_key, "ftp://4.4.4.4:21") == 0
+        assert await storage.conn.zscore(storage.checked_key, "https://2.2.2.2:443") == 100
+        assert await storage.backfill_indexes() == 0
+
+    asyncio.run(run())
+
+
+def test_cleanup_old_proxies_removes_from_indexes():
+    async def run():
+        storage = make_storage()
+        await storage.add_proxy("http://1.1.1.1:80", 5)
+        await storage.add_proxy("https://2.2.2.2:443", 15)
+        await storage.add_proxy("http://3.3.3.3:80", 20)
+
+        assert await storage.cleanup_old_proxies(2) == 1
+        assert await storage.cleanup_old_proxies(2) == 0
+        assert await storage.all_proxies("http") == ["http://3.3.3.3:80"]
+        assert await storage.count_by_protocol() == {"http": 1, "https": 1}
+
+    asyncio.run(run())
+
+
+def test_protocol_pagination():
+    async def run():
+        storage = make_storage()
+        for i in range(5):
+            await storage.add_proxy(f"http://1.1.1.{i}:80", 10 + i)
+            await storage.add_proxy(f"https://2.2.2.{i}:443", 10 + i)
+
+        page = await storage.get_proxies_page(offset=1, limit=2, protocol="https")
+        assert page == [("https://2.2.2.3:443", 13.0), ("https://2.2.2.2:443", 12.0)]
+        assert await storage.count_proxies("https") == 5
+
+    asyncio.run(run())
+
+
+def test_add_proxies_bulk_counts_new_members():
+    async def run():
+        storage = make_storage()
+        await storage.add_proxy("http://1.1.1.1:80", 18)
+
+        proxies = ["http://1.1.1.1:80", "https://2.2.2.2:443", "socks5://3.3.3.3:1080", "https://2.2.2.2:443"]
+        assert await storage.add_proxies_bulk(proxies, 10, chunk_size=2) == 2
+        assert await storage.add_proxies_bulk(proxies, 10) == 0
+
+        # NX不会覆盖已有代理的分数
+        assert await storage.random_proxies(1, "http") == [("http://1.1.1.1:80", 18.0)]
+        assert await storage.count_by_protocol() == {"http": 1, "https": 1, "socks5": 1}
+
+    asyncio.run(run())
+
+
+def test_record_results_penalises_and_evicts(monkeypatch):
+    monkeypatch.setattr(settings, "MAX_FAIL_COUNT", 3)
+    monkeypatch.setattr(settings, "FAIL_PENALTY", 2)
+
+    async def run():
+        storage = make_storage()
+        await storage.add_proxies_bulk(["http://1.1.1.1:80", "https://2.2.2.2:443"], 10)
+
+        assert await storage.record_results({}, ["http://1.1.1.1:80"]) == 0
+        assert await storage.random_proxies(1, "http") == [("http://1.1.1.1:80", 8.0)]
+
+        # 成功后清零连续失败次数
+        assert await storage.record_results({"http://1.1.1.1:80": 15}, ["https://2.2.2.2:443"]) == 0
+        assert await storage.conn.hget(storage.fail_key, "http://1.1.1.1:80") is None
+
+        assert await storage.record_results({}, ["https://2.2.2.2:443"]) == 0
+        assert await storage.record_results({}, ["https://2.2.2.2:443"]) == 1
+        assert await storage.count_by_protocol() == {"http": 1}
+        assert await storage.conn.hlen(storage.fail_key) == 0
+
+        # 不在代理池中的代理不会留下失败计数
+        assert await storage.record_results({}, ["socks5://9.9.9.9:1080"]) == 0
+        assert await storage.conn.hlen(storage.fail_key) == 0
+
+    asyncio.run(run())
+
+
+def test_claim_stalest_orders_by_last_check():
+    async def run():
+        storage = make_storage()
+        await storage.add_proxies_bulk(["http://1.1.1.1:80", "http://2.2.2.2:80"], 10)
+        await storage.record_results({"http://1.1.1.1:80": 15}, [])
+        await storage.add_proxy("http://3.3.3.3:80", 10)
+
+        claimed = await storage.claim_stalest(2)
+        assert sorted(claimed) == ["http://2.2.2.2:80", "http://3.3.3.3:80"]
+        # 已取出的代理检查时间被更新，下次优先取其他代理
+        assert await storage.claim_stalest(1) == ["http://1.1.1.1:80"]
+
+        await storage.remove_proxy("http://1.1.1.1:80")
+        assert await storage.conn.zscore(storage.checked_key, "http://1.1.1.1:80") is None
+
+    asyncio.run(run())
+
+
+def test_candidates_skip_pool_members_and_respect_cap():
+    async def run():
+        storage = make_storage()
+        await storage.add_proxy("http://1.1.1.1:80", 10)
+        candidates = ["http://1.1.1.1:80", "http://2.2.2.2:80", "http://3.3.3.3:80", "http://4.4.4.4:80"]
+
+        assert await storage.add_candidates(candidates, max_size=2) == 2
+        # 集合已满时报告未入队的数量
+        assert await storage.enqueue_candidates(candidates, max_size=2) == (0, 4)
+        assert await storage.add_candidates(candidates, max_size=10) == 1
+        # 待验证代理不进入代理池
+        assert await storage.count_proxies() == 1
+        assert await storage.count_candidates() == 3
+
+        assert await storage.pop_candidates(2) == ["http://2.2.2.2:80", "http://3.3.3.3:80"]
+        assert await storage.wait_candidate(0.1) == "http://4.4.4.4:80"
+        assert await storage.pop_candidates(2) == []
+
+    asyncio.run(run())
+
+
+def test_dead_proxies_are_not_requeued(monkeypatch):
+    async def run():
+        storage = make_storage()
+        monkeypatch.setattr(settings, "MAX_FAIL_COUNT", 1)
+        await storage.add_proxy("http://1.1.1.1:80", 10)
+        # 代理池中的代理被移除、验证失败的待验证代理不在代理池中，两者都记为失效
+        assert await storage.record_results({}, ["http://1.1.1.1:80", "http://2.2.2.2:80"]) == 1
+        assert await storage.count_dead() == 2
+
+        candidates = ["http://1.1.1.1:80", "http://2.2.2.2:80", "http://3.3.3.3:80"]
+        assert await storage.add_candidates(candidates) == 1
+        assert await storage.filter_dead(candidates) == ["http://3.3.3.3:80"]
+        # 直接加入代理池同样跳过失效代理
+        assert not await storage.add_proxy("http://1.1.1.1:80", 10)
+        assert await storage.add_proxies_bulk(candidates[:2] + ["http://4.4.4.4:80"], 10) == 1
+        assert await storage.all_proxies("http") == ["http://4.4.4.4:80"]
+
+        # 验证通过后不再视为失效
+        await storage.record_results({"http://2.2.2.2:80": 15}, [])
+        assert await storage.filter_dead(candidates) == ["http://2.2.2.2:80", "http://3.3.3.3:80"]
+
+        # 过期后可以再次入队
+        await storage.conn.zadd(storage.dead_key, {"http://1.1.1.1:80": 1})
+        assert await storage.add_candidates(candidates) == 1
+
+    asyncio.run(run())
+
+
+def test_meta_follows_validation_results(monkeypatch):
+    async def run():
+        storage = make_storage()
+        monkeypatch.setattr(settings, "MAX_FAIL_COUNT", 2)
+        await storage.add_candidates(["http://1.1.1.1:80", "http://2.2.2.2:80"], source="TestCrawler")
+        assert (await storage.get_meta(["http://1.1.1.1:80"]))[0]["source"] == "TestCrawler"
+
+        details = {"http://1.1.1.1:80": {"rt": 123.5, "anon": "elite"}}
+        await storage.record_results({"http://1.1.1.1:80": 15}, ["http://2.2.2.2:80"], details)
+        await storage.record_results({}, ["http://1.1.1.1:80"])
+        meta, missing = await storage.get_meta(["http://1.1.1.1:80", "http://2.2.2.2:80"])
+        assert meta["source"] == "TestCrawler"
+        assert (meta["rt"], meta["anon"], meta["ok"], meta["fail"]) == (123.5, "elite", 1, 1)
+        # 验证失败的待验证代理记为失效，元数据一并删除
+        assert missing == {}
+
+        # 连续失败被移除时元数据随代理一起清除
+        await storage.record_results({}, ["http://1.1.1.1:80"])
+        assert not await storage.conn.hlen(storage.meta_key)
+
+    asyncio.run(run())
+
+
+def test_stats_counters_are_maintained_on_write(monkeypatch):
+    async def run():
+        storage = make_storage()
+        monkeypatch.setattr(settings, "MAX_FAIL_COUNT", 1)
+        await storage.add_proxies_bulk(["http://1.1.1.1:80", "https://2.2.2.2:443"], 10)
+        await storage.add_candidates(["socks5://3.3.3.3:1080", "http://4.4.4.4:80"])
+        await storage.record_results({"socks5://3.3.3.3:1080": 18, "http://1.1.1.1:80": 4},
+                                     ["https://2.2.2.2:443", "http://4.4.4.4:80"])
+        await storage.remove_proxy("http://1.1.1.1:80")
+        await storage.record_crawl(7)
+
+        stats = await storage.get_stats([5, 10, 15])
+        counters = stats["counters"]
+        assert (counters["added"], counters["removed"], counters["validated"], counters["passed"]) == (3, 2, 4, 2)
+        assert (counters["crawls"], counters["crawled"]) == (1, 7)
+        assert counters["last_crawl"] > 0 and counters["last_validate"] > 0
+        assert (stats["total"], stats["protocols"], stats["dead"]) == (1, {"socks5": 1}, 2)
+        assert stats["histogram"] == [0, 0, 0, 1]
+        assert (await storage.get_stats())["histogram"] == []
+
+    asyncio.run(run())
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+EWMA评分测试
+
+检查评分估计值的更新规则，以及验证结果跨轮次累积到代理元数据中
+"""
+
+import os
+import sys
+import asyncio
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from app.storage.redis_client import RedisStorage
+from app.validator import proxy_validator
+from app.validator.proxy_validator import ProxyValidator
+from app.validator.scoring import ScoringEngine, MAX_SCORE
+
+
+def make_engine():
+    return ScoringEngine(latency_alpha=0.5, success_alpha=0.25, timeout_ms=1000)
+
+
+def test_first_success_uses_observed_latency():
+    engine = make_engine()
+    state = engine.update(None, True, 200)
+    assert state == {"rel": 1.0, "lat": 200}
+    assert engine.score(state) == pytest.approx(18)
+    assert engine.score(engine.update(None, True, 0)) == MAX_SCORE
+
+
+def test_single_outlier_moves_score_by_weight_only():
+    engine = make_engine()
+    state = engine.update(None, True, 100)
+    slow = engine.update(state, True, 900)
+    # 一次慢响应只把延迟估计拉向观测值的一半
+    assert slow["lat"] == 500
+    assert engine.score(slow) == pytest.approx(15)
+
+    failed = engine.update(state, False)
+    assert failed == {"rel": 0.75, "lat": 100}
+    recovered = engine.update(failed, True, 100)
+    assert engine.score(failed) < engine.score(recovered) < engine.score(state)
+
+
+def test_unreliable_proxy_ranks_below_reliable_one():
+    engine = make_engine()
+    reliable = flaky = None
+    for i in range(20):
+        reliable = engine.update(reliable, True, 300)
+        flaky = engine.update(flaky, True, 100) if i % 2 else engine.update(flaky, False)
+    assert engine.score(reliable) > engine.score(flaky)
+
+
+def test_legacy_proxy_without_history_is_not_evicted_by_one_failure():
+    engine = make_engine()
+    state = engine.update({}, False)
+    assert state == {"rel": 0.75}
+    assert engine.score(state) > 0
+
+
+def test_validator_accumulates_estimates_across_runs(monkeypatch):
+    storage = RedisStorage(fakeredis.FakeAsyncRedis(decode_responses=True))
+    monkeypatch.setattr(proxy_validator, "redis_storage", storage)
+    validator = ProxyValidator()
+    validator.scoring = make_engine()
+    latencies = iter([100.0, 900.0])
+
+    async def fake_connect(proxy_url):
+        return True
+
+    async def fake_verify(proxy_url, session):
+        return proxy_url, True, next(latencies), "elite"
+
+    monkeypatch.setattr(validator, "_connect_proxy", fake_connect)
+    monkeypatch.setattr(validator, "_verify_proxy", fake_verify)
+
+    async def run():
+        await validator.validate_proxies(["http://1.1.1.1:80"])
+        await validator.validate_proxies(["http://1.1.1.1:80"])
+        meta = (await storage.get_meta(["http://1.1.1.1:80"]))[0]
+        assert (meta["lat"], meta["rt"], meta["rel"], meta["ok"], meta["anon"]) == (500, 900, 1, 2, "elite")
+        assert await storage.get_proxies_page(0, 1) == [("http://1.1.1.1:80", pytest.approx(15))]
+
+    asyncio.run(run())
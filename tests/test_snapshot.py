@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+API进程内代理池快照测试
+
+检查快照读取与Redis一致、读取时不访问Redis、过期后不再使用，收到变更通知后按变更日志增量更新，
+以及变更日志不完整时重新加载
+"""
+
+import os
+import sys
+import asyncio
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from app.core.config import settings
+from app.api.snapshot import PoolSnapshot
+from app.storage.redis_client import RedisStorage
+
+PROXIES = {"http://1.1.1.1:80": 11, "http://2.2.2.2:80": 12, "https://3.3.3.3:443": 13, "socks5://4.4.4.4:1080": 14}
+
+
+async def make_storage():
+    storage = RedisStorage(fakeredis.FakeAsyncRedis(decode_responses=True))
+    await storage.add_proxies_bulk(PROXIES, 10)
+    await storage.update_scores(PROXIES)
+    return storage
+
+
+def test_snapshot_matches_redis_without_round_trips():
+    async def run():
+        storage = await make_storage()
+        snapshot = PoolSnapshot(storage, max_age=60)
+        assert snapshot.random(1) is None
+        assert await snapshot.reload() == 4
+
+        for protocol in [None, "http", "https", "socks4"]:
+            assert snapshot.count(protocol) == await storage.count_proxies(protocol)
+            assert snapshot.page(0, 10, protocol) == await storage.get_proxies_page(0, 10, protocol)
+        assert snapshot.page(1, 2) == await storage.get_proxies_page(1, 2)
+        assert snapshot.page(10, 2) == []
+
+        # 读取快照不再访问Redis
+        storage.conn = None
+        picked = snapshot.random(3, "http")
+        assert sorted(picked) == [("http://1.1.1.1:80", 11), ("http://2.2.2.2:80", 12)]
+        assert len(set(snapshot.random(4))) == 4
+
+    asyncio.run(run())
+
+
+def test_snapshot_is_not_used_after_max_age():
+    async def run():
+        storage = await make_storage()
+        disabled = PoolSnapshot(storage, max_age=0)
+        await disabled.reload()
+        assert disabled.random(1) is None
+
+        snapshot = PoolSnapshot(storage, max_age=60)
+        await snapshot.reload()
+        snapshot.loaded_at -= 61
+        assert snapshot.random(1) is None and snapshot.page() is None and snapshot.count() is None
+
+    asyncio.run(run())
+
+
+def test_snapshot_reloads_after_change_notification():
+    async def run():
+        storage = await make_storage()
+        snapshot = PoolSnapshot(storage, max_age=60, min_interval=0.05)
+        task = asyncio.create_task(snapshot.run())
+        try:
+            for _ in range(100):
+                if snapshot.ready():
+                    break
+                await asyncio.sleep(0.01)
+            assert snapshot.count() == 4
+
+            await storage.record_results({"socks5://5.5.5.5:1080": 20}, [])
+            await storage.remove_proxy("http://1.1.1.1:80")
+            for _ in range(100):
+                if snapshot.count() == 4 and snapshot.page(0, 1) == [("socks5://5.5.5.5:1080", 20)]:
+                    break
+                await asyncio.sleep(0.01)
+            assert snapshot.page(0, 10) == await storage.get_proxies_page(0, 10)
+        finally:
+            snapshot.stop()
+            task.cancel()
+
+    asyncio.run(run())
+
+
+def test_snapshot_applies_changes_without_full_reload(monkeypatch):
+    async def run():
+        storage = await make_storage()
+        snapshot = PoolSnapshot(storage, max_age=60)
+        assert await snapshot.reload() == 4
+
+        full_reloads = []
+        pool_state = storage.pool_state
+
+        async def spy():
+            full_reloads.append(1)
+            return await pool_state()
+
+        monkeypatch.setattr(storage, "pool_state", spy)
+        monkeypatch.setattr(settings, "MAX_FAIL_COUNT", 2)
+
+        # 验证通过加入、扣分、移除、更新分数、批量添加、清理各种写入路径
+        await storage.record_results({"socks5://5.5.5.5:1080": 20, "http://2.2.2.2:80": 11}, ["https://3.3.3.3:443"])
+        await storage.remove_proxy("http://1.1.1.1:80")
+        await storage.update_scores({"socks5://4.4.4.4:1080": 9})
+        await storage.add_proxies_bulk(["http://6.6.6.6:80", "http://7.7.7.7:80"], 10)
+        assert await snapshot.update() == 7
+        await storage.record_results({}, ["https://3.3.3.3:443"])
+        await storage.cleanup_old_proxies(4)
+        assert await snapshot.update() == 2
+        assert await snapshot.update() == 0
+
+        assert not full_reloads
+        for protocol in [None, "http", "https", "socks5"]:
+            assert snapshot.page(0, 10, protocol) == await storage.get_proxies_page(0, 10, protocol)
+
+        # 变更日志已裁剪掉快照之后的记录时重新加载整个代理池
+        await storage.update_scores({"http://2.2.2.2:80": 15, "http://6.6.6.6:80": 16})
+        assert await storage.trim_changes(1) > 0
+        assert await snapshot.update() == 4
+        assert full_reloads == [1]
+        assert snapshot.page(0, 10) == await storage.get_proxies_page(0, 10)
+
+    asyncio.run(run())